@@ -11,18 +11,59 @@
 """
 
 # Import built-in modules
+import io
+import os
 import re
 import sys
+import csv
+import sqlite3
+import argparse
+import queue
 import time
+import gzip
+import base64
+import math
+import hashlib
+import hmac
+import bisect
+import heapq
 import json
+import random
 import logging
+import threading
 import urllib.parse
+from array import array
+from collections.abc import Mapping
+from contextlib import contextmanager
 from functools import wraps
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from statistics import NormalDist
+from typing import Any, Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # Import pip installed packages
 import requests
 
+# msgpack and zstandard are optional, and only used to make snapshots more
+# compact. Install them with pip install OktaManagementFramework[snapshot]
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# pyarrow is optional, and only used to export to Parquet. Install it with
+# pip install OktaManagementFramework[parquet]
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
 
 class OktaRateLimitExceededError(Exception):
     def __init__(
@@ -33,281 +74,2929 @@ class OktaRateLimitExceededError(Exception):
         super().__init__(self.message)
 
 
-class OktaManagementFramework:
+class OktaDeadlineExceededError(Exception):
+    """Raised when the deadline set with OktaManagementFramework.deadline passes
+    before an operation finishes. partial_results holds what was fetched before
+    then, and continuation_token, if set, continues the crawl from where it
+    stopped when passed to OktaManagementFramework.fetch_within.
+    """
 
     def __init__(
         self,
-        okta_domain: str,
-        api_token: str,
-        logger: logging.Logger = None,
-        IS_TESTING: bool = False,
-        TESTING_COUNT_THRESHOLD: int = 100,
-        ONLY_ACTIVE_USERS: bool = False,
+        message="The deadline for this operation has passed.",
+        partial_results: Any = None,
+        continuation_token: str = None,
     ):
-        ####
-        #### PRIVATE/PROTECTED CLASS FIELDS
-        # CONFIGURATION RELATED PROTECTED/PRIVATE CLASS FIELDS
-        self._okta_domain: str = None
-        self.__api_token: str = None
-        self._OKTA_RATE_AVOID_TIMER: float = 0.5
-        self._logger: logging.Logger = None
-        self._ONLY_ACTIVE_USERS = ONLY_ACTIVE_USERS
+        self.message = message
+        self.partial_results = partial_results
+        self.continuation_token = continuation_token
+        super().__init__(self.message)
 
-        # If this flag is set, then certain loops will purposefully terminate
-        # prematurely, as to shorten testing time. Some data, under normal
-        # conditions, could take hours to fetch, due to the shear number of resources
-        # that exist in Okta for that resource type (such as getting all users for
-        # every SINGLE device in Okta).
-        self.__IS_TESTING: bool = IS_TESTING
-        self.__TESTING_COUNT_THRESHOLD: int = (TESTING_COUNT_THRESHOLD - 400)
 
-        # DEVICE RELATED PROTECTED/PRIVATE CLASS FIELDS
-        self.__devices: list[dict] = None
-        self.__devices_lookup_table: dict[dict] = None
-        self.__device_users: list[dict] = None
-        self.__device_users_lookup_table: dict[dict] = None
-        self.__users_with_devices: list["dict"] = None
+class OktaRateLimiter:
+    """Tracks the x-rate-limit-* headers Okta returns on every response, and
+    makes callers wait for the rate limit window to reset once the remaining
+    request budget drops to min_remaining. Shared by all worker threads of a
+    single OktaManagementFramework instance.
+    """
 
-        # USER RELATED PROTECTED/PRIVATE CLASS FIELDS
-        self.__users: list[dict] = None
-        self._users_lookup_table: dict[dict] = None
-        self.__user_devices_lookup_table: dict[dict] = None
-        self.__retrieved_user_profile_cache: dict[dict] = {}
+    def __init__(self, logger: logging.Logger, min_remaining: int = 5):
+        self._logger: logging.Logger = logger
+        self.min_remaining: int = min_remaining
+        self.limit: int | None = None
+        self.remaining: int | None = None
+        self.reset: int | None = None
+        self.__lock = threading.Lock()
 
-        # USER FACTOR RELATED CLASS FIELDS
-        self.__user_factors: list[dict] = None
+    def update(self, headers: dict) -> None:
+        """Records the rate limit state from a response's headers
 
-        # APPLICATION RELATED PROTECTED/PRIVATE CLASS FIELDS
-        self.__applications: list[dict] = None
-        self.__applications_lookup_table: dict[dict] = None
+        Args:
+            headers (dict): Response headers returned by Okta
+        """
+        try:
+            limit = int(headers["x-rate-limit-limit"])
+            remaining = int(headers["x-rate-limit-remaining"])
+            reset = int(headers["x-rate-limit-reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        with self.__lock:
+            # Responses from concurrent workers can arrive out of order, so
+            # only ever move forward in time/backward in remaining budget
+            if self.reset is None or reset > self.reset:
+                self.limit, self.remaining, self.reset = limit, remaining, reset
+            elif reset == self.reset:
+                self.remaining = min(self.remaining, remaining)
+
+    def wait(self, max_wait: float = None) -> None:
+        """Blocks until the current rate limit window resets, if the remaining
+        budget is at or below min_remaining. Returns immediately otherwise.
 
-        # POLICY RELATED PROTECTED/PRIVATE CLASS FIELDS
-        self.__sign_on_policies: list[dict] = None
-        self.__sign_on_policies_lookup_table: dict[dict] = None
+        Args:
+            max_wait (float, optional): Longest the caller can afford to wait.
+            Defaults to None, which waits as long as it takes.
 
-        ####
-        #### PUBLIC CLASS FIELDS
-        # CONFIG RELATED PUBLIC CLASS FIELDS
-        if logger == None:
-            self.logger = logging.getLogger(__name__)
-        else:
-            self.logger = logger
-        self.okta_domain: str = okta_domain
-        self.api_token: str = api_token
+        Raises:
+            OktaDeadlineExceededError: Raised instead of waiting if the window
+            resets after max_wait seconds
+        """
+        with self.__lock:
+            if self.remaining is None or self.remaining > self.min_remaining:
+                if self.remaining is not None:
+                    self.remaining -= 1
+                return
+            time_to_wait: float = self.reset - time.time()
+            if time_to_wait <= 0:
+                self.remaining = None
+                return
+        if max_wait is not None and time_to_wait > max_wait:
+            raise OktaDeadlineExceededError(
+                f"The rate limit window resets in {time_to_wait:.1f} seconds, after the deadline."
+            )
+        self._logger.warning(
+            f"Only {self.remaining}/{self.limit} requests remain in the current rate limit window. Waiting {time_to_wait:.1f} seconds until rate limit resets."
+        )
+        time.sleep(time_to_wait)
 
-        # DEVICE RELATED PUBLIC CLASS FIELDS
-        self.devices: list[dict] = None
-        self.devices_lookup_table: dict[dict] = None
-        self.device_users: list[dict] = None
-        self.users_with_devices: list[dict] = None
 
-        # USER RELATED PUBLIC CLASS FIELDS
-        self.users: list[dict] = None
-        self.users_lookup_table: dict[dict] = None
+class OktaProgressTracker:
+    """Counts the items a fan-out crawl has finished and, at most every
+    report_every seconds, reports its throughput, the rate limit headroom and
+    the projected completion time to callback, or to the logger if there is no
+    callback. advance() does a constant amount of work however large the
+    crawl is, and may be called from several worker threads at once.
+    """
 
-        # USER FACTORS RELATED CLASS FIELDS
-        self.user_factors: list[dict] = None
+    def __init__(
+        self,
+        name: str,
+        total: int,
+        logger: logging.Logger,
+        rate_limiter: OktaRateLimiter = None,
+        callback: Callable[[dict], Any] = None,
+        report_every: float = 10.0,
+    ):
+        self.name: str = name
+        self.total: int = total
+        self.completed: int = 0
+        self.failed: int = 0
+        self.report_every: float = report_every
+        self._logger: logging.Logger = logger
+        self.__rate_limiter: OktaRateLimiter | None = rate_limiter
+        self.__callback: Callable[[dict], Any] | None = callback
+        self.__started_at: float = time.monotonic()
+        self.__last_report_at: float = self.__started_at
+        self.__lock = threading.Lock()
+
+    def advance(self, count: int = 1, failed: bool = False) -> None:
+        """Records count more finished items, and reports progress if a report
+        is due or the crawl just finished
 
-        # APPLICATION RELATED PUBLIC CLASS FIELDS
-        self.applications: list[dict] = None
+        Args:
+            count (int, optional): Number of items finished. Defaults to 1.
+            failed (bool, optional): Whether those items failed. Defaults to False.
+        """
+        with self.__lock:
+            self.completed += count
+            if failed:
+                self.failed += count
+            now: float = time.monotonic()
+            if (
+                now - self.__last_report_at < self.report_every
+                and self.completed < self.total
+            ):
+                return
+            self.__last_report_at = now
+        self.report()
 
-        # SIGN ON POLICIES RELATED PUBLIC CLASS FIELDS
-        self.sign_on_policies: list[dict] = None
+    def snapshot(self) -> dict:
+        """Returns the progress of the crawl so far
 
+        Returns:
+            dict: Counts, items_per_second, eta_seconds, projected_completion
+            and the rate limit's remaining/limit/reset as last seen
+        """
+        elapsed: float = time.monotonic() - self.__started_at
+        items_per_second: float = self.completed / elapsed if elapsed > 0 else 0.0
+        remaining_items: int = max(self.total - self.completed, 0)
+        eta_seconds: float | None = (
+            remaining_items / items_per_second if items_per_second > 0 else None
+        )
+        return {
+            "name": self.name,
+            "completed": self.completed,
+            "failed": self.failed,
+            "total": self.total,
+            "percent": 100.0 * self.completed / self.total if self.total else 100.0,
+            "elapsed_seconds": elapsed,
+            "items_per_second": items_per_second,
+            "eta_seconds": eta_seconds,
+            "projected_completion": (
+                datetime.now(tz=timezone.utc) + timedelta(seconds=eta_seconds)
+                if eta_seconds is not None
+                else None
+            ),
+            "rate_limit_remaining": getattr(self.__rate_limiter, "remaining", None),
+            "rate_limit_limit": getattr(self.__rate_limiter, "limit", None),
+            "rate_limit_reset": getattr(self.__rate_limiter, "reset", None),
+        }
+
+    def report(self) -> None:
+        """Hands the current snapshot to the callback, or logs it. An exception
+        raised by the callback is logged rather than stopping the crawl.
+        """
+        snapshot: dict = self.snapshot()
+        if self.__callback is not None:
+            try:
+                self.__callback(snapshot)
+            except Exception as error:
+                self._logger.error(
+                    f"Progress callback for {self.name} raised an exception: {error}"
+                )
+            return
+        eta: str = (
+            snapshot["projected_completion"].isoformat(timespec="seconds")
+            if snapshot["projected_completion"] is not None
+            else "unknown"
+        )
+        headroom: str = (
+            f"{snapshot['rate_limit_remaining']}/{snapshot['rate_limit_limit']}"
+            if snapshot["rate_limit_limit"] is not None
+            else "unknown"
+        )
         self._logger.info(
-            "Finished initializing OktaManagementFramework class instance."
+            f"{self.name}: {snapshot['completed']}/{snapshot['total']} ({snapshot['percent']:.1f}%) done, {snapshot['failed']} failed, {snapshot['items_per_second']:.2f} per second. Rate limit remaining: {headroom}. Projected completion: {eta}"
         )
 
-    def validate_attrs_present(func):
-        """This function is used as a decorator, and will validate that the
-        current value of this classes  self.__api_token and self._okta_domain
-        are not None before executing the function it's called with
+
+class OktaAssignmentIndex:
+    """Compact index of which users are assigned to which applications. User
+    and app ids are interned to integers, and each app's assigned users are
+    kept in an array of unsigned ints rather than a list of user dicts. The
+    user -> apps direction is derived from app -> users on first use.
+    """
+
+    def __init__(self):
+        self.user_ids: list[str] = []
+        self.app_ids: list[str] = []
+        self._user_index: dict[str, int] = {}
+        self._app_index: dict[str, int] = {}
+        self._app_users: list[array] = []
+        self._user_apps: list[array] | None = None
+
+    def __intern_user(self, user_id: str) -> int:
+        if user_id not in self._user_index:
+            self._user_index[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+        return self._user_index[user_id]
+
+    def add_app_assignments(self, app_id: str, user_ids: Iterable[str]) -> None:
+        """Records the users assigned to an application, replacing any users
+        previously recorded for that app
 
         Args:
-            func (_type_): Function to execute if the class attribute values
-            are not None
+            app_id (str): Okta application id
+            user_ids (Iterable[str]): Okta user ids assigned to the app
+        """
+        members = array("L", sorted({self.__intern_user(u) for u in user_ids}))
+        if app_id in self._app_index:
+            self._app_users[self._app_index[app_id]] = members
+        else:
+            self._app_index[app_id] = len(self.app_ids)
+            self.app_ids.append(app_id)
+            self._app_users.append(members)
+        self._user_apps = None
+
+    def assign_user(self, app_id: str, user_id: str) -> None:
+        """Records one more user assigned to an application already in the
+        index. Apps not in the index are left alone, as the index would
+        otherwise claim to know all of their users.
+        """
+        if app_id not in self._app_index:
+            return
+        position: int = self._app_index[app_id]
+        user_idx: int = self.__intern_user(user_id)
+        members: array = self._app_users[position]
+        insert_at: int = bisect.bisect_left(members, user_idx)
+        if insert_at < len(members) and members[insert_at] == user_idx:
+            return
+        # Replaced rather than changed in place, for readers on other threads
+        self._app_users[position] = (
+            members[:insert_at] + array("L", [user_idx]) + members[insert_at:]
+        )
+        self._user_apps = None
+
+    def unassign_user(self, app_id: str, user_id: str) -> None:
+        """Removes one user's assignment to an application in the index"""
+        if app_id not in self._app_index or user_id not in self._user_index:
+            return
+        position: int = self._app_index[app_id]
+        user_idx: int = self._user_index[user_id]
+        members: array = self._app_users[position]
+        remove_at: int = bisect.bisect_left(members, user_idx)
+        if remove_at == len(members) or members[remove_at] != user_idx:
+            return
+        self._app_users[position] = members[:remove_at] + members[remove_at + 1 :]
+        self._user_apps = None
+
+    def remove_app(self, app_id: str) -> None:
+        """Removes an application and its assignments from the index"""
+        if app_id not in self._app_index:
+            return
+        position: int = self._app_index.pop(app_id)
+        del self.app_ids[position]
+        del self._app_users[position]
+        for later_app_id in self.app_ids[position:]:
+            self._app_index[later_app_id] -= 1
+        self._user_apps = None
+
+    def __build_user_apps(self) -> list[array]:
+        user_apps: list[array] = [array("L") for _ in self.user_ids]
+        for app_idx, members in enumerate(self._app_users):
+            for user_idx in members:
+                user_apps[user_idx].append(app_idx)
+        self._user_apps = user_apps
+        return user_apps
+
+    def users_for_app(self, app_id: str) -> list[str]:
+        if app_id not in self._app_index:
+            return []
+        return [self.user_ids[i] for i in self._app_users[self._app_index[app_id]]]
+
+    def apps_for_user(self, user_id: str) -> list[str]:
+        if user_id not in self._user_index:
+            return []
+        user_apps = self._user_apps or self.__build_user_apps()
+        return [self.app_ids[i] for i in user_apps[self._user_index[user_id]]]
+
+    def has_app(self, app_id: str) -> bool:
+        return app_id in self._app_index
+
+    @property
+    def assignment_count(self) -> int:
+        return sum(len(members) for members in self._app_users)
+
+    def to_dict(self) -> dict:
+        return {
+            "user_ids": self.user_ids,
+            "app_ids": self.app_ids,
+            "app_users": [members.tolist() for members in self._app_users],
+        }
+
+    @classmethod
+    def from_dict(cls, value: dict) -> "OktaAssignmentIndex":
+        index = cls()
+        index.user_ids = list(value["user_ids"])
+        index.app_ids = list(value["app_ids"])
+        index._user_index = {u: i for i, u in enumerate(index.user_ids)}
+        index._app_index = {a: i for i, a in enumerate(index.app_ids)}
+        index._app_users = [array("L", members) for members in value["app_users"]]
+        return index
+
+
+class OktaGroupMembershipIndex(OktaAssignmentIndex):
+    """The same compact index as OktaAssignmentIndex, of which users are
+    members of which groups
+    """
+
+    @property
+    def group_ids(self) -> list[str]:
+        return self.app_ids
+
+    def set_group_members(self, group_id: str, user_ids: Iterable[str]) -> None:
+        self.add_app_assignments(group_id, user_ids)
+
+    def remove_group(self, group_id: str) -> None:
+        self.remove_app(group_id)
+
+    def add_group_member(self, group_id: str, user_id: str) -> None:
+        self.assign_user(group_id, user_id)
+
+    def remove_group_member(self, group_id: str, user_id: str) -> None:
+        self.unassign_user(group_id, user_id)
+
+    def users_for_group(self, group_id: str) -> list[str]:
+        return self.users_for_app(group_id)
+
+    def groups_for_user(self, user_id: str) -> list[str]:
+        return self.apps_for_user(user_id)
+
+    def has_group(self, group_id: str) -> bool:
+        return self.has_app(group_id)
+
+    @property
+    def membership_count(self) -> int:
+        return self.assignment_count
+
+
+class OktaCrawlCheckpoint:
+    """Append-only, newline delimited JSON file that a long running crawl
+    records its progress to one entry at a time. Each line is written and
+    flushed as soon as it is recorded, so after a crash the file holds
+    everything that was done up to that point. A checkpoint without a path
+    records nothing, so callers never need to check whether checkpointing
+    is enabled.
+    """
+
+    def __init__(self, path: str | None):
+        self.path: str | None = path
+        self.__lock = threading.Lock()
+
+    def read_entries(self) -> list[dict]:
+        """Returns every entry recorded so far, in the order they were recorded"""
+        entries: list[dict] = []
+        if not self.path or not os.path.exists(self.path):
+            return entries
+        with open(self.path, "r", encoding="utf-8") as checkpoint_file:
+            for line in checkpoint_file:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A line cut short by a crash mid-write
+                    continue
+        return entries
+
+    def record(self, entry: dict) -> None:
+        if not self.path:
+            return
+        with self.__lock:
+            with open(self.path, "a", encoding="utf-8") as checkpoint_file:
+                checkpoint_file.write(json.dumps(entry) + "\n")
+                checkpoint_file.flush()
+
+    def clear(self) -> None:
+        """Removes the checkpoint once the crawl it belongs to has completed"""
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class OktaBulkLedger(OktaCrawlCheckpoint):
+    """Record of the outcome of every item of a bulk operation, one line per
+    item, so after a crash the ledger shows exactly which items were already
+    done and the operation can be resumed from it.
+    """
+
+    # Items whose latest ledger entry has one of these statuses are never
+    # attempted again when the operation is resumed from the ledger
+    COMPLETED_STATUSES: tuple = ("SUCCESS", "SKIPPED")
+
+    def load(self) -> dict[str, dict]:
+        """Returns the latest entry recorded for each item key. Entries recorded
+        by dry runs are left out, as nothing was actually done for them.
+        """
+        return {
+            entry["key"]: entry
+            for entry in self.read_entries()
+            if not entry.get("dry_run")
+        }
+
+
+class CountMinSketch:
+    """Fixed size approximate counter. Counts of any number of distinct keys
+    are kept in depth rows of width counters, and an estimate is never below
+    the true count. With the defaults it overestimates by at most about 0.1%
+    of the total count, with 98% probability, in 64 KB.
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width: int = width
+        self.depth: int = depth
+        self.total: int = 0
+        self._rows: list[array] = [array("Q", bytes(8 * width)) for _ in range(depth)]
+
+    def __positions(self, key: str) -> list[int]:
+        digest: bytes = hashlib.blake2b(
+            key.encode("utf-8"), digest_size=8 * self.depth
+        ).digest()
+        return [
+            int.from_bytes(digest[8 * row : 8 * row + 8], "little") % self.width
+            for row in range(self.depth)
+        ]
+
+    def add(self, key: str, count: int = 1) -> int:
+        """Adds count to key, and returns key's new estimated count"""
+        self.total += count
+        estimate: int | None = None
+        for row, position in zip(self._rows, self.__positions(key)):
+            row[position] += count
+            if estimate is None or row[position] < estimate:
+                estimate = row[position]
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        return min(
+            row[position] for row, position in zip(self._rows, self.__positions(key))
+        )
+
+
+class HyperLogLog:
+    """Fixed size approximate count of distinct keys. With the default
+    precision of 14 it uses 16 KB and is within about 1% of the true count.
+    """
+
+    def __init__(self, precision: int = 14):
+        self.precision: int = precision
+        self._registers: bytearray = bytearray(1 << precision)
+
+    def add(self, key: str) -> None:
+        hashed: int = int.from_bytes(
+            hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little"
+        )
+        register: int = hashed >> (64 - self.precision)
+        remaining: int = hashed & ((1 << (64 - self.precision)) - 1)
+        rank: int = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self._registers[register]:
+            self._registers[register] = rank
+
+    def count(self) -> int:
+        register_count: int = len(self._registers)
+        alpha: float = 0.7213 / (1 + 1.079 / register_count)
+        estimate: float = (
+            alpha
+            * register_count**2
+            / sum(2.0**-register for register in self._registers)
+        )
+        empty_registers: int = self._registers.count(0)
+        if estimate <= 2.5 * register_count and empty_registers:
+            # Linear counting is more accurate for small counts
+            estimate = register_count * math.log(register_count / empty_registers)
+        return round(estimate)
+
+
+class OktaLogAggregator:
+    """Computes counts over a stream of system log events in bounded memory,
+    without keeping the events themselves. Pass add as the on_item callback of
+    stream_system_log_events, or use
+    OktaManagementFramework.aggregate_system_log_events.
+
+    Tracks
+        - the number of events of each eventType (exact, there are only so many
+          event types)
+        - approximate failed sign-ins per actor, and the actors with the most
+        - the approximate number of distinct actors
+        - authentication outcomes per app for each minute, for the most recent
+          window_minutes minutes of events
+    """
+
+    FAILED_SIGN_IN_EVENT_TYPES: tuple = ("user.session.start",)
+
+    def __init__(self, window_minutes: int = 60, top_actors: int = 100):
+        self.window_minutes: int = window_minutes
+        self.top_actors: int = top_actors
+        self.event_count: int = 0
+        self.event_type_counts: dict[str, int] = {}
+        self._failed_sign_ins: CountMinSketch = CountMinSketch()
+        self._top_failed_sign_ins: dict[str, int] = {}
+        self._distinct_actors: HyperLogLog = HyperLogLog()
+        # Heap of the minutes in the window, which ends at the latest minute
+        # seen and starts at _window_start
+        self._minutes: list[str] = []
+        self._window_start: str | None = None
+        self._app_outcomes: dict[str, dict[str, dict[str, int]]] = {}
+
+    def add(self, event: dict) -> None:
+        self.event_count += 1
+        event_type: str = event.get("eventType", "unknown")
+        self.event_type_counts[event_type] = (
+            self.event_type_counts.get(event_type, 0) + 1
+        )
+        actor: dict = event.get("actor") or {}
+        actor_id: str = actor.get("alternateId") or actor.get("id") or "unknown"
+        self._distinct_actors.add(actor_id)
+        result: str = (event.get("outcome") or {}).get("result", "UNKNOWN")
+
+        if event_type in self.FAILED_SIGN_IN_EVENT_TYPES and result == "FAILURE":
+            self.__add_failed_sign_in(actor_id)
+
+        if event_type.startswith("user.authentication") and event.get("published"):
+            for target in event.get("target") or []:
+                if target.get("type") == "AppInstance":
+                    self.__add_app_outcome(
+                        event["published"][:16], target["id"], result
+                    )
+
+    def __add_failed_sign_in(self, actor_id: str) -> None:
+        estimate: int = self._failed_sign_ins.add(actor_id)
+        if (
+            actor_id in self._top_failed_sign_ins
+            or len(self._top_failed_sign_ins) < self.top_actors
+        ):
+            self._top_failed_sign_ins[actor_id] = estimate
+            return
+        lowest_actor_id: str = min(
+            self._top_failed_sign_ins, key=self._top_failed_sign_ins.get
+        )
+        if estimate > self._top_failed_sign_ins[lowest_actor_id]:
+            del self._top_failed_sign_ins[lowest_actor_id]
+            self._top_failed_sign_ins[actor_id] = estimate
+
+    def __add_app_outcome(self, minute: str, app_id: str, result: str) -> None:
+        # Events are not strictly in order, so the window is moved by the
+        # minutes' values rather than the order they arrive in
+        if self._window_start is not None and minute < self._window_start:
+            return
+        if minute not in self._app_outcomes:
+            self._app_outcomes[minute] = {}
+            heapq.heappush(self._minutes, minute)
+            latest_start: str = (
+                datetime.strptime(minute, "%Y-%m-%dT%H:%M")
+                - timedelta(minutes=self.window_minutes - 1)
+            ).strftime("%Y-%m-%dT%H:%M")
+            if self._window_start is None or latest_start > self._window_start:
+                self._window_start = latest_start
+                while self._minutes[0] < self._window_start:
+                    del self._app_outcomes[heapq.heappop(self._minutes)]
+        app_outcomes: dict[str, int] = self._app_outcomes[minute].setdefault(app_id, {})
+        app_outcomes[result] = app_outcomes.get(result, 0) + 1
+
+    def failed_sign_ins(self, actor_id: str) -> int:
+        """Estimated number of failed sign-ins by actor_id"""
+        return self._failed_sign_ins.estimate(actor_id)
+
+    def top_failed_sign_in_actors(self, count: int = 10) -> list[tuple[str, int]]:
+        """The actors with the most failed sign-ins, with their estimated counts"""
+        return sorted(
+            self._top_failed_sign_ins.items(), key=lambda item: item[1], reverse=True
+        )[:count]
+
+    @property
+    def distinct_actor_count(self) -> int:
+        return self._distinct_actors.count()
+
+    @property
+    def app_outcomes_per_minute(self) -> dict[str, dict[str, dict[str, int]]]:
+        """Dictionary where the key is the minute (such as 2024-06-01T13:45), and
+        the value a dictionary of app id -> {outcome result: count}
+        """
+        return {minute: self._app_outcomes[minute] for minute in sorted(self._minutes)}
+
+
+class OktaSample:
+    """Uniform random sample of a population such as all users or all devices,
+    along with what was fetched for each sampled member. estimate() turns the
+    share of the sample matching a condition into an estimate for the whole
+    population, with a confidence interval.
+    """
+
+    def __init__(self, population_size: int, items: list[dict]):
+        self.population_size: int = population_size
+        self.items: list[dict] = items
+
+    @property
+    def sample_size(self) -> int:
+        return len(self.items)
+
+    def estimate(
+        self, predicate: Callable[[dict], bool], confidence: float = 0.95
+    ) -> dict:
+        """Estimates the share and number of the population that predicate holds
+        for, using the Wilson score interval. The interval is narrowed by the
+        finite population correction, as samples are often a sizeable part of a
+        tenant, and collapses to the exact answer when everything was sampled.
+        Counts never fall below the matches already seen, or above those plus
+        the members that were not sampled.
+
+        Args:
+            predicate (Callable[[dict], bool]): Condition checked on each sampled
+            item, such as a user_factors entry without a push factor
+            confidence (float, optional): Confidence level of the interval.
+            Defaults to 0.95.
+
+        Raises:
+            ValueError: Raised if the sample is empty, or confidence is not
+            between 0 and 1
+
+        Returns:
+            dict: The proportion matching, its confidence interval as
+            proportion_low/proportion_high, and the same as counts of the population
+        """
+        if not self.items:
+            raise ValueError("Can not estimate from an empty sample.")
+        if not 0 < confidence < 1:
+            raise ValueError(f"confidence must be between 0 and 1, not {confidence}")
+        n: int = self.sample_size
+        population: int = max(self.population_size, n)
+        matches: int = sum(1 for item in self.items if predicate(item))
+        proportion: float = matches / n
+        z: float = NormalDist().inv_cdf((1 + confidence) / 2)
+        correction: float = (
+            math.sqrt((population - n) / (population - 1)) if population > 1 else 0
+        )
+        denominator: float = 1 + z**2 / n
+        wilson_centre: float = (proportion + z**2 / (2 * n)) / denominator
+        # The Wilson centre's pull away from the observed proportion shrinks with
+        # the correction too, so with the whole population sampled the interval
+        # collapses onto the exact answer
+        centre: float = proportion + (wilson_centre - proportion) * correction
+        margin: float = (
+            z
+            * math.sqrt(proportion * (1 - proportion) / n + z**2 / (4 * n**2))
+            / denominator
+            * correction
+        )
+        # The sampled matches are known, so the population has at least those
+        # and at most those plus every member that was not sampled
+        fewest: int = matches
+        most: int = matches + population - n
+        low: float = max(fewest / population, centre - margin)
+        high: float = min(most / population, centre + margin)
+        return {
+            "matches": matches,
+            "sample_size": n,
+            "population_size": population,
+            "confidence": confidence,
+            "proportion": proportion,
+            "proportion_low": low,
+            "proportion_high": high,
+            "count": round(proportion * population),
+            "count_low": max(fewest, math.floor(low * population)),
+            "count_high": min(most, math.ceil(high * population)),
+        }
+
+
+class OktaExportWriter:
+    """Writes pages of Okta objects to a file as NDJSON, CSV or Parquet,
+    optionally compressed, one page at a time. For CSV and Parquet, nested
+    objects are flattened into dotted column names such as profile.login, and
+    lists are written as JSON. The columns are taken from the first page.
+    """
+
+    FORMATS: tuple = ("ndjson", "csv", "parquet")
+    COMPRESSIONS: tuple = ("gzip", "zstd")
+
+    def __init__(
+        self,
+        path: str,
+        format: str = "ndjson",
+        compression: str = None,
+        append: bool = False,
+        columns: list[str] = None,
+        logger: logging.Logger = None,
+    ):
+        """
+        Args:
+            path (str): File to write to
+            format (str, optional): ndjson, csv or parquet. Defaults to "ndjson".
+            compression (str, optional): gzip or zstd. Defaults to None.
+            append (bool, optional): Add to the end of an existing file instead
+            of replacing it. Not possible for Parquet. Defaults to False.
+            columns (list[str], optional): CSV columns of the file being
+            appended to. Defaults to None.
+            logger (logging.Logger, optional): Defaults to None.
+
+        Raises:
+            ValueError: Raised if the format or compression is not supported, or
+            appending to a Parquet file was asked for
+            ImportError: Raised if the package the format or compression needs
+            is not installed
+        """
+        if format not in self.FORMATS:
+            raise ValueError(f"{format} is not one of {self.FORMATS}")
+        if compression is not None and compression not in self.COMPRESSIONS:
+            raise ValueError(f"{compression} is not one of {self.COMPRESSIONS}")
+        if format == "parquet":
+            if pyarrow is None:
+                raise ImportError(
+                    "pyarrow is needed to export to Parquet. Install it with pip install OktaManagementFramework[parquet]"
+                )
+            if append:
+                raise ValueError("Parquet files can not be appended to.")
+        elif compression == "zstd" and zstandard is None:
+            raise ImportError(
+                "zstandard is needed for zstd compression. Install it with pip install zstandard"
+            )
+        self.path: str = path
+        self.format: str = format
+        self.compression: str | None = compression
+        self.columns: list[str] | None = columns
+        self._logger: logging.Logger = logger or logging.getLogger(__name__)
+        self.__parquet_writer = None
+        self.__csv_writer = None
+        self.__file = None
+        if format != "parquet":
+            self.__file = self.__open_text(path, "a" if append else "w")
+            if format == "csv" and columns is not None:
+                self.__csv_writer = self.__make_csv_writer(columns)
+
+    def __open_text(self, path: str, mode: str) -> io.TextIOBase:
+        # A compressed file that is appended to gets a second gzip member or
+        # zstd frame, which readers decompress as if it were one stream
+        if self.compression == "gzip":
+            return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+        if self.compression == "zstd":
+            return io.TextIOWrapper(
+                zstandard.ZstdCompressor().stream_writer(open(path, mode + "b")),
+                encoding="utf-8",
+                newline="",
+            )
+        return open(path, mode, encoding="utf-8", newline="")
+
+    def __make_csv_writer(self, columns: list[str]) -> csv.DictWriter:
+        return csv.DictWriter(
+            self.__file, fieldnames=columns, extrasaction="ignore", restval=""
+        )
+
+    @classmethod
+    def flatten(cls, item: dict, prefix: str = "") -> dict:
+        """Flattens nested dicts into one dict with dotted keys. Lists are
+        turned into JSON strings.
+        """
+        flattened: dict = {}
+        for key, value in item.items():
+            name: str = f"{prefix}{key}"
+            if isinstance(value, dict):
+                flattened.update(cls.flatten(value, prefix=f"{name}."))
+            elif isinstance(value, list):
+                flattened[name] = json.dumps(value)
+            else:
+                flattened[name] = value
+        return flattened
+
+    def write(self, items: list[dict]) -> None:
+        """Writes a page of objects"""
+        if not items:
+            return
+        if self.format == "ndjson":
+            for item in items:
+                self.__file.write(json.dumps(item) + "\n")
+            return
+        rows: list[dict] = [self.flatten(item) for item in items]
+        if self.columns is None:
+            self.columns = list(dict.fromkeys(key for row in rows for key in row))
+            if self.format == "csv":
+                self.__csv_writer = self.__make_csv_writer(self.columns)
+                self.__csv_writer.writeheader()
+        else:
+            new_columns: set[str] = {key for row in rows for key in row} - set(
+                self.columns
+            )
+            if new_columns:
+                self._logger.warning(
+                    f"Columns {sorted(new_columns)} were not in the first page written to {self.path}, and are left out."
+                )
+        if self.format == "csv":
+            self.__csv_writer.writerows(rows)
+            return
+        # Okta objects mix types within the same attribute across objects, so
+        # Parquet columns are written as strings
+        schema = pyarrow.schema([(column, pyarrow.string()) for column in self.columns])
+        table = pyarrow.Table.from_pylist(
+            [
+                {
+                    column: None if row.get(column) is None else str(row[column])
+                    for column in self.columns
+                }
+                for row in rows
+            ],
+            schema=schema,
+        )
+        if self.__parquet_writer is None:
+            self.__parquet_writer = pyarrow.parquet.ParquetWriter(
+                self.path, schema, compression=self.compression or "snappy"
+            )
+        self.__parquet_writer.write_table(table)
+
+    def flush(self) -> None:
+        if self.__file is not None:
+            self.__file.flush()
+
+    def close(self) -> None:
+        if self.__file is not None:
+            self.__file.close()
+        if self.__parquet_writer is not None:
+            self.__parquet_writer.close()
+
+
+class OktaSharedUserIndex(Mapping):
+    """Read-only view of a user index published to an SQLite file with
+    OktaManagementFramework.publish_user_index. Any number of processes can open
+    the same file. It is memory mapped, so the pages are shared through the OS
+    page cache rather than copied into each process, and a user is only parsed
+    from JSON when it is read. Behaves like users_lookup_table, a mapping of
+    user id to user, and can also look users up by login.
+    """
+
+    def __init__(self, path: str, mmap_size: int = 2**32):
+        """
+        Args:
+            path (str): Index file written by publish_user_index
+            mmap_size (int, optional): Most bytes of the file to memory map.
+            Defaults to 4 GiB.
+
+        Raises:
+            FileNotFoundError: Raised if there is no index at path
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No user index has been published to {path}")
+        self.path: str = path
+        # immutable=1 skips SQLite's file locking. That is safe because an index
+        # is never modified in place, republishing replaces the whole file.
+        self.__connection: sqlite3.Connection = sqlite3.connect(
+            f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro&immutable=1",
+            uri=True,
+            check_same_thread=False,
+        )
+        self.__connection.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self.__lock = threading.Lock()
+        # The file never changes once published, so it is only counted once
+        self.__length: int | None = None
+        metadata: dict = dict(self.__query("SELECT key, value FROM metadata"))
+        self.okta_domain: str | None = metadata.get("okta_domain")
+        self.published_at: datetime | None = (
+            datetime.fromisoformat(metadata["published_at"])
+            if "published_at" in metadata
+            else None
+        )
+
+    def __query(self, sql: str, parameters: tuple = ()) -> list[tuple]:
+        with self.__lock:
+            return self.__connection.execute(sql, parameters).fetchall()
+
+    def __getitem__(self, user_id: str) -> dict:
+        rows: list[tuple] = self.__query(
+            "SELECT record FROM users WHERE id = ?", (user_id,)
+        )
+        if not rows:
+            raise KeyError(user_id)
+        return json.loads(rows[0][0])
+
+    def __contains__(self, user_id: object) -> bool:
+        return bool(self.__query("SELECT 1 FROM users WHERE id = ?", (user_id,)))
+
+    def __iter__(self) -> Iterator[str]:
+        # Fetched in batches, so iterating never holds every id at once
+        last_id: str = ""
+        while True:
+            rows: list[tuple] = self.__query(
+                "SELECT id FROM users WHERE id > ? ORDER BY id LIMIT 10000",
+                (last_id,),
+            )
+            if not rows:
+                return
+            for (user_id,) in rows:
+                yield user_id
+            last_id = rows[-1][0]
+
+    def __len__(self) -> int:
+        if self.__length is None:
+            self.__length = self.__query("SELECT COUNT(*) FROM users")[0][0]
+        return self.__length
+
+    def get_by_login(self, login: str) -> dict | None:
+        """Returns the user whose profile.login is login, ignoring case as Okta
+        does, or None if there is no such user
+        """
+        rows: list[tuple] = self.__query(
+            "SELECT record FROM users WHERE login = ? COLLATE NOCASE", (login,)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def close(self) -> None:
+        self.__connection.close()
+
+    def __enter__(self) -> "OktaSharedUserIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class OktaEventHookReceiver:
+    """Small HTTP server that receives Okta Event Hooks and applies them to an
+    OktaManagementFramework instance's caches with handle_event_hook. It
+    answers Okta's one-time verification request, and acknowledges each
+    delivery straight away, leaving the events to a single background thread
+    so they are applied in the order they arrived. Okta only delivers to
+    HTTPS endpoints, so put it behind a TLS terminating proxy.
+
+        with OktaEventHookReceiver(okta, port=8080, secret="shared secret"):
+            ...
+    """
+
+    def __init__(
+        self,
+        okta: "OktaManagementFramework",
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        path: str = "/",
+        secret: str = None,
+        auth_header: str = "Authorization",
+    ):
+        """
+        Args:
+            okta (OktaManagementFramework): Instance whose caches to update
+            host (str, optional): Address to listen on. Defaults to "127.0.0.1".
+            port (int, optional): Port to listen on, or 0 for any free port.
+            Defaults to 8080.
+            path (str, optional): URL path the event hook is registered with in
+            Okta. Defaults to "/".
+            secret (str, optional): Value Okta was configured to send in
+            auth_header. Requests without it are rejected. Defaults to None.
+            auth_header (str, optional): Defaults to "Authorization".
+        """
+        self._okta: OktaManagementFramework = okta
+        self.path: str = path
+        self.secret: str | None = secret
+        self.auth_header: str = auth_header
+        self.__events: queue.Queue = queue.Queue()
+        self.__server: ThreadingHTTPServer = ThreadingHTTPServer(
+            (host, port), self.__make_handler()
+        )
+        self.__threads: list[threading.Thread] = []
+
+    @property
+    def url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}{self.path}"
+
+    def __make_handler(self) -> type:
+        receiver: OktaEventHookReceiver = self
+
+        class EventHookHandler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args) -> None:
+                receiver._okta.logger.debug(f"Event hook receiver: {format % args}")
+
+            def __reply(self, status: int, body: dict = None) -> None:
+                content: bytes = json.dumps(body).encode() if body else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def __authorized(self) -> bool:
+                if self.path.split("?")[0] != receiver.path:
+                    self.__reply(404)
+                    return False
+                if receiver.secret is not None and not hmac.compare_digest(
+                    self.headers.get(receiver.auth_header, ""), receiver.secret
+                ):
+                    receiver._okta.logger.warning(
+                        "Rejected an event hook request without the shared secret"
+                    )
+                    self.__reply(401)
+                    return False
+                return True
+
+            def do_GET(self) -> None:
+                if not self.__authorized():
+                    return
+                challenge: str | None = self.headers.get(
+                    "X-Okta-Verification-Challenge"
+                )
+                if challenge is None:
+                    self.__reply(400, {"error": "Missing verification challenge"})
+                    return
+                receiver._okta.logger.info("Answered the event hook verification")
+                self.__reply(200, {"verification": challenge})
+
+            def do_POST(self) -> None:
+                if not self.__authorized():
+                    return
+                try:
+                    length: int = int(self.headers.get("Content-Length", 0))
+                    payload: dict = json.loads(self.rfile.read(length))
+                except ValueError:
+                    self.__reply(400, {"error": "Body is not JSON"})
+                    return
+                receiver._enqueue(payload)
+                self.__reply(200)
+
+        return EventHookHandler
+
+    def _enqueue(self, payload: dict) -> None:
+        self.__events.put(payload)
+
+    def __apply_events(self) -> None:
+        while True:
+            payload: dict | None = self.__events.get()
+            try:
+                if payload is None:
+                    return
+                self._okta.handle_event_hook(payload)
+            except Exception as error:
+                self._okta.logger.error(f"Could not apply event hook: {error}")
+            finally:
+                self.__events.task_done()
+
+    def start(self) -> "OktaEventHookReceiver":
+        """Starts listening, and applying received events, in the background"""
+        self.__threads = [
+            threading.Thread(target=self.__server.serve_forever, daemon=True),
+            threading.Thread(target=self.__apply_events, daemon=True),
+        ]
+        for thread in self.__threads:
+            thread.start()
+        self._okta.logger.info(f"Listening for Okta event hooks on {self.url}")
+        return self
+
+    def wait_until_applied(self) -> None:
+        """Blocks until every event received so far has been applied"""
+        self.__events.join()
+
+    def stop(self) -> None:
+        """Stops listening, once the events already received are applied"""
+        self.__server.shutdown()
+        self.__server.server_close()
+        self.__events.put(None)
+        for thread in self.__threads:
+            thread.join()
+
+    def __enter__(self) -> "OktaEventHookReceiver":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+class OktaRuleMatcher:
+    """A policy rule's conditions compiled into sets, so checking whether the
+    rule applies to a user is a few set lookups rather than a walk through the
+    rule's JSON. Only the people and user type conditions depend on who the
+    user is. Conditions on the request itself, such as network zone, device,
+    platform, risk or an expression language condition, can not be decided
+    offline, and make the rule context_dependent.
+    """
+
+    # Condition keys whose value means "no restriction"
+    UNRESTRICTED_CONDITIONS: dict[str, Callable[[Any], bool]] = {
+        "network": lambda value: value.get("connection", "ANYWHERE") == "ANYWHERE",
+        "riskScore": lambda value: value.get("level", "ANY") == "ANY",
+        "risk": lambda value: value.get("level", "ANY") == "ANY",
+        "platform": lambda value: not value.get("exclude")
+        and all(
+            entry.get("type") == "ANY"
+            and entry.get("os", {}).get("type", "ANY") == "ANY"
+            for entry in value.get("include", [])
+        ),
+    }
+
+    def __init__(self, rule: dict):
+        self.rule_id: str = rule["id"]
+        self.rule_name: str = rule.get("name")
+        self.priority: int = rule.get("priority", 0)
+        self.access: str | None = (
+            rule.get("actions", {}).get("appSignOn", {}).get("access")
+        )
+        conditions: dict = rule.get("conditions") or {}
+        people: dict = conditions.get("people") or {}
+        users: dict = people.get("users") or {}
+        groups: dict = people.get("groups") or {}
+        user_types: dict = conditions.get("userType") or {}
+        self.include_users: frozenset = frozenset(users.get("include") or [])
+        self.exclude_users: frozenset = frozenset(users.get("exclude") or [])
+        self.include_groups: frozenset = frozenset(groups.get("include") or [])
+        self.exclude_groups: frozenset = frozenset(groups.get("exclude") or [])
+        self.include_user_types: frozenset = frozenset(user_types.get("include") or [])
+        self.exclude_user_types: frozenset = frozenset(user_types.get("exclude") or [])
+        self.context_conditions: list[str] = sorted(
+            key
+            for key, value in conditions.items()
+            if key not in ("people", "userType")
+            and value
+            and not self.UNRESTRICTED_CONDITIONS.get(key, lambda value: False)(value)
+        )
+
+    @property
+    def context_dependent(self) -> bool:
+        return bool(self.context_conditions)
+
+    def matches(self, user_id: str, user_type_id: str | None, group_ids: set) -> bool:
+        """Whether the rule's people and user type conditions include the user"""
+        if user_id in self.exclude_users or not self.exclude_groups.isdisjoint(
+            group_ids
+        ):
+            return False
+        if user_type_id is not None and user_type_id in self.exclude_user_types:
+            return False
+        if self.include_user_types and user_type_id not in self.include_user_types:
+            return False
+        if not self.include_users and not self.include_groups:
+            return True
+        return user_id in self.include_users or not self.include_groups.isdisjoint(
+            group_ids
+        )
+
+
+class OktaAccessPolicyEngine:
+    """Answers which rule of an app's sign on policy applies to a user, entirely
+    in memory. Built from the app -> policy mapping, the rules of each policy
+    and group memberships, with each rule compiled into an OktaRuleMatcher.
+    A user is evaluated once per distinct policy, not once per app, so the
+    whole user x app matrix costs users x policies rule checks.
+
+    As in Okta, a policy's ACTIVE rules are tried in priority order and the
+    first match applies. Rules that match the user but also depend on the
+    request (network zone, device and so on) may or may not apply, so they
+    are reported as conditional_rules, and evaluation carries on to the first
+    matching rule that does not depend on the request. The same goes for rules
+    that include or exclude groups whose members could not be fetched
+    (unknown_group_ids), when whether they match depends on those groups.
+    """
+
+    def __init__(
+        self,
+        app_policy_ids: dict[str, str | None],
+        policy_rules: dict[str, list[dict]],
+        group_memberships: OktaGroupMembershipIndex,
+        users_lookup_table: Mapping,
+        unknown_group_ids: Iterable[str] = (),
+    ):
+        self.app_policy_ids: dict[str, str | None] = dict(app_policy_ids)
+        self.group_memberships: OktaGroupMembershipIndex = group_memberships
+        self.users_lookup_table: Mapping = users_lookup_table
+        self.unknown_group_ids: frozenset = frozenset(unknown_group_ids)
+        self.matchers: dict[str, list[OktaRuleMatcher]] = {}
+        for policy_id in set(self.app_policy_ids.values()) - {None}:
+            self.matchers[policy_id] = sorted(
+                (
+                    OktaRuleMatcher(rule)
+                    for rule in policy_rules.get(policy_id, [])
+                    if rule.get("status", "ACTIVE") == "ACTIVE"
+                ),
+                key=lambda matcher: matcher.priority,
+            )
+
+    def __user_facts(self, user_id: str) -> tuple[str | None, set]:
+        user: dict = self.users_lookup_table.get(user_id) or {}
+        user_type_id: str | None = (user.get("type") or {}).get("id")
+        return user_type_id, set(self.group_memberships.groups_for_user(user_id))
+
+    def __evaluate_policy(
+        self, policy_id: str | None, user_id: str, user_type_id: str, group_ids: set
+    ) -> dict:
+        result: dict = {
+            "policy_id": policy_id,
+            "rule_id": None,
+            "rule_name": None,
+            "access": None,
+            "conditional_rules": [],
+        }
+        unknown: frozenset = self.unknown_group_ids
+        for matcher in self.matchers.get(policy_id, []):
+            unknown_includes: frozenset = matcher.include_groups & unknown
+            unknown_excludes: frozenset = matcher.exclude_groups & unknown
+            # The user may or may not be in groups whose members are unknown, so
+            # try the most and the least favourable memberships
+            if not matcher.matches(
+                user_id, user_type_id, (group_ids | unknown_includes) - unknown_excludes
+            ):
+                continue
+            depends_on: list[str] = list(matcher.context_conditions)
+            if (unknown_includes or unknown_excludes) and not matcher.matches(
+                user_id, user_type_id, (group_ids | unknown_excludes) - unknown_includes
+            ):
+                depends_on.append("group_memberships")
+            if depends_on:
+                result["conditional_rules"].append(
+                    {
+                        "rule_id": matcher.rule_id,
+                        "rule_name": matcher.rule_name,
+                        "access": matcher.access,
+                        "depends_on": depends_on,
+                    }
+                )
+                continue
+            result.update(
+                rule_id=matcher.rule_id,
+                rule_name=matcher.rule_name,
+                access=matcher.access,
+            )
+            break
+        return result
+
+    def evaluate(self, user_id: str, app_id: str) -> dict:
+        """Returns the policy of app_id, and the rule of it that applies to
+        user_id, as policy_id, rule_id, rule_name, access (ALLOW or DENY) and
+        conditional_rules. rule_id is None if no rule matches.
+
+        Raises:
+            KeyError: Raised if app_id is not a known application
+        """
+        user_type_id, group_ids = self.__user_facts(user_id)
+        return {
+            "user_id": user_id,
+            "app_id": app_id,
+            **self.__evaluate_policy(
+                self.app_policy_ids[app_id], user_id, user_type_id, group_ids
+            ),
+        }
+
+    def evaluate_user(self, user_id: str) -> dict[str, dict]:
+        """Returns evaluate's result for user_id on every app, keyed by app id"""
+        user_type_id, group_ids = self.__user_facts(user_id)
+        by_policy: dict[str | None, dict] = {
+            policy_id: self.__evaluate_policy(
+                policy_id, user_id, user_type_id, group_ids
+            )
+            for policy_id in set(self.app_policy_ids.values())
+        }
+        return {
+            app_id: {"user_id": user_id, "app_id": app_id, **by_policy[policy_id]}
+            for app_id, policy_id in self.app_policy_ids.items()
+        }
+
+    def iter_matrix(
+        self, user_ids: Iterable[str] = None, app_ids: Iterable[str] = None
+    ) -> Iterator[tuple[str, str, dict]]:
+        """Yields (user_id, app_id, result) for every user and app, by default
+        every user in users_lookup_table and every app. Results are produced
+        one user at a time, so the matrix is never held in memory.
+        """
+        app_ids = list(self.app_policy_ids if app_ids is None else app_ids)
+        policy_ids: set = {self.app_policy_ids[app_id] for app_id in app_ids}
+        for user_id in self.users_lookup_table if user_ids is None else user_ids:
+            user_type_id, group_ids = self.__user_facts(user_id)
+            by_policy: dict[str | None, dict] = {
+                policy_id: self.__evaluate_policy(
+                    policy_id, user_id, user_type_id, group_ids
+                )
+                for policy_id in policy_ids
+            }
+            for app_id in app_ids:
+                yield user_id, app_id, by_policy[self.app_policy_ids[app_id]]
+
+
+class OktaQuery:
+    """Builds the filter, search and q parameters of a paged Okta list endpoint,
+    so Okta does the filtering instead of every object being downloaded and
+    filtered in Python. Each method returns the query itself, so calls can be
+    chained. Iterating over the query pages through the results lazily, one
+    page at a time.
+
+        okta.query_users().where("status", "eq", "ACTIVE").where(
+            "profile.department", "eq", "Engineering"
+        )
+    """
+
+    OPERATORS: tuple = ("eq", "ne", "sw", "co", "ew", "gt", "ge", "lt", "le", "pr")
+
+    def __init__(
+        self,
+        okta: "OktaManagementFramework",
+        path: str,
+        supported_parameters: tuple,
+        limit: int = 200,
+        fixed_params: dict = None,
+        stop_on_empty_page: bool = False,
+    ):
+        self._okta: OktaManagementFramework = okta
+        self.path: str = path
+        self.supported_parameters: tuple = supported_parameters
+        self.limit: int = limit
+        self.fixed_params: dict = fixed_params or {}
+        # Some endpoints, like the system log, keep returning a next link even
+        # once there is nothing left to return
+        self.stop_on_empty_page: bool = stop_on_empty_page
+        self._filter_clauses: list[str] = []
+        self._search_clauses: list[str] = []
+        self._q: str | None = None
+        self._prefetch: int = 0
+
+    def __check_supported(self, parameter: str) -> None:
+        try:
+            if parameter not in self.supported_parameters:
+                raise ValueError(
+                    f"{self.path} does not support the {parameter} parameter. Supported parameters are {self.supported_parameters}"
+                )
+        except ValueError as value_error:
+            self._okta.logger.error(value_error)
+            raise value_error
+
+    @staticmethod
+    def format_value(value: Any) -> str:
+        """Formats a value for use in a filter or search expression"""
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, (int, float)):
+            return str(value)
+        if isinstance(value, datetime):
+            value = OktaManagementFramework._format_okta_timestamp(value)
+        return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+    def filter(self, expression: str) -> "OktaQuery":
+        """Adds a raw filter expression. Multiple expressions are joined with and"""
+        self.__check_supported("filter")
+        self._filter_clauses.append(expression)
+        return self
+
+    def search(self, expression: str) -> "OktaQuery":
+        """Adds a raw search expression. Multiple expressions are joined with and"""
+        self.__check_supported("search")
+        self._search_clauses.append(expression)
+        return self
+
+    def q(self, text: str) -> "OktaQuery":
+        """Sets the q parameter, which matches the start of names and emails"""
+        self.__check_supported("q")
+        self._q = text
+        return self
+
+    def prefetch(self, pages: int) -> "OktaQuery":
+        """Fetches up to this many pages ahead in the background while the
+        caller is still working through the current page
+        """
+        self._prefetch = pages
+        return self
+
+    def where(self, attribute: str, operator: str, value: Any = None) -> "OktaQuery":
+        """Adds attribute operator value to the search expression, quoting the
+        value as needed. Such as where("profile.platform", "eq", "WINDOWS") or
+        where("lastUpdated", "gt", datetime(2024, 6, 1, tzinfo=timezone.utc)).
+        Endpoints without search, such as apps and the system log, get it added
+        to the filter expression instead, where Okta supports fewer attributes
+        and operators.
+
+        Raises:
+            ValueError: Raised if operator is not one Okta supports, or the
+            endpoint supports neither search nor filter
+        """
+        try:
+            if operator not in self.OPERATORS:
+                raise ValueError(
+                    f"{operator} is not a valid operator. Valid operators are {self.OPERATORS}"
+                )
+            if not {"search", "filter"} & set(self.supported_parameters):
+                raise ValueError(
+                    f"{self.path} supports neither the search nor the filter parameter"
+                )
+        except ValueError as value_error:
+            self._okta.logger.error(value_error)
+            raise value_error
+        add_clause: Callable[[str], OktaQuery] = (
+            self.search if "search" in self.supported_parameters else self.filter
+        )
+        if operator == "pr":
+            return add_clause(f"{attribute} pr")
+        return add_clause(f"{attribute} {operator} {self.format_value(value)}")
+
+    @property
+    def params(self) -> dict:
+        """Query string parameters of the first page"""
+        params: dict = {"limit": self.limit, **self.fixed_params}
+        if self._filter_clauses:
+            params["filter"] = " and ".join(
+                f"({clause})" if len(self._filter_clauses) > 1 else clause
+                for clause in self._filter_clauses
+            )
+        if self._search_clauses:
+            params["search"] = " and ".join(
+                f"({clause})" if len(self._search_clauses) > 1 else clause
+                for clause in self._search_clauses
+            )
+        if self._q:
+            params["q"] = self._q
+        return params
+
+    def pages(self) -> Iterator[list[dict]]:
+        """Yields one page of results at a time, fetching each only when asked"""
+        self._okta.logger.debug(f"Querying {self.path} with {self.params}")
+        for page in self._okta._paginate(
+            self.path, self.params, prefetch=self._prefetch
+        ):
+            if not page and self.stop_on_empty_page:
+                return
+            yield page
+
+    def __iter__(self) -> Iterator[dict]:
+        for page in self.pages():
+            yield from page
+
+    def all(self) -> list[dict]:
+        """Fetches every page and returns all results in one list"""
+        return list(self)
+
+
+class OktaManagementFramework:
+
+    # Snapshot files start with SNAPSHOT_MAGIC, then one byte for the snapshot
+    # format version and one byte for how the rest of the file is encoded
+    SNAPSHOT_MAGIC: bytes = b"OKTAMF"
+    SNAPSHOT_VERSION: int = 1
+    SNAPSHOT_ENCODING_JSON_GZIP: int = 0
+    SNAPSHOT_ENCODING_MSGPACK_ZSTD: int = 1
+
+    USER_STATUSES: tuple = (
+        "STAGED",
+        "PROVISIONED",
+        "ACTIVE",
+        "RECOVERY",
+        "PASSWORD_EXPIRED",
+        "LOCKED_OUT",
+        "SUSPENDED",
+        "DEPROVISIONED",
+    )
+
+    VALID_POLICY_TYPES: tuple = (
+        "OKTA_SIGN_ON",
+        "PASSWORD",
+        "MFA_ENROLL",
+        "IDP_DISCOVERY",
+        "ACCESS_POLICY",
+    )
+
+    # Methods Okta applies the same way however many times they are sent, so a
+    # request that timed out or failed with a 5xx can safely be sent again
+    IDEMPOTENT_METHODS: tuple = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+    def __init__(
+        self,
+        okta_domain: str,
+        api_token: str,
+        logger: logging.Logger = None,
+        IS_TESTING: bool = False,
+        TESTING_COUNT_THRESHOLD: int = 100,
+        ONLY_ACTIVE_USERS: bool = False,
+        MAX_WORKERS: int = 4,
+        CONNECT_TIMEOUT: float = 10,
+        READ_TIMEOUT: float = 60,
+        CHECKPOINT_DIR: str = None,
+        REFRESH_INTERVALS: dict[str, float] = None,
+        PROGRESS_CALLBACK: Callable[[dict], Any] = None,
+        PROGRESS_INTERVAL: float = 10,
+    ):
+        ####
+        #### PRIVATE/PROTECTED CLASS FIELDS
+        # CONFIGURATION RELATED PROTECTED/PRIVATE CLASS FIELDS
+        self._okta_domain: str = None
+        self.__api_token: str = None
+        self._OKTA_RATE_AVOID_TIMER: float = 0.5
+        self._logger: logging.Logger = None
+        self._ONLY_ACTIVE_USERS = ONLY_ACTIVE_USERS
+
+        # Upper bound on the number of concurrent requests the concurrent crawls
+        # make. Every request made by them goes through the same pooled session
+        # and rate limiter, so raising this never exceeds the Okta rate limit,
+        # it only gets closer to it.
+        self._MAX_WORKERS: int = MAX_WORKERS
+        self.__session: requests.Session = requests.Session()
+        self.__session.mount(
+            "https://",
+            requests.adapters.HTTPAdapter(
+                pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS
+            ),
+        )
+        self.__rate_limiter: OktaRateLimiter = None
+
+        # Seconds to wait for a connection to Okta, and then for each read of
+        # its response, before a request is given up on and retried. Inside a
+        # deadline block, both are capped to the time left before the deadline.
+        self._CONNECT_TIMEOUT: float = CONNECT_TIMEOUT
+        self._READ_TIMEOUT: float = READ_TIMEOUT
+        self.__deadline_state = threading.local()
+
+        # Fan-out crawls report their progress every PROGRESS_INTERVAL seconds,
+        # to PROGRESS_CALLBACK if one was given, or to the logger otherwise.
+        # See OktaProgressTracker.snapshot for what the callback receives.
+        self._PROGRESS_CALLBACK: Callable[[dict], Any] = PROGRESS_CALLBACK
+        self._PROGRESS_INTERVAL: float = PROGRESS_INTERVAL
+
+        # If set, the long running crawls (users, devices, applications,
+        # user_factors, users_with_devices and device_users) record their
+        # progress to a file in this directory as they go. If a crawl is
+        # interrupted, the next one picks up where it stopped. A crawl's
+        # checkpoint file is removed once it completes.
+        self._CHECKPOINT_DIR: str = CHECKPOINT_DIR
+
+        # Seconds after which each collection named in here (users, devices,
+        # applications, groups or sign_on_policies) is considered stale. Reading
+        # a stale collection still returns it immediately, but also starts a
+        # background refresh that swaps the new data in once it is ready.
+        self.__refresh_intervals: dict[str, float] = dict(REFRESH_INTERVALS or {})
+        self.__loaded_at: dict[str, float] = {}
+        self.__synced_at: dict[str, str] = {}
+        self.__refreshing: set[str] = set()
+        self.__refresh_lock = threading.Lock()
+
+        # One lock per lazily loaded collection, so threads sharing this
+        # instance wait for a load already in progress instead of starting
+        # their own. Reentrant, as lookup tables load through their collection.
+        self.__load_locks: dict[str, threading.RLock] = {}
+        self.__load_locks_lock = threading.Lock()
+
+        # If this flag is set, then certain loops will purposefully terminate
+        # prematurely, as to shorten testing time. Some data, under normal
+        # conditions, could take hours to fetch, due to the shear number of resources
+        # that exist in Okta for that resource type (such as getting all users for
+        # every SINGLE device in Okta).
+        self.__IS_TESTING: bool = IS_TESTING
+        self.__TESTING_COUNT_THRESHOLD: int = max(TESTING_COUNT_THRESHOLD, 0)
+
+        # DEVICE RELATED PROTECTED/PRIVATE CLASS FIELDS
+        self.__devices: list[dict] = None
+        self.__devices_lookup_table: dict[dict] = None
+        self.__device_users: list[dict] = None
+        self.__device_users_lookup_table: dict[dict] = None
+        self.__users_with_devices: list["dict"] = None
+
+        # USER RELATED PROTECTED/PRIVATE CLASS FIELDS
+        self.__users: list[dict] = None
+        self._users_lookup_table: dict[dict] = None
+        # Index attached with attach_user_index, which stays users_lookup_table
+        # while users is loaded or refreshed
+        self.__attached_user_index: OktaSharedUserIndex = None
+        self.__user_devices_lookup_table: dict[dict] = None
+        self.__retrieved_user_profile_cache: dict[dict] = {}
+        self.__profile_cache_lock = threading.Lock()
+
+        # USER FACTOR RELATED CLASS FIELDS
+        self.__user_factors: list[dict] = None
+
+        # APPLICATION RELATED PROTECTED/PRIVATE CLASS FIELDS
+        self.__applications: list[dict] = None
+        self.__applications_lookup_table: dict[dict] = None
+        self.__application_assignments: OktaAssignmentIndex = None
+
+        # GROUP RELATED PROTECTED/PRIVATE CLASS FIELDS
+        self.__groups: list[dict] = None
+        self.__groups_lookup_table: dict[dict] = None
+        self.__group_memberships: OktaGroupMembershipIndex = None
+        # lastMembershipUpdated of each group when its members were last fetched
+        self.__group_membership_versions: dict[str, str] = {}
+        # Groups whose members could not be fetched by the last fetch
+        self.__failed_group_ids: set[str] = set()
+
+        # POLICY RELATED PROTECTED/PRIVATE CLASS FIELDS
+        self.__sign_on_policies: list[dict] = None
+        self.__sign_on_policies_lookup_table: dict[dict] = None
+        self.__app_sign_on_policy_ids: dict[str, str | None] = None
+        self.__policies: list[dict] = None
+        self.__policies_lookup_table: dict[dict] = None
+        self.__policy_rules_lookup_table: dict[str, list[dict]] = None
+
+        ####
+        #### PUBLIC CLASS FIELDS
+        # CONFIG RELATED PUBLIC CLASS FIELDS
+        if logger == None:
+            self.logger = logging.getLogger(__name__)
+        else:
+            self.logger = logger
+        self.__rate_limiter = OktaRateLimiter(logger=self._logger)
+        self.okta_domain: str = okta_domain
+        self.api_token: str = api_token
+
+        # DEVICE RELATED PUBLIC CLASS FIELDS
+        self.devices: list[dict] = None
+        self.devices_lookup_table: dict[dict] = None
+        self.device_users: list[dict] = None
+        self.users_with_devices: list[dict] = None
+
+        # USER RELATED PUBLIC CLASS FIELDS
+        self.users: list[dict] = None
+        self.users_lookup_table: dict[dict] = None
+
+        # USER FACTORS RELATED CLASS FIELDS
+        self.user_factors: list[dict] = None
+
+        # APPLICATION RELATED PUBLIC CLASS FIELDS
+        self.applications: list[dict] = None
+        self.application_assignments: OktaAssignmentIndex = None
+
+        # GROUP RELATED PUBLIC CLASS FIELDS
+        self.groups: list[dict] = None
+        self.group_memberships: OktaGroupMembershipIndex = None
+
+        # SIGN ON POLICIES RELATED PUBLIC CLASS FIELDS
+        self.sign_on_policies: list[dict] = None
+
+        self._logger.info(
+            "Finished initializing OktaManagementFramework class instance."
+        )
+
+    def validate_attrs_present(func):
+        """This function is used as a decorator, and will validate that the
+        current value of this classes  self.__api_token and self._okta_domain
+        are not None before executing the function it's called with
+
+        Args:
+            func (_type_): Function to execute if the class attribute values
+            are not None
+
+        Raises:
+            ValueError: Raised if self.__api_tokens is None
+            ValueError: raised if self._okta_domain is None
+            value_error: We catch the original value error from above, log it,
+            and raise the original error to the calling function
+
+        Returns:
+            _type_: Results of the function passed as a parameter
+        """
+
+        @wraps(func)
+        def validate_api_token_exists(self, *args, **kwargs):
+            try:
+                if self.__api_token is None:
+                    raise ValueError(
+                        "The current Okta API token is null. Cannot proceed."
+                    )
+                elif self._okta_domain is None:
+                    raise ValueError("The current Okta domain is null. Cannot proceed.")
+            except ValueError as value_error:
+                self._logger.error(value_error)
+                raise value_error
+
+            return func(self, *args, **kwargs)
+
+        return validate_api_token_exists
+
+    """
+    #work in progress
+    def okta_rate_limit_backoff(retries=3):
+        def decorator(func):
+            def wrapper(self, *args, **kwargs):
+                try:
+                    return func(self, *args, **kwargs)
+                except OktaRateLimitExceededError as e:
+                    rate_limit_reset_ts_int: int = int(e.headers["x-rate-limit-reset"])
+                    time_to_wait: int = rate_limit_reset_ts_int - int(time.time())
+                    self._logger.debug(f"Current time is {datetime.fromtimestamp(time.time(),tz=timezone.utc).strftime('%H:%M:%S %Y-%m-%d')} but rate limit does not reset until {datetime.fromtimestamp(rate_limit_reset_ts_int,tz=timezone.utc).strftime('%H:%M:%S %Y-%m-%d')}. Waiting until rate limit resets to continue")
+                    self._logger.warning(f"Waiting {time_to_wait} seconds until rate limit resets.")
+                    time.sleep(time_to_wait)
+                    return func(self, *args, **kwargs)
+                
+                    current_retry = 0
+                    self._logger.debug(
+                        "Headers supplied to raised OktaRateLimitExceededError - will base backoff on returned x-rate-limit-reset value."
+                    )
+                    while time.time() < int(e.headers["x-rate-limit-reset"]):
+                        if current_retry > retries:
+                            self._logger.error(f"Maximum retries of {retries} was exceeded - raising OktaRateLimitExceededError and ending backoff")
+                            raise e
+                        self._logger.warning(
+                            f"Current time is {datetime.fromtimestamp(time.time(),tz=timezone.utc).strftime('%H:%M:%S %Y-%m-%d')} but rate limit does not reset until {datetime.fromtimestamp(int(e.headers['x-rate-limit-reset']),tz=timezone.utc).strftime('%H:%M:%S %Y-%m-%d')}"
+                        )
+                        wait_period: int = (
+                            int(e.headers["x-rate-limit-reset"]) - time.time()
+                        )
+                        self._logger.warning(
+                            f"Waiting {wait_period} seconds for rate limit reset."
+                        )
+                        time.sleep(wait_period)
+                        current_retry += 1
+            return wrapper
+        return decorator"""
+
+    def rate_limit_backoff(delay=2, retries=3, rate_limit_only=False):
+        def decorator(func):
+            def wrapper(self, *args, **kwargs):
+                current_retry = 0
+                current_delay = delay
+                while current_retry < retries:
+                    try:
+                        return func(self, *args, **kwargs)
+                    except OktaDeadlineExceededError as e:
+                        raise e
+                    except Exception as e:
+                        # Okta rejects a 429 without acting on it, so only that
+                        # is safe to retry for requests that must not be repeated
+                        if rate_limit_only and not isinstance(
+                            e, OktaRateLimitExceededError
+                        ):
+                            raise e
+                        # Client errors other than 429 will fail the same way
+                        # however many times they are retried
+                        status_code = (
+                            getattr(e.response, "status_code", None)
+                            if isinstance(e, requests.exceptions.HTTPError)
+                            else None
+                        )
+                        if (
+                            status_code
+                            and 400 <= status_code < 500
+                            and status_code != 429
+                        ):
+                            raise e
+                        current_retry += 1
+                        if current_retry >= retries:
+                            raise e
+                        remaining_time = self._remaining_time()
+                        if (
+                            remaining_time is not None
+                            and remaining_time < current_delay
+                        ):
+                            raise OktaDeadlineExceededError(
+                                f"Not retrying, the deadline passes within {current_delay} seconds. Last error: {e}"
+                            ) from e
+                        self._logger.warning(
+                            f"Retrying in {current_delay} seconds..."
+                        )
+                        time.sleep(current_delay)
+                        current_delay *= 2
+
+            return wrapper
+
+        return decorator
+
+    ###########################################################################
+    # SECTION OF CODE RELATING TO CLASS UNDERLYING CONFIGURATION
+    ###########################################################################
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self._logger
+
+    @logger.setter
+    def logger(self, value: logging.Logger) -> None:
+        """Sets the logger object for the class
+
+        Args:
+            value (logging.Logger): A logger object for the class
+        """
+        self._logger = value
+
+    @property
+    def okta_domain(self) -> str:
+        """Returns value of Okta domain
+
+        Returns:
+            str: value of Okta domain
+        """
+        return self._okta_domain
+
+    @okta_domain.setter
+    def okta_domain(self, value: str) -> None:
+        """Sets the value of self.okta_domain
+
+        Args:
+            value (str): value of Okta domain
+
+        Raises:
+            ValueError: Raised if the value is None or a blank string
+            TypeError: Raised if the value is not a str
+            value_error: Raised to the calling function after logging the error
+            type_error: Raised to the calling function after logging the error
+        """
+        try:
+            if value is None or value == "":
+                raise ValueError("okta_domain cannot be None or an empty string.")
+            elif not isinstance(value, str):
+                raise TypeError(
+                    f"okta_domain must be of type str, but was {type(value)}."
+                )
+            else:
+                self._okta_domain = value
+        except ValueError as value_error:
+            self._logger.critical(value_error)
+            raise value_error
+        except TypeError as type_error:
+            self._logger.critical(type_error)
+            raise type_error
+
+    @property
+    def api_token(self) -> bool:
+        """Returns True or False based on if the API token is defined. We want to
+        protect the value of the api_token so we do not want a normal getter method
+        that returns the value of the token.
+
+        Returns:
+            bool: Returns True or False based on if the API token is defined or None
+        """
+
+        return True if self.__api_token is not None else False
+
+    @api_token.setter
+    def api_token(self, value: str) -> None:
+        """Sets the value of self.__api_token
+
+        Args:
+            value (str): value of Okta api token
+
+        Raises:
+            ValueError: Raised if the value is None or a blank string
+            TypeError: Raised if the value is not a str
+            value_error: Raised to the calling function after logging the error
+            type_error: Raised to the calling function after logging the error
+        """
+        try:
+            if value is None or value == "":
+                raise ValueError("api_token cannot be None or an empty string.")
+            elif not isinstance(value, str):
+                raise TypeError(
+                    f"api_token must be of type str, but was {type(value)}."
+                )
+            else:
+                self.__api_token = value
+        except ValueError as value_error:
+            self._logger.critical(value_error)
+            raise value_error
+        except TypeError as type_error:
+            self._logger.critical(type_error)
+            raise type_error
+
+    ###########################################################################
+    # SECTION OF CODE SHARED BY THE CONCURRENT CRAWLS
+    ###########################################################################
+
+    @contextmanager
+    def deadline(self, seconds: float) -> Iterator[None]:
+        """Gives everything run inside the with block seconds to finish, including
+        the work it hands to worker threads. Requests are sent with their
+        timeouts capped to the time left, and retries or rate limit waits that
+        would run past the deadline are not attempted. Once time runs out,
+        OktaDeadlineExceededError is raised with whatever was fetched so far. A
+        deadline nested inside another can only shorten it.
+
+        Args:
+            seconds (float): Time budget for the with block
+        """
+        previous: float | None = getattr(self.__deadline_state, "expires_at", None)
+        expires_at: float = time.monotonic() + seconds
+        if previous is not None:
+            expires_at = min(previous, expires_at)
+        self.__deadline_state.expires_at = expires_at
+        try:
+            yield
+        finally:
+            self.__deadline_state.expires_at = previous
+
+    def fetch_within(
+        self, collection: str, seconds: float, continuation_token: str = None
+    ) -> tuple[list[dict], str | None]:
+        """Fetches users, devices, applications or groups, giving up once seconds
+        have passed. Unlike reading the property, this does not cache what it
+        fetched on the class.
+
+        Args:
+            collection (str): users, devices, applications or groups
+            seconds (float): Time budget for this call
+            continuation_token (str, optional): Token returned by an earlier call
+            that ran out of time, to fetch the rest of the collection instead
+            of starting over. Defaults to None.
+
+        Raises:
+            ValueError: Raised if collection is not supported, or the token
+            belongs to a different collection
+
+        Returns:
+            tuple[list[dict], str | None]: The objects fetched, and a
+            continuation token for the rest, which is None if the collection
+            was fetched to the end
+        """
+        fetchers: dict[str, Callable[[], list[dict]]] = {
+            "users": self.__fetch_users,
+            "devices": self.__fetch_devices,
+            "applications": self.__fetch_applications,
+            "groups": self.__fetch_groups,
+        }
+        token: dict | None = None
+        if continuation_token is not None:
+            token = self._decode_continuation_token(continuation_token)
+        try:
+            if collection not in fetchers:
+                raise ValueError(
+                    f"{collection} can not be fetched within a deadline. Valid collections are {tuple(fetchers)}"
+                )
+            if token is not None and token["name"] != collection:
+                raise ValueError(
+                    f"The continuation token is for {token['name']}, not {collection}"
+                )
+        except ValueError as value_error:
+            self._logger.error(value_error)
+            raise value_error
+
+        with self.deadline(seconds):
+            try:
+                if token is None:
+                    return fetchers[collection](), None
+                return (
+                    self._crawl_pages(
+                        name=collection, url=token["url"], params=token["params"]
+                    ),
+                    None,
+                )
+            except OktaDeadlineExceededError as deadline_error:
+                self._logger.warning(
+                    f"Returning {len(deadline_error.partial_results or [])} {collection} fetched within {seconds} seconds, and a token to continue from."
+                )
+                return (
+                    deadline_error.partial_results or [],
+                    deadline_error.continuation_token,
+                )
+
+    def _remaining_time(self) -> float | None:
+        """Seconds left before the current thread's deadline, or None if there
+        is no deadline
+        """
+        expires_at: float | None = getattr(self.__deadline_state, "expires_at", None)
+        if expires_at is None:
+            return None
+        return expires_at - time.monotonic()
+
+    def _request_timeout(self) -> tuple[float, float]:
+        """Returns the (connect, read) timeout for the next request, capped to
+        the time left before the deadline
+
+        Raises:
+            OktaDeadlineExceededError: Raised if the deadline has already passed
+        """
+        remaining_time: float | None = self._remaining_time()
+        if remaining_time is None:
+            return self._CONNECT_TIMEOUT, self._READ_TIMEOUT
+        if remaining_time <= 0:
+            raise OktaDeadlineExceededError()
+        return (
+            min(self._CONNECT_TIMEOUT, remaining_time),
+            min(self._READ_TIMEOUT, remaining_time),
+        )
+
+    def _bind_deadline(self, func: Callable) -> Callable:
+        """Returns func wrapped to run under the calling thread's deadline, for
+        handing work to worker threads, which otherwise have no deadline
+        """
+        expires_at: float | None = getattr(self.__deadline_state, "expires_at", None)
+        if expires_at is None:
+            return func
+
+        @wraps(func)
+        def run_with_deadline(*args, **kwargs):
+            previous: float | None = getattr(self.__deadline_state, "expires_at", None)
+            self.__deadline_state.expires_at = expires_at
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.__deadline_state.expires_at = previous
+
+        return run_with_deadline
+
+    @validate_attrs_present
+    def _okta_request(
+        self,
+        method: str,
+        url: str,
+        params: dict = None,
+        json_body: dict = None,
+        retry: bool = None,
+    ) -> requests.Response:
+        """Makes a single request to the Okta API through this instance's pooled
+        session. Waits on the rate limiter before sending, and records the rate
+        limit headers of the response. A 429 raises OktaRateLimitExceededError,
+        which rate_limit_backoff retries once the limiter has waited out the reset.
+
+        Timeouts, connection errors and 5xx responses are only retried for the
+        IDEMPOTENT_METHODS. Okta may already have applied a POST that failed that
+        way, so sending it again could, for example, enroll a second factor.
+
+        Args:
+            method (str): HTTP method
+            url (str): Full URL, or a path such as /api/v1/apps which is
+            appended to the tenant's base URL
+            params (dict, optional): Query string parameters. Defaults to None.
+            json_body (dict, optional): JSON payload. Defaults to None.
+            retry (bool, optional): Whether to retry timeouts, connection errors
+            and 5xx responses. 429s are always retried. Defaults to True for the
+            IDEMPOTENT_METHODS, and False otherwise.
+
+        Raises:
+            OktaRateLimitExceededError: Raised if Okta responds with a 429
+            OktaDeadlineExceededError: Raised if the deadline passes before a
+            response is received
+            requests.exceptions.HTTPError: Raised for any other non 2xx response
+
+        Returns:
+            requests.Response: The response returned by Okta
+        """
+        if retry is None:
+            retry = method.upper() in self.IDEMPOTENT_METHODS
+        if retry:
+            return self.__send_request(method, url, params, json_body)
+        return self.__send_request_once(method, url, params, json_body)
+
+    @rate_limit_backoff(delay=1, retries=5)
+    def __send_request(
+        self, method: str, url: str, params: dict, json_body: dict
+    ) -> requests.Response:
+        return self.__request_okta(method, url, params, json_body)
+
+    @rate_limit_backoff(delay=1, retries=5, rate_limit_only=True)
+    def __send_request_once(
+        self, method: str, url: str, params: dict, json_body: dict
+    ) -> requests.Response:
+        return self.__request_okta(method, url, params, json_body)
+
+    def __request_okta(
+        self, method: str, url: str, params: dict, json_body: dict
+    ) -> requests.Response:
+        if url.startswith("/"):
+            url = f"https://{self._okta_domain}.okta.com{url}"
+        headers = {
+            "Accept": "application/json",
+            "Authorization": f"SSWS {self.__api_token}",
+            "User-Agent": "okta-management-framework/1.0.0",
+        }
+        self.__rate_limiter.wait(max_wait=self._remaining_time())
+        try:
+            response = self.__session.request(
+                method=method,
+                url=url,
+                headers=headers,
+                params=params,
+                json=json_body,
+                timeout=self._request_timeout(),
+            )
+        except requests.exceptions.Timeout as timeout_error:
+            remaining_time: float | None = self._remaining_time()
+            if remaining_time is not None and remaining_time <= 0:
+                raise OktaDeadlineExceededError(
+                    f"The deadline passed while waiting on {url}"
+                ) from timeout_error
+            raise timeout_error
+        self.__rate_limiter.update(response.headers)
+        if response.status_code == 429:
+            self._logger.warning(f"Rate limit was exceeded when requesting {url}")
+            raise OktaRateLimitExceededError(headers=dict(response.headers))
+        response.raise_for_status()
+        return response
+
+    def _track_progress(self, name: str, total: int) -> OktaProgressTracker:
+        """Returns a progress tracker for a fan-out crawl of total items"""
+        return OktaProgressTracker(
+            name=name,
+            total=total,
+            logger=self._logger,
+            rate_limiter=self.__rate_limiter,
+            callback=self._PROGRESS_CALLBACK,
+            report_every=self._PROGRESS_INTERVAL,
+        )
+
+    def _get_next_page_url(self, response: requests.Response) -> str | None:
+        """Returns the rel="next" URL from the link header of a response, or None
+        if this was the last page
+        """
+        link: str = response.headers.get("link", "")
+        if ' rel="next"' not in link:
+            return None
+        match = re.search(r'<.*?;\srel="self",\s<(.*?)>;\srel="next"$', link)
+        if not match:
+            self._logger.debug("No match found for next URL.")
+            return None
+        return match.group(1)
+
+    def _iterate_pages(
+        self, url: str, params: dict = None, prefetch: int = 0
+    ) -> Iterator[tuple[list[dict], str | None]]:
+        """Iteratively follows the rel="next" links of a paged Okta endpoint,
+        yielding each page as it is retrieved along with the URL of the page
+        after it
+
+        Args:
+            url (str): URL or API path of the first page
+            params (dict, optional): Query parameters for the first page. The
+            next links returned by Okta already carry them. Defaults to None.
+            prefetch (int, optional): If above 0, a background thread fetches up
+            to this many pages ahead of the caller, so the next page is usually
+            already there by the time the caller finishes with the current one.
+            Defaults to 0.
+
+        Yields:
+            Iterator[tuple[list[dict], str | None]]: One page of objects at a
+            time, and the next page's URL, which is None for the last page
+        """
+        if prefetch <= 0:
+            yield from self.__iterate_pages_in_order(url, params)
+            return
+
+        pages: queue.Queue = queue.Queue(maxsize=prefetch)
+        stopped = threading.Event()
+        finished = object()
+
+        def put(item: Any) -> bool:
+            # Gives up once the caller has stopped iterating, rather than wait
+            # forever for room in the queue
+            while not stopped.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch_ahead() -> None:
+            try:
+                for page in self.__iterate_pages_in_order(url, params):
+                    if not put(page):
+                        return
+                put(finished)
+            except Exception as error:
+                put(error)
+
+        threading.Thread(target=self._bind_deadline(fetch_ahead), daemon=True).start()
+        try:
+            while True:
+                item = pages.get()
+                if item is finished:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stopped.set()
+
+    def __iterate_pages_in_order(
+        self, url: str, params: dict = None
+    ) -> Iterator[tuple[list[dict], str | None]]:
+        next_page_url: str | None = url
+        while next_page_url:
+            response = self._okta_request("GET", next_page_url, params=params)
+            params = None
+            next_page_url = self._get_next_page_url(response)
+            if next_page_url:
+                self._logger.debug(f"URL for next page of data: {next_page_url}")
+            yield response.json(), next_page_url
+
+    def _paginate(
+        self, url: str, params: dict = None, prefetch: int = 0
+    ) -> Iterator[list[dict]]:
+        """Same as _iterate_pages, but only yields the pages"""
+        for page, _ in self._iterate_pages(url, params, prefetch=prefetch):
+            yield page
+
+    def __fetch_all_pages(self, url: str, params: dict = None) -> list[dict]:
+        results: list[dict] = []
+        for page in self._paginate(url, params):
+            results += page
+        return results
+
+    @staticmethod
+    def _format_okta_timestamp(value: datetime) -> str:
+        """Formats a datetime the way Okta filter and search expressions expect"""
+        timestamp: str = value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")
+        return timestamp[:-3] + "Z"
+
+    def _open_crawl_checkpoint(self, name: str, key: Any = None) -> OktaCrawlCheckpoint:
+        """Returns the checkpoint for the named crawl, which does nothing if
+        CHECKPOINT_DIR was not set. If key is given, such as the crawl's query or
+        the ids it fans out over, a hash of it is part of the file name, so a
+        crawl interrupted under one query or population is never resumed under
+        another.
+        """
+        if not self._CHECKPOINT_DIR:
+            return OktaCrawlCheckpoint(None)
+        os.makedirs(self._CHECKPOINT_DIR, exist_ok=True)
+        file_name: str = f"{self._okta_domain}-{name}"
+        if key is not None:
+            key_hash: str = hashlib.sha256(
+                json.dumps(key, sort_keys=True, default=str).encode("utf-8")
+            ).hexdigest()[:16]
+            file_name += f"-{key_hash}"
+        return OktaCrawlCheckpoint(
+            os.path.join(self._CHECKPOINT_DIR, f"{file_name}.ndjson")
+        )
+
+    def _crawl_pages(
+        self,
+        name: str,
+        url: str,
+        params: dict = None,
+        testing_threshold: int = None,
+    ) -> list[dict]:
+        """Fetches every page of a paged endpoint, recording each page and the
+        cursor to the next one in the crawl's checkpoint. If the checkpoint holds
+        pages from an interrupted crawl, those are kept and the crawl continues
+        from the last recorded cursor.
+
+        Args:
+            name (str): Name of the crawl, which, with a hash of url and
+            params, names its checkpoint file
+            url (str): URL or API path of the first page
+            params (dict, optional): Query parameters for the first page. Defaults to None.
+            testing_threshold (int, optional): Stop once at least this many
+            objects were fetched. Defaults to None.
+
+        Returns:
+            list[dict]: Every object on every page
+        """
+        checkpoint: OktaCrawlCheckpoint = self._open_crawl_checkpoint(
+            name, [url, params or {}]
+        )
+        items: list[dict] = []
+        entries: list[dict] = checkpoint.read_entries()
+        for entry in entries:
+            items += entry["items"]
+        if entries:
+            self._logger.info(
+                f"Resuming {name} crawl after {len(items)} objects recorded in {checkpoint.path}"
+            )
+            url, params = entries[-1]["next_page_url"], None
+
+        if url and not (
+            testing_threshold is not None and len(items) >= testing_threshold
+        ):
+            try:
+                for page, next_page_url in self._iterate_pages(url, params):
+                    items += page
+                    url, params = next_page_url, None
+                    checkpoint.record({"next_page_url": next_page_url, "items": page})
+                    if (
+                        testing_threshold is not None
+                        and len(items) >= testing_threshold
+                    ):
+                        self._logger.warning(
+                            f"IS_TESTING flag was set during the {name} crawl. {testing_threshold} or more objects have been fetched, so the crawl will end early."
+                        )
+                        break
+            except OktaDeadlineExceededError as deadline_error:
+                # The continuation token takes over from the checkpoint, which
+                # would otherwise hand the same objects out a second time
+                self._logger.warning(
+                    f"The deadline passed during the {name} crawl after {len(items)} objects were fetched."
+                )
+                checkpoint.clear()
+                deadline_error.partial_results = items
+                deadline_error.continuation_token = self._encode_continuation_token(
+                    name, url, params
+                )
+                raise deadline_error
+
+        checkpoint.clear()
+        return items
+
+    @staticmethod
+    def _encode_continuation_token(name: str, url: str, params: dict = None) -> str:
+        """Returns an opaque token recording where the named crawl stopped"""
+        token: dict = {"name": name, "url": url, "params": params}
+        return base64.urlsafe_b64encode(json.dumps(token).encode("utf-8")).decode()
+
+    def _decode_continuation_token(self, continuation_token: str) -> dict:
+        """Returns the crawl name, url and params recorded in a continuation token
+
+        Raises:
+            ValueError: Raised if the token was not made by _encode_continuation_token
+        """
+        try:
+            token: dict = json.loads(base64.urlsafe_b64decode(continuation_token))
+            if not isinstance(token, dict) or not {"name", "url", "params"} <= set(
+                token
+            ):
+                raise ValueError
+        except ValueError:
+            value_error = ValueError(
+                f"{continuation_token} is not a continuation token"
+            )
+            self._logger.error(value_error)
+            raise value_error
+        return token
+
+    def _crawl_fan_out(
+        self,
+        name: str,
+        ids: list[str],
+        fetch: Callable[[str], Any],
+        testing_threshold: int = None,
+        skip_errors: bool = True,
+    ) -> dict[str, Any]:
+        """Calls fetch for each id in turn, recording each result to the crawl's
+        checkpoint. Ids whose result is already in the checkpoint from an
+        interrupted crawl are not fetched again.
+
+        Args:
+            name (str): Name of the crawl, which, with a hash of ids, names its
+            checkpoint file
+            ids (list[str]): Ids to fetch, such as user or device ids
+            fetch (Callable[[str], Any]): Returns the result for one id
+            testing_threshold (int, optional): Stop after fetching this many ids,
+            not counting ids already in the checkpoint. Defaults to None.
+            skip_errors (bool, optional): Log and leave out ids that fetch raised
+            for, instead of raising. Defaults to True.
+
+        Returns:
+            dict[str, Any]: Dictionary where the key is the id, and the value the
+            result fetch returned for it
+        """
+        checkpoint: OktaCrawlCheckpoint = self._open_crawl_checkpoint(name, sorted(ids))
+        id_set: set[str] = set(ids)
+        results: dict[str, Any] = {
+            entry["id"]: entry["result"]
+            for entry in checkpoint.read_entries()
+            if entry["id"] in id_set
+        }
+        if results:
+            self._logger.info(
+                f"Resuming {name} crawl with {len(results)} of {len(ids)} results recorded in {checkpoint.path}"
+            )
+        to_fetch: int = len(ids) - len(results)
+        if testing_threshold is not None:
+            to_fetch = min(to_fetch, testing_threshold)
+        progress: OktaProgressTracker = self._track_progress(name, to_fetch)
+
+        # Only ids that are fetched count towards testing_threshold, the same
+        # as the total given to the progress tracker
+        attempted: int = 0
+        for id in ids:
+            if id in results:
+                continue
+            if testing_threshold is not None and attempted >= testing_threshold:
+                self._logger.warning(
+                    f"The IS_TESTING flag was set to true, and {testing_threshold} ids have been fetched during the {name} crawl, will now break out of loop"
+                )
+                break
+            attempted += 1
+            self._logger.debug(f"{name} crawl fetching {id}")
+            try:
+                results[id] = fetch(id)
+            except OktaDeadlineExceededError as deadline_error:
+                self._logger.warning(
+                    f"The deadline passed during the {name} crawl after {len(results)} of {len(ids)} ids were fetched."
+                )
+                deadline_error.partial_results = results
+                raise deadline_error
+            except Exception as error:
+                if not skip_errors:
+                    raise error
+                self._logger.error(error)
+                progress.advance(failed=True)
+                continue
+            checkpoint.record({"id": id, "result": results[id]})
+            progress.advance()
+
+        checkpoint.clear()
+        return results
+
+    def _stream_query(
+        self,
+        query: OktaQuery,
+        on_page: Callable[[list[dict]], Any] = None,
+        on_item: Callable[[dict], Any] = None,
+        prefetch: int = 0,
+    ) -> int:
+        """Passes each page of query's results to on_page, and each object to
+        on_item, as soon as the page arrives. Nothing is kept once the callbacks
+        return, so only about one page is held in memory at a time.
+
+        Returns:
+            int: Number of objects streamed
+        """
+        try:
+            if on_page is None and on_item is None:
+                raise ValueError("Provide on_page, on_item or both.")
+        except ValueError as value_error:
+            self._logger.error(value_error)
+            raise value_error
+        item_count: int = 0
+        for page in query.prefetch(prefetch).pages():
+            if on_page is not None:
+                on_page(page)
+            if on_item is not None:
+                for item in page:
+                    on_item(item)
+            item_count += len(page)
+        self._logger.info(f"Streamed {item_count} objects from {query.path}")
+        return item_count
+
+    def _read_checkpoint(self, checkpoint_path: str | None) -> dict | None:
+        """Returns the contents of a checkpoint file, or None if no checkpoint
+        path was given or nothing has been written to it yet
+        """
+        if not checkpoint_path or not os.path.exists(checkpoint_path):
+            return None
+        with open(checkpoint_path, "r", encoding="utf-8") as checkpoint_file:
+            checkpoint: dict = json.load(checkpoint_file)
+        self._logger.info(f"Resuming from checkpoint {checkpoint_path}")
+        return checkpoint
+
+    def _write_checkpoint(self, checkpoint_path: str | None, checkpoint: dict) -> None:
+        """Atomically replaces the checkpoint file with checkpoint, so a crash
+        mid-write never leaves a truncated checkpoint behind
+        """
+        if not checkpoint_path:
+            return
+        temp_path = f"{checkpoint_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(temp_path, checkpoint_path)
+        self._logger.debug(f"Wrote checkpoint to {checkpoint_path}")
+
+    def _clear_checkpoint(self, checkpoint_path: str | None) -> None:
+        """Removes a checkpoint file once the work it recorded is finished"""
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+            self._logger.debug(f"Removed checkpoint {checkpoint_path}")
+
+    def _run_bulk_operation(
+        self,
+        name: str,
+        items: Iterable[tuple[str, Any]],
+        operation: Callable[[Any, bool], dict],
+        ledger_path: str = None,
+        dry_run: bool = False,
+        max_workers: int = None,
+    ) -> list[dict]:
+        """Runs operation on every item on a thread pool, recording the outcome
+        of each to a ledger. Items the ledger already shows as completed are not
+        run again, so an interrupted bulk operation can be re-run with the same
+        items and ledger_path to pick up where it stopped.
 
-        Raises:
-            ValueError: Raised if self.__api_tokens is None
-            ValueError: raised if self._okta_domain is None
-            value_error: We catch the original value error from above, log it,
-            and raise the original error to the calling function
+        Args:
+            name (str): Name of the bulk operation, used for logging
+            items (Iterable[tuple[str, Any]]): (key, item) pairs, where key
+            uniquely identifies the item in the ledger
+            operation (Callable[[Any, bool], dict]): Called with each item and
+            dry_run. Returns a dict with at least a "status" of SUCCESS, SKIPPED
+            or FAILED, and raises if the item failed. With dry_run, it makes its
+            read only checks as usual, and returns a "status" of DRY_RUN with the
+            details of what it would do instead of doing it.
+            ledger_path (str, optional): File to record outcomes to. Defaults to None.
+            dry_run (bool, optional): Record what would be done, without changing
+            anything. Defaults to False.
+            max_workers (int, optional): Number of items to run at once.
+            Defaults to the MAX_WORKERS the class was created with.
 
         Returns:
-            _type_: Results of the function passed as a parameter
+            list[dict]: The outcome of every item, in the order items were given
         """
+        ledger = OktaBulkLedger(ledger_path)
+        previous_entries: dict[str, dict] = ledger.load()
+        items = list(items)
+        results: dict[str, dict] = {}
+        pending: list[tuple[str, Any]] = []
+        for key, item in items:
+            previous: dict | None = previous_entries.get(key)
+            if previous and previous["status"] in OktaBulkLedger.COMPLETED_STATUSES:
+                results[key] = previous
+            elif key not in results:
+                pending.append((key, item))
+                results[key] = None
+        self._logger.info(
+            f"{name}: {len(pending)} of {len(items)} items to process{' (dry run)' if dry_run else ''}. {len(items) - len(pending)} were already completed according to the ledger."
+        )
 
-        @wraps(func)
-        def validate_api_token_exists(self, *args, **kwargs):
+        def run_item(key: str, item: Any) -> dict:
             try:
-                if self.__api_token is None:
-                    raise ValueError(
-                        "The current Okta API token is null. Cannot proceed."
-                    )
-                elif self._okta_domain is None:
-                    raise ValueError("The current Okta domain is null. Cannot proceed.")
-            except ValueError as value_error:
-                self._logger.error(value_error)
-                raise value_error
+                return operation(item, dry_run)
+            except Exception as error:
+                self._logger.error(f"{name}: {key} failed: {error}")
+                return {"status": "FAILED", "error": str(error)}
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers or self._MAX_WORKERS
+        ) as executor:
+            futures = {
+                executor.submit(self._bind_deadline(run_item), key, item): key
+                for key, item in pending
+            }
+            progress: OktaProgressTracker = self._track_progress(name, len(futures))
+            for future in as_completed(futures):
+                entry: dict = {
+                    "key": futures[future],
+                    "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+                    **future.result(),
+                }
+                if dry_run:
+                    entry["dry_run"] = True
+                ledger.record(entry)
+                results[entry["key"]] = entry
+                progress.advance(failed=entry["status"] == "FAILED")
+
+        statuses: dict[str, int] = {}
+        for entry in results.values():
+            statuses[entry["status"]] = statuses.get(entry["status"], 0) + 1
+        self._logger.info(f"{name}: finished with {statuses}")
+        return [results[key] for key in dict.fromkeys(key for key, _ in items)]
 
-            return func(self, *args, **kwargs)
+    ###########################################################################
+    # SECTION OF CODE TO REFRESH STALE COLLECTIONS IN THE BACKGROUND
+    ###########################################################################
 
-        return validate_api_token_exists
+    REFRESHABLE_COLLECTIONS: tuple = (
+        "users",
+        "devices",
+        "applications",
+        "groups",
+        "sign_on_policies",
+    )
 
-    """
-    #work in progress
-    def okta_rate_limit_backoff(retries=3):
-        def decorator(func):
-            def wrapper(self, *args, **kwargs):
-                try:
-                    return func(self, *args, **kwargs)
-                except OktaRateLimitExceededError as e:
-                    rate_limit_reset_ts_int: int = int(e.headers["x-rate-limit-reset"])
-                    time_to_wait: int = rate_limit_reset_ts_int - int(time.time())
-                    self._logger.debug(f"Current time is {datetime.fromtimestamp(time.time(),tz=timezone.utc).strftime('%H:%M:%S %Y-%m-%d')} but rate limit does not reset until {datetime.fromtimestamp(rate_limit_reset_ts_int,tz=timezone.utc).strftime('%H:%M:%S %Y-%m-%d')}. Waiting until rate limit resets to continue")
-                    self._logger.warning(f"Waiting {time_to_wait} seconds until rate limit resets.")
-                    time.sleep(time_to_wait)
-                    return func(self, *args, **kwargs)
-                
-                    current_retry = 0
-                    self._logger.debug(
-                        "Headers supplied to raised OktaRateLimitExceededError - will base backoff on returned x-rate-limit-reset value."
-                    )
-                    while time.time() < int(e.headers["x-rate-limit-reset"]):
-                        if current_retry > retries:
-                            self._logger.error(f"Maximum retries of {retries} was exceeded - raising OktaRateLimitExceededError and ending backoff")
-                            raise e
-                        self._logger.warning(
-                            f"Current time is {datetime.fromtimestamp(time.time(),tz=timezone.utc).strftime('%H:%M:%S %Y-%m-%d')} but rate limit does not reset until {datetime.fromtimestamp(int(e.headers['x-rate-limit-reset']),tz=timezone.utc).strftime('%H:%M:%S %Y-%m-%d')}"
-                        )
-                        wait_period: int = (
-                            int(e.headers["x-rate-limit-reset"]) - time.time()
-                        )
-                        self._logger.warning(
-                            f"Waiting {wait_period} seconds for rate limit reset."
-                        )
-                        time.sleep(wait_period)
-                        current_retry += 1
-            return wrapper
-        return decorator"""
+    def set_refresh_interval(self, collection: str, seconds: float | None) -> None:
+        """Sets how many seconds collection can be read before it is refreshed
+        in the background, or stops refreshing it if seconds is None
 
-    def rate_limit_backoff(delay=2, retries=3):
-        def decorator(func):
-            def wrapper(self, *args, **kwargs):
-                current_retry = 0
-                current_delay = delay
-                while current_retry < retries:
-                    try:
-                        return func(self, *args, **kwargs)
-                    except Exception as e:
-                        current_retry += 1
-                        if current_retry >= retries:
-                            raise e
-                        self._logger.warning(
-                            f"Retrying in {current_delay} seconds..."
-                        )
-                        time.sleep(current_delay)
-                        current_delay *= 2
+        Raises:
+            ValueError: Raised if collection can not be refreshed in the background
+        """
+        try:
+            if collection not in self.REFRESHABLE_COLLECTIONS:
+                raise ValueError(
+                    f"{collection} can not be refreshed in the background. Valid collections are {self.REFRESHABLE_COLLECTIONS}"
+                )
+        except ValueError as value_error:
+            self._logger.error(value_error)
+            raise value_error
+        if seconds is None:
+            self.__refresh_intervals.pop(collection, None)
+        else:
+            self.__refresh_intervals[collection] = seconds
 
-            return wrapper
+    def refresh(self, collection: str, wait: bool = False) -> None:
+        """Refreshes collection in the background now, whatever its age. Readers
+        keep getting the current data until the new data is swapped in.
 
-        return decorator
+        Args:
+            collection (str): One of REFRESHABLE_COLLECTIONS
+            wait (bool, optional): Block until the refresh finishes. Defaults to False.
+        """
+        thread: threading.Thread | None = self.__start_refresh(collection)
+        if wait and thread is not None:
+            thread.join()
+
+    def __load_lock(self, collection: str) -> threading.RLock:
+        with self.__load_locks_lock:
+            if collection not in self.__load_locks:
+                self.__load_locks[collection] = threading.RLock()
+            return self.__load_locks[collection]
+
+    def __mark_loaded(self, collection: str, synced_at: str = None) -> None:
+        self.__loaded_at[collection] = time.monotonic()
+        if synced_at:
+            self.__synced_at[collection] = synced_at
+
+    def __refresh_if_stale(self, collection: str) -> None:
+        interval: float | None = self.__refresh_intervals.get(collection)
+        if interval is None or collection not in self.__loaded_at:
+            return
+        if time.monotonic() - self.__loaded_at[collection] >= interval:
+            self.__start_refresh(collection)
+
+    def __start_refresh(self, collection: str) -> threading.Thread | None:
+        with self.__refresh_lock:
+            if collection in self.__refreshing:
+                return None
+            self.__refreshing.add(collection)
+        self._logger.info(f"Refreshing {collection} in the background")
+        thread = threading.Thread(
+            target=self.__refresh_collection, args=(collection,), daemon=True
+        )
+        thread.start()
+        return thread
+
+    def __refresh_collection(self, collection: str) -> None:
+        synced_at: str = self._format_okta_timestamp(datetime.now(tz=timezone.utc))
+        succeeded: bool = False
+        try:
+            if collection == "users":
+                self.users = self.__fetch_users_delta()
+            elif collection == "devices":
+                devices: list = self.__fetch_devices()
+                self.devices_lookup_table = devices
+                self.devices = devices
+            elif collection == "applications":
+                self.applications = self.__fetch_applications()
+            elif collection == "groups":
+                self.groups = self.__fetch_groups()
+            elif collection == "sign_on_policies":
+                self.sign_on_policies = self.__fetch_okta_policies_by_type(
+                    type="ACCESS_POLICY"
+                )
+            succeeded = True
+            self._logger.info(f"Finished refreshing {collection} in the background")
+        except Exception as error:
+            self._logger.error(error)
+            self._logger.error(
+                f"Background refresh of {collection} failed. The current data will be kept until the next refresh."
+            )
+        finally:
+            # Also marked on failure, so a failing refresh is retried once per
+            # interval rather than on every read. The sync time only moves on
+            # success, so the next delta still covers the failed window.
+            self.__mark_loaded(collection, synced_at if succeeded else None)
+            with self.__refresh_lock:
+                self.__refreshing.discard(collection)
+
+    def __fetch_users_delta(self) -> list:
+        """Returns the current users with only the users updated since the last
+        sync fetched from Okta, or all users if they were never synced
+        """
+        since: str | None = self.__synced_at.get("users")
+        if since is None or self.__users is None:
+            return self.__fetch_users()
+        query: OktaQuery = self.query_users().filter(f'lastUpdated gt "{since}"')
+        changed_users: list[dict] = query.all()
+        users_by_id: dict[str, dict] = {user["id"]: user for user in self.__users}
+        for user in changed_users:
+            if user["status"] == "DEPROVISIONED" or (
+                self._ONLY_ACTIVE_USERS and user["status"] != "ACTIVE"
+            ):
+                users_by_id.pop(user["id"], None)
+            else:
+                users_by_id[user["id"]] = user
+        self._logger.info(f"{len(changed_users)} users changed since {since}")
+        return list(users_by_id.values())
 
     ###########################################################################
-    # SECTION OF CODE RELATING TO CLASS UNDERLYING CONFIGURATION
+    # SECTION OF CODE TO SAVE AND LOAD SNAPSHOTS OF THE CLASS STATE
     ###########################################################################
 
-    @property
-    def logger(self) -> logging.Logger:
-        return self._logger
+    def save_snapshot(self, path: str) -> None:
+        """Saves every collection this instance has already loaded (users,
+        devices, applications, policies, user factors, device users and so on)
+        to a single compressed file, which load_snapshot can restore without
+        calling Okta. Collections that were never loaded are left out, and
+        nothing is fetched to create the snapshot. Lookup tables are rebuilt on
+        load rather than saved.
 
-    @logger.setter
-    def logger(self, value: logging.Logger) -> None:
-        """Sets the logger object for the class
+        Uses msgpack and zstandard if they are installed, otherwise gzipped JSON.
 
         Args:
-            value (logging.Logger): A logger object for the class
+            path (str): File to write the snapshot to
         """
-        self._logger = value
+        collections: dict = {
+            "users": self.__users,
+            "devices": self.__devices,
+            "applications": self.__applications,
+            "sign_on_policies": self.__sign_on_policies,
+            "user_factors": self.__user_factors,
+            "users_with_devices": self.__users_with_devices,
+            "device_users": self.__device_users,
+            "policies": self.__policies,
+            "policy_rules_lookup_table": self.__policy_rules_lookup_table,
+            "app_sign_on_policy_ids": self.__app_sign_on_policy_ids,
+            "application_assignments": (
+                self.__application_assignments.to_dict()
+                if self.__application_assignments != None
+                else None
+            ),
+            "groups": self.__groups,
+            "group_memberships": (
+                self.__group_memberships.to_dict()
+                if self.__group_memberships != None
+                else None
+            ),
+            "group_membership_versions": self.__group_membership_versions or None,
+        }
+        snapshot: dict = {
+            "version": self.SNAPSHOT_VERSION,
+            "okta_domain": self._okta_domain,
+            "captured_at": datetime.now(tz=timezone.utc).isoformat(),
+            "collections": {k: v for k, v in collections.items() if v is not None},
+        }
 
-    @property
-    def okta_domain(self) -> str:
-        """Returns value of Okta domain
+        if msgpack is not None and zstandard is not None:
+            encoding: int = self.SNAPSHOT_ENCODING_MSGPACK_ZSTD
+            body: bytes = zstandard.ZstdCompressor(level=10).compress(
+                msgpack.packb(snapshot)
+            )
+        else:
+            encoding: int = self.SNAPSHOT_ENCODING_JSON_GZIP
+            body: bytes = gzip.compress(
+                json.dumps(snapshot, separators=(",", ":")).encode("utf-8")
+            )
 
-        Returns:
-            str: value of Okta domain
-        """
-        return self._okta_domain
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as snapshot_file:
+            snapshot_file.write(
+                self.SNAPSHOT_MAGIC + bytes([self.SNAPSHOT_VERSION, encoding]) + body
+            )
+        os.replace(temp_path, path)
+        self._logger.info(
+            f"Saved snapshot of {', '.join(snapshot['collections'])} to {path} ({len(body)} bytes)"
+        )
 
-    @okta_domain.setter
-    def okta_domain(self, value: str) -> None:
-        """Sets the value of self.okta_domain
+    def load_snapshot(self, path: str) -> datetime:
+        """Replaces this instance's collections with the ones saved in a
+        snapshot by save_snapshot, and rebuilds their lookup tables. No calls
+        are made to Okta. Collections that are not in the snapshot are left as
+        they are.
 
         Args:
-            value (str): value of Okta domain
+            path (str): Snapshot file to load
 
         Raises:
-            ValueError: Raised if the value is None or a blank string
-            TypeError: Raised if the value is not a str
-            value_error: Raised to the calling function after logging the error
-            type_error: Raised to the calling function after logging the error
+            ValueError: Raised if the file is not a snapshot, was made by a newer
+            version of this class, or was taken of a different Okta domain
+            ImportError: Raised if the snapshot was saved with msgpack and
+            zstandard, and they are not installed
+
+        Returns:
+            datetime: When the snapshot was captured
         """
+        with open(path, "rb") as snapshot_file:
+            data: bytes = snapshot_file.read()
+
+        header_length: int = len(self.SNAPSHOT_MAGIC) + 2
         try:
-            if value is None or value == "":
-                raise ValueError("okta_domain cannot be None or an empty string.")
-            elif not isinstance(value, str):
-                raise TypeError(
-                    f"okta_domain must be of type str, but was {type(value)}."
+            if not data.startswith(self.SNAPSHOT_MAGIC):
+                raise ValueError(f"{path} is not an OktaManagementFramework snapshot.")
+            version, encoding = data[len(self.SNAPSHOT_MAGIC) : header_length]
+            if version > self.SNAPSHOT_VERSION:
+                raise ValueError(
+                    f"{path} is a version {version} snapshot, but only versions up to {self.SNAPSHOT_VERSION} can be loaded."
+                )
+            if encoding == self.SNAPSHOT_ENCODING_MSGPACK_ZSTD:
+                if msgpack is None or zstandard is None:
+                    raise ImportError(
+                        f"{path} was saved with msgpack and zstandard, install them to load it."
+                    )
+                snapshot: dict = msgpack.unpackb(
+                    zstandard.ZstdDecompressor().decompress(data[header_length:])
                 )
             else:
-                self._okta_domain = value
-        except ValueError as value_error:
-            self._logger.critical(value_error)
-            raise value_error
-        except TypeError as type_error:
-            self._logger.critical(type_error)
-            raise type_error
+                snapshot: dict = json.loads(gzip.decompress(data[header_length:]))
+            if snapshot["okta_domain"] != self._okta_domain:
+                raise ValueError(
+                    f"{path} is a snapshot of {snapshot['okta_domain']}, not {self._okta_domain}."
+                )
+        except (ValueError, ImportError) as error:
+            self._logger.error(error)
+            raise error
 
-    @property
-    def api_token(self) -> bool:
-        """Returns True or False based on if the API token is defined. We want to
-        protect the value of the api_token so we do not want a normal getter method
-        that returns the value of the token.
+        collections: dict = snapshot["collections"]
+        if "users" in collections:
+            self.users = collections["users"]
+        if "devices" in collections:
+            self.devices = collections["devices"]
+            self.devices_lookup_table = collections["devices"]
+        if "applications" in collections:
+            self.applications = collections["applications"]
+        if "sign_on_policies" in collections:
+            self.sign_on_policies = collections["sign_on_policies"]
+        if "user_factors" in collections:
+            self.user_factors = collections["user_factors"]
+        if "users_with_devices" in collections:
+            self.users_with_devices = collections["users_with_devices"]
+        if "device_users" in collections:
+            self.device_users = collections["device_users"]
+            self.device_users_lookup_table = collections["device_users"]
+            self.user_devices_lookup_table = collections["device_users"]
+        if "policies" in collections:
+            self.__policies = collections["policies"]
+            self.__policies_lookup_table = {
+                policy["id"]: policy for policy in collections["policies"]
+            }
+            self.__policy_rules_lookup_table = collections.get(
+                "policy_rules_lookup_table", {}
+            )
+        if "app_sign_on_policy_ids" in collections:
+            self.__app_sign_on_policy_ids = collections["app_sign_on_policy_ids"]
+        if "application_assignments" in collections:
+            self.application_assignments = OktaAssignmentIndex.from_dict(
+                collections["application_assignments"]
+            )
+        if "groups" in collections:
+            self.groups = collections["groups"]
+        if "group_memberships" in collections:
+            self.__group_memberships = OktaGroupMembershipIndex.from_dict(
+                collections["group_memberships"]
+            )
+            self.__group_membership_versions = collections.get(
+                "group_membership_versions", {}
+            )
 
-        Returns:
-            bool: Returns True or False based on if the API token is defined or None
-        """
+        captured_at: datetime = datetime.fromisoformat(snapshot["captured_at"])
+        self._logger.info(
+            f"Loaded snapshot of {', '.join(collections)} captured at {captured_at.isoformat()} from {path}"
+        )
+        return captured_at
 
-        return True if self.__api_token is not None else False
+    ###########################################################################
+    # SECTION OF CODE TO SHARE THE USER INDEX BETWEEN PROCESSES
+    ###########################################################################
 
-    @api_token.setter
-    def api_token(self, value: str) -> None:
-        """Sets the value of self.__api_token
+    def publish_user_index(self, path: str) -> int:
+        """Writes users_lookup_table to an SQLite file that other processes open
+        read-only with OktaSharedUserIndex (or attach_user_index), instead of
+        each loading every user into its own memory. The file is built next to
+        path and then moved into place, so processes with the previous index
+        open carry on reading it undisturbed, and new ones get the new index.
 
         Args:
-            value (str): value of Okta api token
+            path (str): File to publish the index to
+
+        Returns:
+            int: Number of users published
+        """
+        users_lookup_table: Mapping = self.users_lookup_table
+        temporary_path: str = f"{path}.{os.getpid()}.tmp"
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        connection: sqlite3.Connection = sqlite3.connect(temporary_path)
+        try:
+            connection.execute("PRAGMA journal_mode=OFF")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(
+                "CREATE TABLE users (id TEXT PRIMARY KEY, login TEXT, record TEXT NOT NULL) WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            connection.executemany(
+                "INSERT INTO users VALUES (?, ?, ?)",
+                (
+                    (
+                        user_id,
+                        user.get("profile", {}).get("login"),
+                        json.dumps(user, separators=(",", ":")),
+                    )
+                    for user_id, user in users_lookup_table.items()
+                ),
+            )
+            # The login index is built after the rows are in, which is faster
+            # than keeping it up to date row by row
+            connection.execute(
+                "CREATE INDEX users_by_login ON users (login COLLATE NOCASE)"
+            )
+            connection.executemany(
+                "INSERT INTO metadata VALUES (?, ?)",
+                (
+                    ("okta_domain", self._okta_domain),
+                    ("published_at", datetime.now(tz=timezone.utc).isoformat()),
+                ),
+            )
+            connection.commit()
+        except sqlite3.Error as sqlite_error:
+            connection.close()
+            os.remove(temporary_path)
+            self._logger.error(sqlite_error)
+            self._logger.error(f"Could not publish the user index to {path}")
+            raise sqlite_error
+        connection.close()
+        os.replace(temporary_path, path)
+        self._logger.info(f"Published {len(users_lookup_table)} users to {path}")
+        return len(users_lookup_table)
+
+    def attach_user_index(self, path: str) -> OktaSharedUserIndex:
+        """Uses the index published at path as users_lookup_table, without
+        loading the users into this process. users itself is still fetched from
+        Okta if it is read, but users_lookup_table stays the attached index
+        until detach_user_index is called or users_lookup_table is set.
+
+        Args:
+            path (str): File the index was published to
 
         Raises:
-            ValueError: Raised if the value is None or a blank string
-            TypeError: Raised if the value is not a str
-            value_error: Raised to the calling function after logging the error
-            type_error: Raised to the calling function after logging the error
+            ValueError: Raised if the index was published for another Okta domain
+
+        Returns:
+            OktaSharedUserIndex: The opened index
         """
+        index = OktaSharedUserIndex(path)
         try:
-            if value is None or value == "":
-                raise ValueError("api_token cannot be None or an empty string.")
-            elif not isinstance(value, str):
-                raise TypeError(
-                    f"api_token must be of type str, but was {type(value)}."
+            if index.okta_domain != self._okta_domain:
+                index.close()
+                raise ValueError(
+                    f"The user index at {path} was published for {index.okta_domain}, not {self._okta_domain}"
                 )
-            else:
-                self.__api_token = value
         except ValueError as value_error:
-            self._logger.critical(value_error)
+            self._logger.error(value_error)
             raise value_error
-        except TypeError as type_error:
-            self._logger.critical(type_error)
-            raise type_error
+        self.detach_user_index()
+        self.__attached_user_index = index
+        self._users_lookup_table = index
+        self._logger.info(
+            f"Attached user index {path} with {len(index)} users, published {index.published_at}"
+        )
+        return index
+
+    def detach_user_index(self) -> None:
+        """Closes the index attached with attach_user_index. users_lookup_table
+        is rebuilt from users if they are loaded, and loaded from Okta on the
+        next read otherwise.
+        """
+        index: OktaSharedUserIndex | None = self.__attached_user_index
+        if index is None:
+            return
+        self.__attached_user_index = None
+        self._users_lookup_table = None
+        if self.__users is not None:
+            self.users_lookup_table = self.__users
+        index.close()
+        self._logger.info(f"Detached user index {index.path}")
 
     ###########################################################################
     # SECTION OF CODE TO FETCH DEVICES
@@ -315,8 +3004,12 @@ class OktaManagementFramework:
     @property
     def devices(self) -> list:
         if self.__devices == None:
-            self._logger.debug("Loading Okta devices")
-            self.__devices = self.__fetch_devices()
+            with self.__load_lock("devices"):
+                if self.__devices == None:
+                    self._logger.debug("Loading Okta devices")
+                    self.__devices = self.__fetch_devices()
+                    self.__mark_loaded("devices")
+        self.__refresh_if_stale("devices")
         self._logger.debug(f"Returning {len(self.__devices)} devices from Okta.")
         return self.__devices
 
@@ -328,14 +3021,18 @@ class OktaManagementFramework:
     @property
     def devices_lookup_table(self) -> list:
         if self.__devices_lookup_table == None:
-            self._logger.debug(
-                "The device_lookup_table is empty. Will populate the table."
-            )
-            if self.devices == None:
-                self._logger.debug("Loading Okta devices to create lookup table")
-                self.devices = self.__fetch_devices()
+            with self.__load_lock("devices"):
+                if self.__devices_lookup_table == None:
+                    self._logger.debug(
+                        "The device_lookup_table is empty. Will populate the table."
+                    )
+                    if self.devices == None:
+                        self._logger.debug(
+                            "Loading Okta devices to create lookup table"
+                        )
+                        self.devices = self.__fetch_devices()
 
-            self.devices_lookup_table = self.devices
+                    self.devices_lookup_table = self.devices
         self._logger.debug(
             f"Returning {len(self.__devices_lookup_table)} devices from Okta."
         )
@@ -349,97 +3046,66 @@ class OktaManagementFramework:
         if value == None:
             self._logger.debug(
                 "Value provided to users_lookup_table setter was None, so returning without making table."
-            )
-            return
-        devices_lookup_table: dict[dict] = {}
-        for device in value:
-            if device["id"] not in devices_lookup_table:
-                devices_lookup_table.update({device["id"]: device})
-
-        self.__devices_lookup_table = devices_lookup_table
-
-        self._logger.debug(
-            f"Created devices_lookup_table with length {len(self.__devices_lookup_table)}"
-        )
-
-    @validate_attrs_present
-    def __fetch_devices(
-        self, next_page_url: str = None, TRACK_COUNT_FOR_TESTING: int = 0
-    ) -> list:
-
-        if not next_page_url:
-            self._logger.info("Fetching Okta devices...")
-
-        device_list = []
-
-        url = f"https://{self._okta_domain}.okta.com/api/v1/devices"
-
-        if next_page_url:
-            self._logger.info("Fetching next page of Okta devices...")
-            full_url = next_page_url
-        else:
-            full_url = url + "?limit=1000"
-
-        payload = {}
-        headers = {
-            "Accept": "application/json",
-            "Authorization": f"SSWS {self.__api_token}",
-            "User-Agent": "okta-management-framework/1.0.0",
-        }
-
-        try:
-            self._logger.debug(
-                f"Sleeping for {self._OKTA_RATE_AVOID_TIMER} seconds to avoid Okta API rate limits."
-            )
-            time.sleep(self._OKTA_RATE_AVOID_TIMER)
-            response = requests.request("GET", full_url, headers=headers, data=payload)
-            response.raise_for_status()
-
-            data = response.json()
+            )
+            return
+        devices_lookup_table: dict[dict] = {}
+        for device in value:
+            if device["id"] not in devices_lookup_table:
+                devices_lookup_table.update({device["id"]: device})
 
-            if "error" in data:
-                raise requests.exceptions.RequestException(
-                    "Okta response states there as an error."
-                )
+        self.__devices_lookup_table = devices_lookup_table
 
-            device_list += data
+        self._logger.debug(
+            f"Created devices_lookup_table with length {len(self.__devices_lookup_table)}"
+        )
 
-        except requests.exceptions.RequestException as req_error:
-            self._logger.error(str(req_error))
-            self._logger.error("Error occurred fetching devices, terminating script.")
-            sys.exit(1)
-        except Exception as error:
-            self._logger.error(str(error))
-            self._logger.error("Error occurred fetching devices, terminating script.")
-            sys.exit(1)
+    def query_devices(self) -> OktaQuery:
+        """Returns a query of /api/v1/devices, which supports search, such as on
+        status, profile.platform or lastUpdated. Nothing is fetched until the
+        query is iterated over.
+        """
+        return OktaQuery(
+            okta=self,
+            path="/api/v1/devices",
+            supported_parameters=("search",),
+            limit=200,
+        )
 
-        try:
-            if ' rel="next"' in dict(response.headers)["link"]:
-                pattern = r'<.*?;\srel="self",\s<(.*?)>;\srel="next"$'
-                match = re.search(pattern, dict(response.headers)["link"])
+    def stream_devices(
+        self,
+        on_page: Callable[[list[dict]], Any] = None,
+        on_item: Callable[[dict], Any] = None,
+        prefetch: int = 0,
+    ) -> int:
+        """Same as stream_users, for all devices"""
+        return self._stream_query(self.query_devices(), on_page, on_item, prefetch)
 
-                if match:
-                    if self.__IS_TESTING and (
-                        TRACK_COUNT_FOR_TESTING >= self.__TESTING_COUNT_THRESHOLD
-                    ):
-                        self._logger.warning(
-                            f"IS_TESTING flag was set during __fetch_devices. {self.__TESTING_COUNT_THRESHOLD} or more devices have been fetched, so recursion will end early."
-                        )
-                        return device_list
+    @validate_attrs_present
+    def __fetch_devices(self) -> list:
+        """Pages through all Okta devices. If CHECKPOINT_DIR was set and an
+        earlier crawl was interrupted, continues from where it stopped.
 
-                    next_page_url = match.group(1)
-                    self._logger.debug(f"URL for next page of data: {next_page_url}")
-                    device_list += self.__fetch_devices(
-                        next_page_url=next_page_url,
-                        TRACK_COUNT_FOR_TESTING=TRACK_COUNT_FOR_TESTING
-                        + len(device_list),
-                    )
-                else:
-                    self._logger.debug("No match found for next URL.")
-        except KeyError:
-            self._logger.error("Link not found in reponse headers, must be all devices")
+        Raises:
+            requests.exceptions.RequestException: Raised if a page of devices
+            could not be fetched, after retrying
 
-        return device_list
+        Returns:
+            list: List of dictionaries, where each dict is a device object
+        """
+        self._logger.info("Fetching Okta devices...")
+        try:
+            return self._crawl_pages(
+                name="devices",
+                url="/api/v1/devices",
+                params={"limit": 1000},
+                testing_threshold=(
+                    self.__TESTING_COUNT_THRESHOLD if self.__IS_TESTING else None
+                ),
+            )
+        except requests.exceptions.RequestException as req_error:
+            self._logger.error(str(req_error))
+            self._logger.error("Error occurred fetching devices.")
+            raise req_error
 
     ###########################################################################
     # SECTION OF CODE TO FETCH USERS
@@ -448,31 +3114,48 @@ class OktaManagementFramework:
     @property
     def users(self) -> list:
         if self.__users == None:
-            self._logger.debug("Loading Okta users")
-            self.users = self.__fetch_users()
+            with self.__load_lock("users"):
+                if self.__users == None:
+                    self._logger.debug("Loading Okta users")
+                    synced_at: str = self._format_okta_timestamp(
+                        datetime.now(tz=timezone.utc)
+                    )
+                    self.users = self.__fetch_users()
+                    self.__mark_loaded("users", synced_at)
+        self.__refresh_if_stale("users")
         self._logger.debug(f"Returning {len(self.__users)} users from Okta.")
         return self.__users
 
     @users.setter
     def users(self, value: list) -> None:
         self._logger.debug("Okta users setter called. Will fetch Okta users")
+        # The lookup table is built before the new list is published, so a
+        # background refresh never leaves readers with a half built table
+        # An index attached with attach_user_index stays the lookup table
+        if self.__attached_user_index is None:
+            if value is None:
+                self._users_lookup_table = None
+            else:
+                self.users_lookup_table = value
         self.__users: list = value
-        self._users_lookup_table: dict[dict] = value
         if value is not None:
-            for user in value:
-                self.__add_user_to_cache(user_profile=user)
+            with self.__profile_cache_lock:
+                for user in value:
+                    self.__retrieved_user_profile_cache[user["id"]] = user
 
     @property
     def users_lookup_table(self) -> list:
         if self._users_lookup_table == None:
-            self._logger.debug(
-                "The user_lookup_table is empty. Will populate the table."
-            )
-            if self.users == None:
-                self._logger.debug("Loading Okta users to create lookup table")
-                self.users = self.__fetch_users()
+            with self.__load_lock("users"):
+                if self._users_lookup_table == None:
+                    self._logger.debug(
+                        "The user_lookup_table is empty. Will populate the table."
+                    )
+                    if self.users == None:
+                        self._logger.debug("Loading Okta users to create lookup table")
+                        self.users = self.__fetch_users()
 
-            self.users_lookup_table = self.users
+                    self.users_lookup_table = self.users
         self._logger.debug(
             f"Returning {len(self._users_lookup_table)} users from Okta."
         )
@@ -492,97 +3175,246 @@ class OktaManagementFramework:
         for user in value:
             if user["id"] not in users_lookup_table:
                 users_lookup_table.update({user["id"]: user})
+        index: OktaSharedUserIndex | None = self.__attached_user_index
+        self.__attached_user_index = None
         self._users_lookup_table = users_lookup_table
+        if index is not None:
+            index.close()
+            self._logger.info(
+                f"Closed user index {index.path}, as users_lookup_table was replaced"
+            )
         self._logger.debug(
             f"Created users_lookup_table with length {len(users_lookup_table)}"
         )
 
     @validate_attrs_present
-    @rate_limit_backoff(delay=1, retries=5)
-    def __fetch_users(
-        self, next_page_url: str = None, TRACK_COUNT_FOR_TESTING: int = 0
-    ) -> list:
-
-        if not next_page_url:
-            self._logger.info("Fetching Okta users...")
-
-        user_list = []
-
-        url = f"https://{self._okta_domain}.okta.com/api/v1/users"
-
-        if next_page_url:
-            self._logger.info("Fetching next page of Okta users...")
-            full_url = next_page_url
-        else:
-            url_query_params = "limit=200"
-            if self._ONLY_ACTIVE_USERS:
-                self._logger.debug("Flag set to only return active users")
-                url_query_params += "&filter=status eq 'ACTIVE'"
-            full_url = url + "?" + urllib.parse.quote_plus(url_query_params)
+    def __fetch_users(self) -> list:
+        """Pages through all Okta users, or only ACTIVE users if the
+        ONLY_ACTIVE_USERS flag was set. If CHECKPOINT_DIR was set and an earlier
+        crawl was interrupted, continues from where it stopped.
 
-        payload = {}
-        headers = {
-            "Accept": "application/json",
-            "Authorization": f"SSWS {self.__api_token}",
-            "User-Agent": "okta-management-framework/1.0.0",
-        }
+        Raises:
+            requests.exceptions.RequestException: Raised if a page of users
+            could not be fetched, after retrying
 
+        Returns:
+            list: List of dictionaries, where each dict is a user object
+        """
+        self._logger.info("Fetching Okta users...")
+        params: dict = {"limit": 200}
+        if self._ONLY_ACTIVE_USERS:
+            self._logger.debug("Flag set to only return active users")
+            params["filter"] = 'status eq "ACTIVE"'
         try:
-            """self._logger.debug(
-                f"Sleeping for {self._OKTA_RATE_AVOID_TIMER} seconds to avoid Okta API rate limits."
+            return self._crawl_pages(
+                name="users",
+                url="/api/v1/users",
+                params=params,
+                testing_threshold=(
+                    self.__TESTING_COUNT_THRESHOLD if self.__IS_TESTING else None
+                ),
             )
-            time.sleep(self._OKTA_RATE_AVOID_TIMER)"""
-            response = requests.request("GET", full_url, headers=headers, data=payload)
-            response.raise_for_status()
+        except requests.exceptions.RequestException as req_error:
+            self._logger.error(str(req_error))
+            self._logger.error("Error occurred fetching users.")
+            raise req_error
 
-            data = response.json()
+    def query_users(self) -> OktaQuery:
+        """Returns a query of /api/v1/users that supports filter, search and q.
+        Nothing is fetched until the query is iterated over.
+        """
+        return OktaQuery(
+            okta=self,
+            path="/api/v1/users",
+            supported_parameters=("filter", "search", "q"),
+            limit=200,
+        )
 
-            if "error" in data:
-                raise requests.exceptions.RequestException(
-                    "Okta response states there as an error."
-                )
+    def stream_users(
+        self,
+        on_page: Callable[[list[dict]], Any] = None,
+        on_item: Callable[[dict], Any] = None,
+        prefetch: int = 0,
+    ) -> int:
+        """Pages through all users like the users property does (respecting
+        ONLY_ACTIVE_USERS), but hands each page to on_page and each user to
+        on_item as it arrives instead of collecting them. The users are not
+        kept in users or users_lookup_table.
 
-            user_list += data
+        Args:
+            on_page (Callable[[list[dict]], Any], optional): Called with each page of users.
+            on_item (Callable[[dict], Any], optional): Called with each user.
+            prefetch (int, optional): Pages to fetch ahead in the background. Defaults to 0.
 
-        except requests.exceptions.RequestException as req_error:
-            self._logger.error(str(req_error))
-            self._logger.error("Error occurred fetching users, terminating script.")
-            sys.exit(1)
-        except Exception as error:
-            self._logger.error(str(error))
-            self._logger.error("Error occurred fetching users, terminating script.")
-            sys.exit(1)
+        Returns:
+            int: Number of users streamed
+        """
+        query: OktaQuery = self.query_users()
+        if self._ONLY_ACTIVE_USERS:
+            query.filter('status eq "ACTIVE"')
+        return self._stream_query(query, on_page, on_item, prefetch)
 
-        try:
-            if ' rel="next"' in dict(response.headers)["link"]:
-                pattern = r'<.*?;\srel="self",\s<(.*?)>;\srel="next"$'
-                match = re.search(pattern, dict(response.headers)["link"])
+    def fetch_users_sharded(
+        self,
+        partition_by: str = "created",
+        shards: int = 16,
+        max_workers: int = None,
+        include_deprovisioned: bool = False,
+    ) -> list[dict]:
+        """Fetches all users by splitting them into disjoint partitions and
+        paging through the partitions in parallel, instead of walking the single
+        /api/v1/users cursor one page at a time. The result replaces users (and
+        users_lookup_table).
+
+        The partitions cover every user by construction. Users that changed
+        while the partitions were being walked could have moved from one
+        partition to another, so once every partition is done the users updated
+        since the crawl started are fetched again and merged in. Any user
+        returned by more than one partition is only kept once. The number of
+        users each partition returned is logged, and a warning gives the number
+        of users returned twice or only found by the second fetch, if any.
+
+        users counts as loaded as of the start of the crawl, so REFRESH_INTERVALS
+        applies, and the next delta refresh covers everything since then.
 
-                if match:
+        Args:
+            partition_by (str, optional): "created" to split users into shards
+            ranges of creation time, or "status" to use one partition per user
+            status. Defaults to "created".
+            shards (int, optional): Number of creation time ranges when
+            partition_by is "created". Defaults to 16.
+            max_workers (int, optional): Number of partitions to page through at
+            once. Defaults to the MAX_WORKERS the class was created with.
+            include_deprovisioned (bool, optional): Also return DEPROVISIONED
+            users, which the users property leaves out. Defaults to False.
 
-                    if self.__IS_TESTING and (
-                        (TRACK_COUNT_FOR_TESTING - 200)
-                        >= self.__TESTING_COUNT_THRESHOLD
-                    ):
-                        self._logger.warning(
-                            f"IS_TESTING flag was set during __fetch_users. {self.__TESTING_COUNT_THRESHOLD} or more users have been fetched, so recursion will end early."
-                        )
-                        return user_list
+        Raises:
+            ValueError: Raised if partition_by is not "created" or "status"
+            requests.exceptions.RequestException: Raised if a partition could
+            not be fetched, after retrying
 
-                    next_page_url = match.group(1)
-                    self._logger.debug(f"URL for next page of data: {next_page_url}")
-                    user_list += self.__fetch_users(
-                        next_page_url=next_page_url,
-                        TRACK_COUNT_FOR_TESTING=TRACK_COUNT_FOR_TESTING
-                        + len(user_list),
-                    )
-                else:
-                    self._logger.debug("No match found for next URL.")
+        Returns:
+            list: List of dictionaries, where each dict is a user object
+        """
+        try:
+            if partition_by not in ("created", "status"):
+                raise ValueError(
+                    f"partition_by must be 'created' or 'status', but was {partition_by}."
+                )
+        except ValueError as value_error:
+            self._logger.error(value_error)
+            raise value_error
 
-        except KeyError:
-            self._logger.error("Link not found in reponse headers, must be all users")
+        crawl_started: str = self._format_okta_timestamp(datetime.now(tz=timezone.utc))
+        allowed_statuses: set[str] = set(self.USER_STATUSES)
+        if not include_deprovisioned:
+            allowed_statuses.discard("DEPROVISIONED")
+        if self._ONLY_ACTIVE_USERS:
+            allowed_statuses = {"ACTIVE"}
+
+        if partition_by == "status":
+            partitions: list[dict] = [
+                {"search": f'status eq "{status}"'}
+                for status in self.USER_STATUSES
+                if status in allowed_statuses
+            ]
+        else:
+            partitions: list[dict] = self.__created_user_partitions(shards)
+            if self._ONLY_ACTIVE_USERS:
+                for partition in partitions:
+                    partition["search"] += ' and status eq "ACTIVE"'
 
-        return user_list
+        self._logger.info(
+            f"Fetching Okta users in {len(partitions)} partitions by {partition_by}..."
+        )
+        users_by_id: dict[str, dict] = {}
+        partition_counts: dict[str, int] = {}
+        with ThreadPoolExecutor(
+            max_workers=max_workers or self._MAX_WORKERS
+        ) as executor:
+            futures = {
+                executor.submit(
+                    self._bind_deadline(self.__fetch_all_pages),
+                    "/api/v1/users",
+                    {"limit": 200, **partition},
+                ): partition["search"]
+                for partition in partitions
+            }
+            for future in as_completed(futures):
+                partition_users: list[dict] = future.result()
+                partition_counts[futures[future]] = len(partition_users)
+                self._logger.info(
+                    f"Fetched {len(partition_users)} users where {futures[future]}"
+                )
+                for user in partition_users:
+                    users_by_id[user["id"]] = user
+
+        changed_users: list[dict] = self.__fetch_all_pages(
+            "/api/v1/users",
+            {"limit": 200, "search": f'lastUpdated gt "{crawl_started}"'},
+        )
+        # Users no partition returned, which were either created during the
+        # crawl or moved between partitions before either one reached them
+        missed_count: int = len(
+            {user["id"] for user in changed_users} - users_by_id.keys()
+        )
+        partition_total: int = sum(partition_counts.values())
+        duplicate_count: int = partition_total - len(users_by_id)
+        for user in changed_users:
+            users_by_id[user["id"]] = user
+        users: list[dict] = [
+            user for user in users_by_id.values() if user["status"] in allowed_statuses
+        ]
+
+        completeness: str = (
+            f"The {len(partitions)} partitions returned {partition_total} users, of which {partition_total - duplicate_count} were unique. "
+            f"{duplicate_count} users were returned by more than one partition, and {missed_count} were only found by fetching the {len(changed_users)} users that changed during the crawl."
+        )
+        if duplicate_count or missed_count:
+            self._logger.warning(completeness)
+        else:
+            self._logger.info(completeness)
+        self._logger.info(
+            f"Fetched {len(users)} users from {len(partitions)} partitions."
+        )
+        with self.__load_lock("users"):
+            self.users = users
+            self.__mark_loaded("users", crawl_started)
+        return users
+
+    def __created_user_partitions(self, shards: int) -> list[dict]:
+        """Splits the time between the oldest user's creation and now into
+        shards search expressions. The first and last are open ended, so
+        together they always cover every user.
+        """
+        oldest_users: list[dict] = self._okta_request(
+            "GET",
+            "/api/v1/users",
+            params={
+                "search": 'created gt "1970-01-01T00:00:00.000Z"',
+                "sortBy": "created",
+                "sortOrder": "asc",
+                "limit": 1,
+            },
+        ).json()
+        if not oldest_users or shards <= 1:
+            return [{"search": 'created gt "1970-01-01T00:00:00.000Z"'}]
+
+        oldest: datetime = datetime.fromisoformat(
+            oldest_users[0]["created"].replace("Z", "+00:00")
+        )
+        shard_length = (datetime.now(tz=timezone.utc) - oldest) / shards
+        boundaries: list[str] = [
+            self._format_okta_timestamp(oldest + shard_length * i)
+            for i in range(1, shards)
+        ]
+        partitions: list[dict] = [{"search": f'created lt "{boundaries[0]}"'}]
+        for lower, upper in zip(boundaries, boundaries[1:]):
+            partitions.append(
+                {"search": f'created ge "{lower}" and created lt "{upper}"'}
+            )
+        partitions.append({"search": f'created ge "{boundaries[-1]}"'})
+        return partitions
 
     @validate_attrs_present
     def fetch_user_by_id(self, user_id: str) -> dict:
@@ -604,7 +3436,11 @@ class OktaManagementFramework:
         payload = {}
         try:
             response = requests.request(
-                method="GET", url=full_url, headers=headers, data=payload
+                method="GET",
+                url=full_url,
+                headers=headers,
+                data=payload,
+                timeout=self._request_timeout(),
             )
             response.raise_for_status()
 
@@ -634,18 +3470,110 @@ class OktaManagementFramework:
 
     def __add_user_to_cache(self, user_profile: dict) -> None:
         self._logger.debug(f"Adding user {user_profile['id']} to local user cache")
-        if user_profile["id"] not in self.__retrieved_user_profile_cache:
-            self.__retrieved_user_profile_cache.update(
-                {user_profile["id"]: user_profile}
-            )
+        with self.__profile_cache_lock:
+            self.__retrieved_user_profile_cache[user_profile["id"]] = user_profile
 
     def __check_cache_for_user(self, user_id: str) -> dict | None:
-        return (
-            self.__retrieved_user_profile_cache[user_id]
-            if user_id in self.__retrieved_user_profile_cache
-            else None
+        with self.__profile_cache_lock:
+            return self.__retrieved_user_profile_cache.get(user_id)
+
+    def bulk_update_user_profiles(
+        self,
+        updates: dict[str, dict] | Iterable[tuple[str, dict]],
+        ledger_path: str = None,
+        dry_run: bool = False,
+        max_workers: int = None,
+    ) -> list[dict]:
+        """Sets profile attributes, such as department or costCenter, on many
+        users concurrently. The values asked for are compared with the user's
+        profile in users_lookup_table if users are already loaded, or fetched
+        from Okta otherwise, and only the attributes that actually differ are
+        sent, as a partial update. Users are never all loaded just for this.
+        Users with nothing to change are SKIPPED without an update. Cached users
+        are updated with Okta's response.
+
+        Args:
+            updates (dict[str, dict] | Iterable[tuple[str, dict]]): user id ->
+            profile attributes to set, as a dict or (user_id, attributes) pairs
+            ledger_path (str, optional): File to record the outcome of each user
+            to, which doubles as the report of the run. Re-running with the same
+            ledger_path skips users that were already given the same values.
+            Defaults to None.
+            dry_run (bool, optional): Only report what would change. Defaults to False.
+            max_workers (int, optional): Number of users to update at once.
+            Defaults to the MAX_WORKERS the class was created with.
+
+        Returns:
+            list[dict]: Outcome of each user, keyed on "user_id:hash" where hash
+            is of the attributes asked for, with the user id, the changes as
+            {attribute: {"from": old, "to": new}}, status and timestamp
+        """
+        if isinstance(updates, dict):
+            updates = updates.items()
+        users_lookup_table: Mapping = self._users_lookup_table or {}
+
+        def update_profile(user_update: tuple[str, dict], dry_run: bool) -> dict:
+            user_id, attributes = user_update
+            user: dict | None = users_lookup_table.get(user_id)
+            if user is None:
+                user = self._okta_request("GET", f"/api/v1/users/{user_id}").json()
+            profile: dict = user.get("profile", {})
+            changes: dict[str, dict] = {
+                attribute: {"from": profile.get(attribute), "to": value}
+                for attribute, value in attributes.items()
+                if profile.get(attribute) != value
+            }
+            if not changes:
+                return {
+                    "status": "SKIPPED",
+                    "reason": "No changes",
+                    "user_id": user_id,
+                    "changes": {},
+                }
+            if dry_run:
+                return {"status": "DRY_RUN", "user_id": user_id, "changes": changes}
+            response = self._okta_request(
+                "POST",
+                f"/api/v1/users/{user_id}",
+                json_body={
+                    "profile": {
+                        attribute: change["to"] for attribute, change in changes.items()
+                    }
+                },
+            )
+            # Updated in place, as the same dict is shared by users and
+            # users_lookup_table
+            if isinstance(users_lookup_table, dict) and user_id in users_lookup_table:
+                users_lookup_table[user_id].update(response.json())
+            self.__add_user_to_cache(response.json())
+            self._logger.info(
+                f"Updated {', '.join(changes)} in the profile of user {user_id}"
+            )
+            return {"status": "SUCCESS", "user_id": user_id, "changes": changes}
+
+        # The key includes the values asked for, so a later feed with different
+        # values for a user is not skipped as already done
+        return self._run_bulk_operation(
+            name="Bulk user profile update",
+            items=(
+                (
+                    f"{user_id}:{self.__hash_profile_update(attributes)}",
+                    (user_id, attributes),
+                )
+                for user_id, attributes in updates
+            ),
+            operation=update_profile,
+            ledger_path=ledger_path,
+            dry_run=dry_run,
+            max_workers=max_workers,
         )
 
+    @staticmethod
+    def __hash_profile_update(attributes: dict) -> str:
+        return hashlib.sha256(
+            json.dumps(attributes, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:16]
+
     ###########################################################################
     # SECTION OF CODE TO FETCH USER FACTORS
     # TODO CREATE USER FACTOR LOOKUP TABLE?
@@ -653,8 +3581,10 @@ class OktaManagementFramework:
     @property
     def user_factors(self) -> list:
         if self.__user_factors == None:
-            self._logger.debug("Loading Okta user factors")
-            self.__user_factors = self.__fetch_factors_for_all_users()
+            with self.__load_lock("user_factors"):
+                if self.__user_factors == None:
+                    self._logger.debug("Loading Okta user factors")
+                    self.__user_factors = self.__fetch_factors_for_all_users()
         self._logger.debug(
             f"Returning {len(self.__users)} users with their factors from Okta."
         )
@@ -679,67 +3609,43 @@ class OktaManagementFramework:
         self._logger.debug(
             "Will enumerate all users in list and fetch their currently enrolled factors."
         )
-        user_factors: list[dict] = []
-        for user in users:
-            if (
-                self.__IS_TESTING
-                and ((users.index(user)) + 1) >= self.__TESTING_COUNT_THRESHOLD
-            ):
-                self._logger.warning(
-                    f"The IS_TESTING flag was set to true, and {self.__TESTING_COUNT_THRESHOLD} user factors have been fetched, will now break out of loop"
-                )
-                break
-            try:
-                self._logger.debug(
-                    f"#{(users.index(user))+1}/{len(users)}: Fetching enrolled factors for {user['id']}"
-                )
-                user_factors.append(
-                    {"user": user, "factors": self.fetch_user_factors(user_id=user['id'])}
-                )
-            except requests.exceptions.RequestException as req_error:
-                self._logger.error(req_error)
-            except Exception as error:
-                self._logger.error(error)
+        factors_by_user_id: dict[str, list] = self._crawl_fan_out(
+            name="user_factors",
+            ids=[user["id"] for user in users],
+            fetch=lambda user_id: self.fetch_user_factors(user_id=user_id),
+            testing_threshold=(
+                self.__TESTING_COUNT_THRESHOLD if self.__IS_TESTING else None
+            ),
+        )
+        user_factors: list[dict] = [
+            {"user": user, "factors": factors_by_user_id[user["id"]]}
+            for user in users
+            if user["id"] in factors_by_user_id
+        ]
 
         return user_factors
 
     @validate_attrs_present
-    @rate_limit_backoff(delay=1, retries=5)
     def fetch_user_factors(self, user_id: str) -> list[dict]:
         self._logger.debug(f"Fetching enrolled factors for user {user_id}")
 
-        full_url = (
-            f"https://{self._okta_domain}.okta.com/api/v1/users/{user_id}/factors"
-        )
-
-        payload = {}
-        headers = {
-            "Accept": "application/json",
-            "Authorization": f"SSWS {self.__api_token}",
-            "User-Agent": "okta-management-framework/1.0.0",
-        }
-
         try:
-            """self._logger.debug(
-                f"Sleeping for {self._OKTA_RATE_AVOID_TIMER} seconds to avoid Okta API rate limits."
-            )
-            time.sleep(self._OKTA_RATE_AVOID_TIMER)"""
-
-            response = requests.request("GET", full_url, headers=headers, data=payload)
-            response.raise_for_status()
-            if "error" in response.json():
+            factors: list[dict] = self._okta_request(
+                "GET", f"/api/v1/users/{user_id}/factors"
+            ).json()
+            if "error" in factors:
                 raise requests.exceptions.RequestException(
                     "Okta response states there as an error."
                 )
-            elif len(response.json()) == 0:
+            elif len(factors) == 0:
                 self._logger.warning(
                     f"User {user_id} does not have any enrolled factors."
                 )
-            elif len(response.json()) > 0:
+            elif len(factors) > 0:
                 self._logger.debug(
-                    f"Successfully fetched {len(response.json())} factors for user {user_id}"
+                    f"Successfully fetched {len(factors)} factors for user {user_id}"
                 )
-            return response.json()
+            return factors
 
         except requests.exceptions.RequestException as req_error:
             self._logger.error(
@@ -775,7 +3681,12 @@ class OktaManagementFramework:
             "Authorization": f"SSWS {self.__api_token}",
         }
         try:
-            response = requests.delete(url=full_url, headers=headers, data=payload)
+            response = requests.delete(
+                url=full_url,
+                headers=headers,
+                data=payload,
+                timeout=self._request_timeout(),
+            )
             response.raise_for_status()
             try:
                 self._logger.info(
@@ -823,6 +3734,71 @@ class OktaManagementFramework:
                 self._logger.error(f"{err}")
                 return False
 
+    def bulk_unenroll_user_factors(
+        self,
+        user_factor_pairs: Iterable[tuple[str, str]],
+        ledger_path: str = None,
+        dry_run: bool = False,
+        max_workers: int = None,
+    ) -> list[dict]:
+        """Unenrolls many user factors concurrently. A factor that no longer
+        exists (404) is recorded as SKIPPED rather than FAILED, so retrying a
+        pair that was already unenrolled is harmless.
+
+        Args:
+            user_factor_pairs (Iterable[tuple[str, str]]): (user_id, factor_id) pairs
+            ledger_path (str, optional): File to record the outcome of each pair
+            to. Re-running with the same ledger_path skips pairs that were already
+            unenrolled. Defaults to None.
+            dry_run (bool, optional): Only record which factors would be
+            unenrolled. Factors are still looked up, so ones that no longer
+            exist are reported as SKIPPED. Defaults to False.
+            max_workers (int, optional): Number of factors to unenroll at once.
+            Defaults to the MAX_WORKERS the class was created with.
+
+        Returns:
+            list[dict]: Outcome of each pair, with its key "user_id:factor_id",
+            status and timestamp
+        """
+        return self._run_bulk_operation(
+            name="Bulk factor unenroll",
+            items=(
+                (f"{user_id}:{factor_id}", (user_id, factor_id))
+                for user_id, factor_id in user_factor_pairs
+            ),
+            operation=self.__unenroll_user_factor_idempotent,
+            ledger_path=ledger_path,
+            dry_run=dry_run,
+            max_workers=max_workers,
+        )
+
+    def __unenroll_user_factor_idempotent(
+        self, user_factor: tuple[str, str], dry_run: bool = False
+    ) -> dict:
+        user_id, factor_id = user_factor
+        try:
+            if dry_run:
+                factor: dict = self._okta_request(
+                    "GET", f"/api/v1/users/{user_id}/factors/{factor_id}"
+                ).json()
+                return {
+                    "status": "DRY_RUN",
+                    "factor_type": factor.get("factorType"),
+                    "factor_status": factor.get("status"),
+                }
+            self._okta_request("DELETE", f"/api/v1/users/{user_id}/factors/{factor_id}")
+        except requests.exceptions.HTTPError as http_err:
+            if http_err.response is not None and http_err.response.status_code == 404:
+                self._logger.info(
+                    f"Factor {factor_id} for user {user_id} does not exist, it was already unenrolled."
+                )
+                return {"status": "SKIPPED", "reason": "Factor not found"}
+            raise http_err
+        self._logger.info(
+            f"Successfully unenrolled factor {factor_id} for user {user_id}"
+        )
+        return {"status": "SUCCESS"}
+
     def enroll_new_push_factor(self, user_id: str) -> dict:
         self._logger.info(
             f"Enrolling new push factor for {user_id}. This will generate a enroll QR code."
@@ -842,7 +3818,12 @@ class OktaManagementFramework:
         }
 
         try:
-            response = requests.post(url=full_url, headers=headers, json=payload)
+            response = requests.post(
+                url=full_url,
+                headers=headers,
+                json=payload,
+                timeout=self._request_timeout(),
+            )
             response.raise_for_status()
             self._logger.info(
                 f"Successfully enrolled a new push factor for user {user_id}"
@@ -873,6 +3854,8 @@ class OktaManagementFramework:
             )
             self._logger.error(f"{err}")
             return False
+        except OktaDeadlineExceededError as deadline_error:
+            raise deadline_error
         except Exception as err:
             self._logger.error(
                 f"An unexpected error occurred while enrolling new factor for {user_id}."
@@ -897,7 +3880,12 @@ class OktaManagementFramework:
         }
 
         try:
-            response = requests.post(url=full_url, headers=headers, json=payload)
+            response = requests.post(
+                url=full_url,
+                headers=headers,
+                json=payload,
+                timeout=self._request_timeout(),
+            )
             response.raise_for_status()
             self._logger.info(
                 f"Successfully enrolled a new push factor for user {user_id}"
@@ -931,6 +3919,8 @@ class OktaManagementFramework:
             )
             self._logger.error(f"{err}")
             return False
+        except OktaDeadlineExceededError as deadline_error:
+            raise deadline_error
         except Exception as err:
             self._logger.error(
                 f"An unexpected error occurred while enrolling new factor for {user_id}."
@@ -938,6 +3928,159 @@ class OktaManagementFramework:
             self._logger.error(f"{err}")
             return False
 
+    def bulk_enroll_push_factors(
+        self,
+        user_ids: Iterable[str],
+        sink: Callable[[dict], Any] = None,
+        ledger_path: str = None,
+        dry_run: bool = False,
+        max_workers: int = None,
+    ) -> list[dict]:
+        """Enrolls and activates an Okta Verify push factor for many users
+        concurrently. Users who already have an ACTIVE push factor are SKIPPED.
+        A user whose push factor is still PENDING_ACTIVATION has it activated
+        again, which issues a new QR code, rather than a second one enrolled.
+        Existing factors are taken from user_factors if it is loaded, and
+        fetched per user otherwise.
+
+        Each user's activation payload (QR code link and activation links) is
+        handed to sink as soon as it is produced, and is not kept or returned,
+        so memory use does not grow with the number of users. sink is never
+        called by two threads at once. To write them to a file:
+
+            with open("activations.ndjson", "w") as file:
+                okta.bulk_enroll_push_factors(
+                    user_ids, sink=lambda item: file.write(json.dumps(item) + "\n")
+                )
+
+        Args:
+            user_ids (Iterable[str]): Okta user ids
+            sink (Callable[[dict], Any], optional): Receives {"user_id",
+            "factor_id", "activation"} for each activated factor. Required
+            unless dry_run is set. Defaults to None.
+            ledger_path (str, optional): File to record the outcome of each user
+            to. Re-running with the same ledger_path skips users that were
+            already enrolled. Defaults to None.
+            dry_run (bool, optional): Only report who would be enrolled, and
+            whether a new factor would be ENROLLED or a pending one REACTIVATED.
+            Existing factors are still checked. Defaults to False.
+            max_workers (int, optional): Number of users to enroll at once.
+            Defaults to the MAX_WORKERS the class was created with.
+
+        Raises:
+            ValueError: Raised if no sink was given for a real run
+
+        Returns:
+            list[dict]: Outcome of each user, with its user id as the key, the
+            factor id, whether it was ENROLLED or REACTIVATED, status and timestamp
+        """
+        try:
+            if sink is None and not dry_run:
+                raise ValueError(
+                    "A sink is required, or the activation QR codes would be lost."
+                )
+        except ValueError as value_error:
+            self._logger.error(value_error)
+            raise value_error
+
+        cached_factors: dict[str, dict] = {}
+        if self.__user_factors is not None:
+            cached_factors = {
+                entry["user"]["id"]: entry for entry in self.__user_factors
+            }
+        sink_lock = threading.Lock()
+
+        def enroll_user(user_id: str, dry_run: bool) -> dict:
+            if user_id in cached_factors:
+                factors: list[dict] = cached_factors[user_id]["factors"]
+            else:
+                factors = self._okta_request(
+                    "GET", f"/api/v1/users/{user_id}/factors"
+                ).json()
+            push_factors: list[dict] = [
+                factor for factor in factors if factor.get("factorType") == "push"
+            ]
+            active_factor: dict | None = next(
+                (f for f in push_factors if f.get("status") == "ACTIVE"), None
+            )
+            if active_factor is not None:
+                return {
+                    "status": "SKIPPED",
+                    "reason": "Already has an active push factor",
+                    "factor_id": active_factor["id"],
+                }
+            pending_factor: dict | None = next(
+                (f for f in push_factors if f.get("status") == "PENDING_ACTIVATION"),
+                None,
+            )
+            if dry_run:
+                return {
+                    "status": "DRY_RUN",
+                    "action": "ENROLLED" if pending_factor is None else "REACTIVATED",
+                    "factor_id": pending_factor and pending_factor["id"],
+                }
+            if pending_factor is not None:
+                action, factor = "REACTIVATED", pending_factor
+            else:
+                action = "ENROLLED"
+                try:
+                    factor = self._okta_request(
+                        "POST",
+                        f"/api/v1/users/{user_id}/factors?tokenLifetimeSeconds=86400",
+                        json_body={"factorType": "push", "provider": "OKTA"},
+                    ).json()
+                except requests.exceptions.RequestException as enroll_error:
+                    # Okta may have enrolled the factor even though no response
+                    # came back, or a stale cache hid one enrolled since, so
+                    # look for it before deciding the enrollment failed
+                    factor = next(
+                        (
+                            f
+                            for f in self._okta_request(
+                                "GET", f"/api/v1/users/{user_id}/factors"
+                            ).json()
+                            if f.get("factorType") == "push"
+                            and f.get("status") == "PENDING_ACTIVATION"
+                        ),
+                        None,
+                    )
+                    if factor is None:
+                        raise enroll_error
+            activation: dict = self._okta_request(
+                "POST",
+                f"/api/v1/users/{user_id}/factors/{factor['id']}/lifecycle/activate",
+                json_body={},
+            ).json()
+            with sink_lock:
+                sink(
+                    {
+                        "user_id": user_id,
+                        "factor_id": factor["id"],
+                        "activation": activation,
+                    }
+                )
+            if user_id in cached_factors and action == "ENROLLED":
+                entry: dict = cached_factors[user_id]
+                with self.__load_lock("user_factors"):
+                    entry["factors"] = entry["factors"] + [
+                        {
+                            key: value
+                            for key, value in factor.items()
+                            if key != "_embedded"
+                        }
+                    ]
+            self._logger.info(f"{action} push factor {factor['id']} for user {user_id}")
+            return {"status": "SUCCESS", "action": action, "factor_id": factor["id"]}
+
+        return self._run_bulk_operation(
+            name="Bulk push factor enrollment",
+            items=((user_id, user_id) for user_id in user_ids),
+            operation=enroll_user,
+            ledger_path=ledger_path,
+            dry_run=dry_run,
+            max_workers=max_workers,
+        )
+
     def __activate_new_push_factor(self, user_id: str, factor_id: str) -> dict:
         self._logger.info(f"Activating new push factor {factor_id} for {user_id}.")
 
@@ -953,7 +4096,9 @@ class OktaManagementFramework:
         }
 
         try:
-            response = requests.post(url=full_url, headers=headers, json={})
+            response = requests.post(
+                url=full_url, headers=headers, json={}, timeout=self._request_timeout()
+            )
             response.raise_for_status()
             self._logger.info(
                 f"Successfully activated a new push factor {factor_id} for user {user_id}"
@@ -979,6 +4124,8 @@ class OktaManagementFramework:
             )
             self._logger.error(f"{err}")
             return False
+        except OktaDeadlineExceededError as deadline_error:
+            raise deadline_error
         except Exception as err:
             self._logger.error(
                 f"An unexpected error occurred while activating new factor {factor_id} for {user_id}."
@@ -993,8 +4140,10 @@ class OktaManagementFramework:
     @property
     def users_with_devices(self) -> list:
         if self.__users_with_devices == None:
-            self._logger.debug("Retreiving the devices for each user...")
-            self.users_with_devices = self.__fetch_all_devices_for_all_users()
+            with self.__load_lock("users_with_devices"):
+                if self.__users_with_devices == None:
+                    self._logger.debug("Retreiving the devices for each user...")
+                    self.users_with_devices = self.__fetch_all_devices_for_all_users()
         self._logger.debug(
             f"Returning {len(self.__users_with_devices)} devices with their devices from Okta."
         )
@@ -1010,9 +4159,18 @@ class OktaManagementFramework:
     def __fetch_all_devices_for_all_users(self) -> list[dict]:
         users: list[dict] = self.users
         self._logger.debug(f"Will retrieve devices for {len(users)} users")
+        users_by_id: dict[str, dict] = {user["id"]: user for user in users}
+        devices_by_user_id: dict[str, list] = self._crawl_fan_out(
+            name="users_with_devices",
+            ids=list(users_by_id),
+            fetch=lambda user_id: self.fetch_devices_for_user(
+                user=users_by_id[user_id]
+            ),
+            skip_errors=False,
+        )
         users_with_devices: list[dict] = []
         for user in users:
-            user.update({"devices": self.fetch_devices_for_user(user=user)})
+            user.update({"devices": devices_by_user_id[user["id"]]})
             users_with_devices.append(user)
         self._logger.debug(
             f"Finished retrieving {len(users_with_devices)} users and deviecs"
@@ -1020,52 +4178,31 @@ class OktaManagementFramework:
         return users_with_devices
 
     #TODO Change parameters to user ID
-    @rate_limit_backoff(delay=1, retries=5)
     def fetch_devices_for_user(self, user: dict) -> list[dict]:
         self._logger.debug(f"Fetching devices for user {user['id']}")
 
-        full_url = (
-            f"https://{self._okta_domain}.okta.com/api/v1/users/{user['id']}/devices"
-        )
-
-        payload = {}
-        headers = {
-            "Accept": "application/json",
-            "Authorization": f"SSWS {self.__api_token}",
-            "User-Agent": "okta-management-framework/1.0.0",
-        }
-
         try:
-            """self._logger.debug(
-                f"Sleeping for {self._OKTA_RATE_AVOID_TIMER} seconds to avoid Okta API rate limits."
-            )"""
-            # time.sleep(self._OKTA_RATE_AVOID_TIMER)
-
-            response = requests.request("GET", full_url, headers=headers, data=payload)
-            response.raise_for_status()
-            if "error" in response.json():
+            devices: list[dict] = self._okta_request(
+                "GET", f"/api/v1/users/{user['id']}/devices"
+            ).json()
+            if "error" in devices:
                 raise requests.exceptions.RequestException(
                     f"Okta response states there as an error when fetching devices for user {user['id']} ."
                 )
-            elif len(response.json()) == 0:
+            elif len(devices) == 0:
                 self._logger.warning(
                     f"User {user['id']} does not have any associated devices."
                 )
                 return []
-            elif len(response.json()) > 0:
+            elif len(devices) > 0:
                 self._logger.debug(
-                    f"Successfully fetched {len(response.json())} factors for user {user['id']}"
+                    f"Successfully fetched {len(devices)} devices for user {user['id']}"
                 )
-            return response.json()
+            return devices
 
         except requests.exceptions.RequestException as req_error:
-            if response.status_code == 429:
-                raise OktaRateLimitExceededError
-            else:
-                self._logger.error(
-                    f"Error occurred fetching devices for user {user['id']}"
-                )
-                raise req_error
+            self._logger.error(f"Error occurred fetching devices for user {user['id']}")
+            raise req_error
         except Exception as error:
             self._logger.error(f"Error occurred fetching devices for user {user['id']}")
             raise error
@@ -1081,8 +4218,10 @@ class OktaManagementFramework:
     @property
     def device_users(self) -> list:
         if self.__device_users == None:
-            self._logger.debug("Loading Okta user devices")
-            self.device_users = self.__fetch_users_for_all_devices()
+            with self.__load_lock("device_users"):
+                if self.__device_users == None:
+                    self._logger.debug("Loading Okta user devices")
+                    self.device_users = self.__fetch_users_for_all_devices()
         self._logger.debug(
             f"Returning {len(self.__device_users)} devices with their devices from Okta."
         )
@@ -1098,13 +4237,17 @@ class OktaManagementFramework:
     @property
     def device_users_lookup_table(self) -> list:
         if self.__device_users_lookup_table == None:
-            self._logger.debug(
-                "The device_users_lookup_table is empty. Will populate the table."
-            )
-            if self.device_users == None:
-                self._logger.debug("Loading Okta device users to create lookup table")
-                self.device_users = self.__fetch_users_for_all_devices()
-            self.device_users_lookup_table = self.device_users
+            with self.__load_lock("device_users"):
+                if self.__device_users_lookup_table == None:
+                    self._logger.debug(
+                        "The device_users_lookup_table is empty. Will populate the table."
+                    )
+                    if self.device_users == None:
+                        self._logger.debug(
+                            "Loading Okta device users to create lookup table"
+                        )
+                        self.device_users = self.__fetch_users_for_all_devices()
+                    self.device_users_lookup_table = self.device_users
         self._logger.debug(
             f"Returning {len(self.__device_users_lookup_table)} users from Okta."
         )
@@ -1141,15 +4284,17 @@ class OktaManagementFramework:
     @property
     def user_devices_lookup_table(self) -> list:
         if self.__user_devices_lookup_table == None:
-            self._logger.debug(
-                "The user_devices_lookup_table is empty. Will populate the table."
-            )
-            if self.device_users == None:
-                self._logger.debug(
-                    "Loading Okta device users to create user_devices_lookup_table"
-                )
-                self.device_users = self.__fetch_users_for_all_devices()
-            self.user_devices_lookup_table = self.device_users
+            with self.__load_lock("device_users"):
+                if self.__user_devices_lookup_table == None:
+                    self._logger.debug(
+                        "The user_devices_lookup_table is empty. Will populate the table."
+                    )
+                    if self.device_users == None:
+                        self._logger.debug(
+                            "Loading Okta device users to create user_devices_lookup_table"
+                        )
+                        self.device_users = self.__fetch_users_for_all_devices()
+                    self.user_devices_lookup_table = self.device_users
         self._logger.debug(
             f"Returning {len(self.__user_devices_lookup_table)} users from Okta."
         )
@@ -1223,45 +4368,38 @@ class OktaManagementFramework:
         self._logger.debug(
             "Will enumerate all devices in list and fetch current users."
         )
-        device_users: list[dict] = []
-        cur_index = 0
-        for device_id, device in devices_lookup_table.items():
-            # If the IS_TESTING flag is true and we have fetched users for
-            # 50 devices, we end early just to shorten test case evaluation
-            if self.__IS_TESTING and cur_index >= self.__TESTING_COUNT_THRESHOLD:
-                self._logger.warning(
-                    f"The IS_TESTING flag was set to True and users for {self.__TESTING_COUNT_THRESHOLD} devices have been fetched. Will break out of loop."
-                )
-                break
-            try:
-                self._logger.debug(
-                    f"#{cur_index+1}/{len(devices_lookup_table.keys())}: Fetching current users for device {device_id}"
-                )
-                cur_index += 1
-
-                fetched_device_users = self.__fetch_device_users(device_id=device_id)
-
-                # Here we are going to replace the limited user profile thats provided by
-                # getting the device users with the full profile for each user that
-                # uses the device.
-                for user in fetched_device_users:
-                    try:
-                        full_user_profile = self.users_lookup_table[user["user"]["id"]][
-                            "profile"
-                        ]
-                        user["user"]["profile"] = full_user_profile
-                    except KeyError as key_error:
-                        self._logger.error(key_error)
-                        self._logger.warning(
-                            f"Could not find full user profile within users_lookup_table for user {user['user']['id']} on device {device_id}"
-                        )
+        users_by_device_id: dict[str, list] = self._crawl_fan_out(
+            name="device_users",
+            ids=list(devices_lookup_table),
+            fetch=lambda device_id: self.__fetch_device_users(device_id=device_id),
+            testing_threshold=(
+                self.__TESTING_COUNT_THRESHOLD if self.__IS_TESTING else None
+            ),
+        )
 
-                device_users.append({"device": device, "users": fetched_device_users})
+        device_users: list[dict] = []
+        for device_id, fetched_device_users in users_by_device_id.items():
+            # Here we are going to replace the limited user profile thats provided by
+            # getting the device users with the full profile for each user that
+            # uses the device.
+            for user in fetched_device_users:
+                try:
+                    full_user_profile = users_lookup_table[user["user"]["id"]][
+                        "profile"
+                    ]
+                    user["user"]["profile"] = full_user_profile
+                except KeyError as key_error:
+                    self._logger.error(key_error)
+                    self._logger.warning(
+                        f"Could not find full user profile within users_lookup_table for user {user['user']['id']} on device {device_id}"
+                    )
 
-            except requests.exceptions.RequestException as req_error:
-                self._logger.error(req_error)
-            except Exception as error:
-                self._logger.error(error)
+            device_users.append(
+                {
+                    "device": devices_lookup_table[device_id],
+                    "users": fetched_device_users,
+                }
+            )
 
         return device_users
 
@@ -1269,38 +4407,23 @@ class OktaManagementFramework:
     def __fetch_device_users(self, device_id: str) -> list[dict]:
         self._logger.debug(f"Fetching users for device {device_id}")
 
-        full_url = (
-            f"https://{self._okta_domain}.okta.com/api/v1/devices/{device_id}/users"
-        )
-
-        payload = {}
-        headers = {
-            "Accept": "application/json",
-            "Authorization": f"SSWS {self.__api_token}",
-            "User-Agent": "okta-management-framework/1.0.0",
-        }
-
         try:
-            self._logger.debug(
-                f"Sleeping for {self._OKTA_RATE_AVOID_TIMER} seconds to avoid Okta API rate limits."
-            )
-            time.sleep(self._OKTA_RATE_AVOID_TIMER)
-
-            response = requests.request("GET", full_url, headers=headers, data=payload)
-            response.raise_for_status()
-            if "error" in response.json():
+            device_users: list[dict] = self._okta_request(
+                "GET", f"/api/v1/devices/{device_id}/users"
+            ).json()
+            if "error" in device_users:
                 raise requests.exceptions.RequestException(
                     "Okta response states there as an error."
                 )
-            elif len(response.json()) == 0:
+            elif len(device_users) == 0:
                 self._logger.warning(
                     f"Device {device_id} does not have any assigned useres."
                 )
-            elif len(response.json()) > 0:
+            elif len(device_users) > 0:
                 self._logger.debug(
-                    f"Successfully fetched {len(response.json())} users for device {device_id}"
+                    f"Successfully fetched {len(device_users)} users for device {device_id}"
                 )
-            return response.json()
+            return device_users
 
         except requests.exceptions.RequestException as req_error:
             self._logger.error(f"Error occurred fetching device users for {device_id}")
@@ -1309,6 +4432,130 @@ class OktaManagementFramework:
             self._logger.error(f"Error occurred fetching device users for {device_id}")
             raise error
 
+    ###########################################################################
+    # SECTION OF CODE TO SAMPLE USERS AND DEVICES
+    ###########################################################################
+
+    def sample_user_factors(self, sample_size: int, seed: int = None) -> OktaSample:
+        """Fetches the factors of a uniform random sample of users, for quick
+        estimates such as the share of users without a push factor. Only the
+        user list itself is fetched in full.
+
+        Args:
+            sample_size (int): Number of users to sample
+            seed (int, optional): Seed for the random sample, to make it
+            repeatable. Defaults to None.
+
+        Returns:
+            OktaSample: Sample whose items are shaped like user_factors entries
+        """
+        users: list[dict] = self.users
+        factors_by_user_id: dict[str, list] = self.__fetch_sample(
+            name="user_factors",
+            ids=self.__draw_sample([user["id"] for user in users], sample_size, seed),
+            fetch=lambda user_id: self.fetch_user_factors(user_id=user_id),
+        )
+        users_lookup_table: dict[str, dict] = self.users_lookup_table
+        return OktaSample(
+            population_size=len(users),
+            items=[
+                {"user": users_lookup_table[user_id], "factors": factors}
+                for user_id, factors in factors_by_user_id.items()
+            ],
+        )
+
+    def sample_users_with_devices(
+        self, sample_size: int, seed: int = None
+    ) -> OktaSample:
+        """Fetches the devices of a uniform random sample of users
+
+        Args:
+            sample_size (int): Number of users to sample
+            seed (int, optional): Seed for the random sample. Defaults to None.
+
+        Returns:
+            OktaSample: Sample whose items are shaped like users_with_devices
+            entries. The cached user objects are not modified.
+        """
+        users_lookup_table: dict[str, dict] = self.users_lookup_table
+        devices_by_user_id: dict[str, list] = self.__fetch_sample(
+            name="users_with_devices",
+            ids=self.__draw_sample(list(users_lookup_table), sample_size, seed),
+            fetch=lambda user_id: self.fetch_devices_for_user(
+                user=users_lookup_table[user_id]
+            ),
+        )
+        return OktaSample(
+            population_size=len(users_lookup_table),
+            items=[
+                {**users_lookup_table[user_id], "devices": devices}
+                for user_id, devices in devices_by_user_id.items()
+            ],
+        )
+
+    def sample_device_users(self, sample_size: int, seed: int = None) -> OktaSample:
+        """Fetches the users of a uniform random sample of devices
+
+        Args:
+            sample_size (int): Number of devices to sample
+            seed (int, optional): Seed for the random sample. Defaults to None.
+
+        Returns:
+            OktaSample: Sample whose items are shaped like device_users entries
+        """
+        devices_lookup_table: dict[str, dict] = self.devices_lookup_table
+        users_by_device_id: dict[str, list] = self.__fetch_sample(
+            name="device_users",
+            ids=self.__draw_sample(list(devices_lookup_table), sample_size, seed),
+            fetch=lambda device_id: self.__fetch_device_users(device_id=device_id),
+        )
+        return OktaSample(
+            population_size=len(devices_lookup_table),
+            items=[
+                {"device": devices_lookup_table[device_id], "users": users}
+                for device_id, users in users_by_device_id.items()
+            ],
+        )
+
+    def __draw_sample(self, ids: list[str], sample_size: int, seed: int = None) -> list:
+        try:
+            if sample_size <= 0:
+                raise ValueError(f"sample_size must be above 0, not {sample_size}")
+        except ValueError as value_error:
+            self._logger.error(value_error)
+            raise value_error
+        return random.Random(seed).sample(ids, min(sample_size, len(ids)))
+
+    def __fetch_sample(
+        self, name: str, ids: list[str], fetch: Callable[[str], Any]
+    ) -> dict[str, Any]:
+        """Calls fetch for each sampled id concurrently. Ids fetch fails for are
+        logged and left out, which shrinks the sample but keeps it uniform.
+        """
+        self._logger.info(f"Sampling {len(ids)} ids for {name}")
+        results: dict[str, Any] = {}
+        with ThreadPoolExecutor(max_workers=self._MAX_WORKERS) as executor:
+            futures = {
+                executor.submit(self._bind_deadline(fetch), id): id for id in ids
+            }
+            progress: OktaProgressTracker = self._track_progress(
+                f"{name} sample", len(futures)
+            )
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except OktaDeadlineExceededError as deadline_error:
+                    deadline_error.partial_results = results
+                    raise deadline_error
+                except Exception as error:
+                    self._logger.error(
+                        f"{name} sample: could not fetch {futures[future]}: {error}"
+                    )
+                    progress.advance(failed=True)
+                    continue
+                progress.advance()
+        return results
+
     ###########################################################################
     # SECTION OF CODE TO FETCH APPLICATIONS
     ###########################################################################
@@ -1316,8 +4563,12 @@ class OktaManagementFramework:
     @property
     def applications(self) -> list:
         if self.__applications == None:
-            self._logger.debug("Loading Okta applications")
-            self.applications = self.__fetch_applications()
+            with self.__load_lock("applications"):
+                if self.__applications == None:
+                    self._logger.debug("Loading Okta applications")
+                    self.applications = self.__fetch_applications()
+                    self.__mark_loaded("applications")
+        self.__refresh_if_stale("applications")
         self._logger.debug(
             f"Returning {len(self.__applications)} applications from Okta."
         )
@@ -1328,20 +4579,27 @@ class OktaManagementFramework:
         self._logger.debug(
             "Okta applications setter called. Will fetch Okta applications"
         )
+        if value is None:
+            self.__applications_lookup_table = None
+        else:
+            self.applications_lookup_table: dict[dict] = value
         self.__applications: list = value
-        self.applications_lookup_table: dict[dict] = value
 
     @property
     def applications_lookup_table(self) -> list:
         if self.__applications_lookup_table == None:
-            self._logger.debug(
-                "The applications_lookup_table is empty. Will populate the table."
-            )
-            if self.applications == None:
-                self._logger.debug("Loading Okta applications to create lookup table")
-                self.applications = self.__fetch_applications()
+            with self.__load_lock("applications"):
+                if self.__applications_lookup_table == None:
+                    self._logger.debug(
+                        "The applications_lookup_table is empty. Will populate the table."
+                    )
+                    if self.applications == None:
+                        self._logger.debug(
+                            "Loading Okta applications to create lookup table"
+                        )
+                        self.applications = self.__fetch_applications()
 
-            self.applications_lookup_table = self.applications
+                    self.applications_lookup_table = self.applications
         self._logger.debug(
             f"Returning {len(self.__applications_lookup_table)} applications from Okta."
         )
@@ -1366,6 +4624,26 @@ class OktaManagementFramework:
             f"Created applications_lookup_table with length {len(applications_lookup_table)}"
         )
 
+    def query_applications(self) -> OktaQuery:
+        """Returns a query of /api/v1/apps, which supports filter and q. Nothing
+        is fetched until the query is iterated over.
+        """
+        return OktaQuery(
+            okta=self,
+            path="/api/v1/apps",
+            supported_parameters=("filter", "q"),
+            limit=200,
+        )
+
+    def stream_applications(
+        self,
+        on_page: Callable[[list[dict]], Any] = None,
+        on_item: Callable[[dict], Any] = None,
+        prefetch: int = 0,
+    ) -> int:
+        """Same as stream_users, for all applications"""
+        return self._stream_query(self.query_applications(), on_page, on_item, prefetch)
+
     def fetch_application_by_id(self, app_id: str) -> dict:
         self._logger.debug(f"Will fetch application details for {app_id}")
         full_url = f"https://{self._okta_domain}.okta.com/api/v1/apps/{app_id}"
@@ -1377,7 +4655,11 @@ class OktaManagementFramework:
         payload = {}
         try:
             response = requests.request(
-                method="GET", url=full_url, headers=headers, data=payload
+                method="GET",
+                url=full_url,
+                headers=headers,
+                data=payload,
+                timeout=self._request_timeout(),
             )
             response.raise_for_status()
 
@@ -1403,12 +4685,10 @@ class OktaManagementFramework:
             )
             raise error
 
-    def __fetch_applications(self, next_page_url: str = None) -> list:
+    def __fetch_applications(self) -> list:
         """Paginates through all Okta applications in the tenant and returns
-        list object of each app dictionary object
-
-        Args:
-            next_page_url (str, optional): URL to get next page of data Defaults to None.
+        list object of each app dictionary object. If CHECKPOINT_DIR was set and
+        an earlier crawl was interrupted, continues from where it stopped.
 
         Raises:
             requests.exceptions.RequestException: If requests throws an exception
@@ -1416,72 +4696,17 @@ class OktaManagementFramework:
         Returns:
             list: List of dictionaries, where each dict is an app object
         """
-        url = f"https://{self._okta_domain}.okta.com/api/v1/apps"
-
-        headers = {
-            "Accept": "application/json",
-            "Authorization": f"SSWS {self.__api_token}",
-        }
-        payload = {}
-
-        if next_page_url:
-            full_url = next_page_url
-        else:
-            full_url = url + "?limit=1000"
-            self._logger.info(
-                "Fetching all Okta applications " + f"from {self._okta_domain}"
-            )
-
-        app_list = []
-
+        self._logger.info(
+            "Fetching all Okta applications " + f"from {self._okta_domain}"
+        )
         try:
-            response = requests.request(
-                method="GET", url=full_url, headers=headers, data=payload
+            return self._crawl_pages(
+                name="applications", url="/api/v1/apps", params={"limit": 1000}
             )
-            response.raise_for_status()
-
-            data = response.json()
-
-            if "error" in data:
-                raise requests.exceptions.RequestException(
-                    "Okta response states there is an error."
-                )
-
-            app_list += data
-
         except requests.exceptions.RequestException as req_error:
             self._logger.critical(str(req_error))
-            self._logger.critical(
-                "Error occurred fetching apps, " + "terminating script."
-            )
-            sys.exit(1)
-        except Exception as error:
-            self._logger.critical(str(error))
-            self._logger.critical(
-                "Error occurred fetching apps, " + "terminating script."
-            )
-            sys.exit(1)
-
-        try:
-            if ' rel="next"' in dict(response.headers)["link"]:
-                pattern = r'<.*?;\srel="self",\s<(.*?)>;\srel="next"$'
-                match = re.search(pattern, dict(response.headers)["link"])
-
-                if match:
-                    next_page_url = match.group(1)
-                    self._logger.debug(
-                        "URL for next page of data: " + f"{next_page_url}"
-                    )
-                    app_list += self.__fetch_applications(next_page_url=next_page_url)
-                else:
-                    self._logger.debug("No match found for next URL.")
-
-        except KeyError:
-            self._logger.warning(
-                "Link not found in response headers, " + "must be all applications"
-            )
-
-        return app_list
+            self._logger.critical("Error occurred fetching apps.")
+            raise req_error
 
     ###########################################################################
     # SECTION OF CODE TO FETCH AN APPLICATIONS USERS
@@ -1509,7 +4734,11 @@ class OktaManagementFramework:
 
         try:
             response = requests.request(
-                method="GET", url=full_url, headers=headers, data=payload
+                method="GET",
+                url=full_url,
+                headers=headers,
+                data=payload,
+                timeout=self._request_timeout(),
             )
             response.raise_for_status()
 
@@ -1528,6 +4757,8 @@ class OktaManagementFramework:
                 "Error occurred fetching apps, " + "terminating script."
             )
             sys.exit(1)
+        except OktaDeadlineExceededError as deadline_error:
+            raise deadline_error
         except Exception as error:
             self._logger.critical(str(error))
             self._logger.critical(
@@ -1580,6 +4811,315 @@ class OktaManagementFramework:
         )
         return app_users_full_profiles
 
+    ###########################################################################
+    # SECTION OF CODE TO CRAWL ALL APPLICATION ASSIGNMENTS
+    ###########################################################################
+
+    @property
+    def application_assignments(self) -> OktaAssignmentIndex:
+        if self.__application_assignments == None:
+            with self.__load_lock("application_assignments"):
+                if self.__application_assignments == None:
+                    self._logger.debug("Loading Okta application assignments")
+                    self.application_assignments = self.fetch_application_assignments()
+        self._logger.debug(
+            f"Returning {self.__application_assignments.assignment_count} application assignments from Okta."
+        )
+        return self.__application_assignments
+
+    @application_assignments.setter
+    def application_assignments(self, value: OktaAssignmentIndex) -> None:
+        self._logger.debug("Okta application assignments setter called.")
+        self.__application_assignments = value
+
+    def fetch_application_assignments(
+        self,
+        max_workers: int = None,
+        checkpoint_path: str = None,
+        checkpoint_every: int = 25,
+    ) -> OktaAssignmentIndex:
+        """Fetches the assigned users of every application in the tenant
+        concurrently, and builds an index that answers both "which users are
+        assigned to app X" and "which apps is user Y assigned to".
+
+        Args:
+            max_workers (int, optional): Number of apps to fetch users for at once.
+            Defaults to the MAX_WORKERS the class was created with.
+            checkpoint_path (str, optional): File to record progress to. If the
+            file already exists, apps recorded in it are not fetched again. The
+            file is removed once every app was fetched, so the next run starts
+            over. Defaults to None.
+            checkpoint_every (int, optional): Write the checkpoint after this
+            many apps complete. Defaults to 25.
+
+        Returns:
+            OktaAssignmentIndex: Index of app <-> user assignments
+        """
+        max_workers = max_workers or self._MAX_WORKERS
+        checkpoint: dict | None = self._read_checkpoint(checkpoint_path)
+        index: OktaAssignmentIndex = (
+            OktaAssignmentIndex.from_dict(checkpoint)
+            if checkpoint
+            else OktaAssignmentIndex()
+        )
+
+        applications_lookup_table: dict[dict] = self.applications_lookup_table
+        for app_id in list(index.app_ids):
+            if app_id not in applications_lookup_table:
+                index.remove_app(app_id)
+        pending_app_ids: list[str] = [
+            app_id for app_id in applications_lookup_table if not index.has_app(app_id)
+        ]
+        self._logger.info(
+            f"Fetching assigned users for {len(pending_app_ids)} applications with {max_workers} workers. {len(index.app_ids)} applications were already fetched."
+        )
+
+        completed_since_checkpoint: int = 0
+        failed: int = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    self._bind_deadline(self.__fetch_application_user_ids), app_id
+                ): app_id
+                for app_id in pending_app_ids
+            }
+            progress: OktaProgressTracker = self._track_progress(
+                "application_assignments", len(futures)
+            )
+            for future in as_completed(futures):
+                app_id: str = futures[future]
+                try:
+                    index.add_app_assignments(app_id, future.result())
+                except requests.exceptions.RequestException as req_error:
+                    self._logger.error(req_error)
+                    self._logger.error(
+                        f"Could not fetch assigned users for app {app_id}. It will be retried on the next run."
+                    )
+                    failed += 1
+                    progress.advance(failed=True)
+                    continue
+                progress.advance()
+                completed_since_checkpoint += 1
+                if completed_since_checkpoint >= checkpoint_every:
+                    self._write_checkpoint(checkpoint_path, index.to_dict())
+                    completed_since_checkpoint = 0
+
+        if failed:
+            self._write_checkpoint(checkpoint_path, index.to_dict())
+        else:
+            self._clear_checkpoint(checkpoint_path)
+        self._logger.info(
+            f"Finished building assignment index of {len(index.app_ids)} applications, {len(index.user_ids)} users and {index.assignment_count} assignments."
+        )
+        return index
+
+    def __fetch_application_user_ids(self, app_id: str) -> list[str]:
+        self._logger.debug(f"Fetching assigned user ids for app {app_id}")
+        user_ids: list[str] = []
+        for page in self._paginate(f"/api/v1/apps/{app_id}/users", {"limit": 500}):
+            user_ids += [app_user["id"] for app_user in page]
+        return user_ids
+
+    ###########################################################################
+    # SECTION OF CODE TO FETCH GROUPS AND THEIR MEMBERS
+    ###########################################################################
+
+    @property
+    def groups(self) -> list:
+        if self.__groups == None:
+            with self.__load_lock("groups"):
+                if self.__groups == None:
+                    self._logger.debug("Loading Okta groups")
+                    self.groups = self.__fetch_groups()
+                    self.__mark_loaded("groups")
+        self.__refresh_if_stale("groups")
+        self._logger.debug(f"Returning {len(self.__groups)} groups from Okta.")
+        return self.__groups
+
+    @groups.setter
+    def groups(self, value: list) -> None:
+        self._logger.debug("Okta groups setter called.")
+        if value is None:
+            self.__groups_lookup_table = None
+        else:
+            self.groups_lookup_table = value
+        self.__groups: list = value
+
+    @property
+    def groups_lookup_table(self) -> dict:
+        if self.__groups_lookup_table == None:
+            with self.__load_lock("groups"):
+                if self.__groups_lookup_table == None:
+                    self._logger.debug(
+                        "The groups_lookup_table is empty. Will populate the table."
+                    )
+                    self.groups_lookup_table = self.groups
+        self._logger.debug(
+            f"Returning {len(self.__groups_lookup_table)} groups from Okta."
+        )
+        return self.__groups_lookup_table
+
+    @groups_lookup_table.setter
+    def groups_lookup_table(self, value: list) -> None:
+        self._logger.debug(
+            "Setter for groups_lookup_table was called. Creating dictionary where key == group['id'], value = group: dict"
+        )
+        if value == None:
+            self._logger.debug(
+                "Value provided to groups_lookup_table setter was None, so returning without making table."
+            )
+            return
+        groups_lookup_table: dict[dict] = {}
+        for group in value:
+            if group["id"] not in groups_lookup_table:
+                groups_lookup_table.update({group["id"]: group})
+        self.__groups_lookup_table = groups_lookup_table
+        self._logger.debug(
+            f"Created groups_lookup_table with length {len(groups_lookup_table)}"
+        )
+
+    def __fetch_groups(self) -> list:
+        self._logger.info("Fetching Okta groups...")
+        try:
+            return self._crawl_pages(
+                name="groups", url="/api/v1/groups", params={"limit": 1000}
+            )
+        except requests.exceptions.RequestException as req_error:
+            self._logger.error(str(req_error))
+            self._logger.error("Error occurred fetching groups.")
+            raise req_error
+
+    @property
+    def group_memberships(self) -> OktaGroupMembershipIndex:
+        if self.__group_memberships == None:
+            with self.__load_lock("group_memberships"):
+                if self.__group_memberships == None:
+                    self._logger.debug("Loading Okta group memberships")
+                    self.fetch_group_memberships()
+        self._logger.debug(
+            f"Returning {self.__group_memberships.membership_count} group memberships from Okta."
+        )
+        return self.__group_memberships
+
+    @group_memberships.setter
+    def group_memberships(self, value: OktaGroupMembershipIndex) -> None:
+        self._logger.debug("Okta group memberships setter called.")
+        self.__group_memberships = value
+        if value == None:
+            self.__group_membership_versions = {}
+            self.__failed_group_ids = set()
+
+    @property
+    def failed_group_ids(self) -> set[str]:
+        """Groups whose members could not be fetched by the last
+        fetch_group_memberships. Groups that were never fetched are missing from
+        group_memberships, and groups that were fetched before keep their
+        previous members, until a refresh fetches them successfully.
+        """
+        return set(self.__failed_group_ids)
+
+    def fetch_group_memberships(
+        self, max_workers: int = None, refresh: bool = False
+    ) -> OktaGroupMembershipIndex:
+        """Fetches the members of every group concurrently, and builds an index
+        that answers both "which users are in group X" and "which groups is user
+        Y in". The result is cached in group_memberships.
+
+        With refresh=True and memberships already loaded, only a delta is
+        fetched. groups is fetched again, and only the members of groups that
+        are new, or whose lastMembershipUpdated changed since their members were
+        last fetched, are fetched again. Groups that no longer exist are removed.
+        The refreshed index is built as a copy and swapped in when it is done, so
+        readers never see it half updated.
+
+        Groups whose members could not be fetched are listed in failed_group_ids.
+
+        Args:
+            max_workers (int, optional): Number of groups to fetch members for at
+            once. Defaults to the MAX_WORKERS the class was created with.
+            refresh (bool, optional): Update memberships that were already
+            loaded. Defaults to False.
+
+        Returns:
+            OktaGroupMembershipIndex: Index of group <-> user memberships
+        """
+        if self.__group_memberships != None and not refresh:
+            return self.__group_memberships
+
+        if self.__group_memberships == None:
+            index = OktaGroupMembershipIndex()
+            versions: dict[str, str] = {}
+        else:
+            index = OktaGroupMembershipIndex.from_dict(
+                self.__group_memberships.to_dict()
+            )
+            versions: dict[str, str] = dict(self.__group_membership_versions)
+            self.groups = self.__fetch_groups()
+        groups_lookup_table: dict[dict] = self.groups_lookup_table
+
+        for group_id in list(index.group_ids):
+            if group_id not in groups_lookup_table:
+                index.remove_group(group_id)
+                versions.pop(group_id, None)
+        changed_group_ids: list[str] = [
+            group_id
+            for group_id, group in groups_lookup_table.items()
+            if not index.has_group(group_id)
+            or versions.get(group_id) != group.get("lastMembershipUpdated")
+        ]
+        failed_group_ids: set[str] = set()
+        self._logger.info(
+            f"Fetching members of {len(changed_group_ids)} of {len(groups_lookup_table)} groups."
+        )
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers or self._MAX_WORKERS
+        ) as executor:
+            futures = {
+                executor.submit(
+                    self._bind_deadline(self.__fetch_group_user_ids), group_id
+                ): group_id
+                for group_id in changed_group_ids
+            }
+            progress: OktaProgressTracker = self._track_progress(
+                "group_memberships", len(futures)
+            )
+            for future in as_completed(futures):
+                group_id: str = futures[future]
+                try:
+                    index.set_group_members(group_id, future.result())
+                except requests.exceptions.RequestException as req_error:
+                    self._logger.error(req_error)
+                    self._logger.error(
+                        f"Could not fetch members of group {group_id}. They will be fetched on the next refresh."
+                    )
+                    failed_group_ids.add(group_id)
+                    progress.advance(failed=True)
+                    continue
+                progress.advance()
+                versions[group_id] = groups_lookup_table[group_id].get(
+                    "lastMembershipUpdated"
+                )
+
+        self.__group_memberships = index
+        self.__group_membership_versions = versions
+        self.__failed_group_ids = failed_group_ids
+        if failed_group_ids:
+            self._logger.warning(
+                f"Members of {len(failed_group_ids)} groups could not be fetched. See failed_group_ids."
+            )
+        self._logger.info(
+            f"Finished building group membership index of {len(index.group_ids)} groups, {len(index.user_ids)} users and {index.membership_count} memberships."
+        )
+        return index
+
+    def __fetch_group_user_ids(self, group_id: str) -> list[str]:
+        self._logger.debug(f"Fetching member user ids for group {group_id}")
+        user_ids: list[str] = []
+        for page in self._paginate(f"/api/v1/groups/{group_id}/users", {"limit": 1000}):
+            user_ids += [user["id"] for user in page]
+        return user_ids
+
     ###########################################################################
     # SECTION OF CODE TO FETCH POLICIES
     ###########################################################################
@@ -1587,10 +5127,14 @@ class OktaManagementFramework:
     @property
     def sign_on_policies(self) -> list:
         if self.__sign_on_policies == None:
-            self._logger.debug("Loading Okta sign_on_policies")
-            self.__sign_on_policies = self.__fetch_okta_policies_by_type(
-                type="ACCESS_POLICY"
-            )
+            with self.__load_lock("sign_on_policies"):
+                if self.__sign_on_policies == None:
+                    self._logger.debug("Loading Okta sign_on_policies")
+                    self.__sign_on_policies = self.__fetch_okta_policies_by_type(
+                        type="ACCESS_POLICY"
+                    )
+                    self.__mark_loaded("sign_on_policies")
+        self.__refresh_if_stale("sign_on_policies")
         self._logger.debug(
             f"Returning {len(self.__sign_on_policies)} sign_on_policies from Okta."
         )
@@ -1601,24 +5145,29 @@ class OktaManagementFramework:
         self._logger.debug(
             "Okta sign_on_policies setter called. Will fetch Okta sign_on_policies"
         )
+        if value is None:
+            self.__sign_on_policies_lookup_table = None
+        else:
+            self.sign_on_policies_lookup_table = value
         self.__sign_on_policies: list = value
-        self.__sign_on_policies_lookup_table: dict[dict] = value
 
     @property
     def sign_on_policies_lookup_table(self) -> list:
         if self.__sign_on_policies_lookup_table == None:
-            self._logger.debug(
-                "The sign_on_policies_lookup_table is empty. Will populate the table."
-            )
-            if self.sign_on_policies == None:
-                self._logger.debug(
-                    "Loading Okta sign_on_policies to create lookup table"
-                )
-                self.sign_on_policies = self.__fetch_okta_policies_by_type(
-                    type="ACCESS_POLICY"
-                )
+            with self.__load_lock("sign_on_policies"):
+                if self.__sign_on_policies_lookup_table == None:
+                    self._logger.debug(
+                        "The sign_on_policies_lookup_table is empty. Will populate the table."
+                    )
+                    if self.sign_on_policies == None:
+                        self._logger.debug(
+                            "Loading Okta sign_on_policies to create lookup table"
+                        )
+                        self.sign_on_policies = self.__fetch_okta_policies_by_type(
+                            type="ACCESS_POLICY"
+                        )
 
-            self.sign_on_policies_lookup_table = self.sign_on_policies
+                    self.sign_on_policies_lookup_table = self.sign_on_policies
         self._logger.debug(
             f"Returning {len(self.__sign_on_policies_lookup_table)} sign_on_policies from Okta."
         )
@@ -1685,7 +5234,7 @@ class OktaManagementFramework:
                 url=app_details["_links"]["accessPolicy"]["href"],
                 headers=headers,
                 data=payload,
-                timeout=60,
+                timeout=self._request_timeout(),
             )
             response.raise_for_status()
             return response.json()
@@ -1696,6 +5245,85 @@ class OktaManagementFramework:
             self._logger.error(str(req_error))
             raise req_error
 
+    def app_sign_on_policy_map(
+        self, max_workers: int = None, refresh: bool = False
+    ) -> dict[str, dict | None]:
+        """Returns the sign on policy of every application in the tenant. The
+        policy id is read from each app's _links.accessPolicy.href, so no call is
+        made per app. Policies are resolved from sign_on_policies_lookup_table,
+        and any policy missing from it is fetched once, no matter how many apps
+        use it.
+
+        Args:
+            max_workers (int, optional): Number of missing policies to fetch at
+            once. Defaults to the MAX_WORKERS the class was created with.
+            refresh (bool, optional): Re-read the app -> policy id mapping from
+            the applications instead of the cached one. Defaults to False.
+
+        Returns:
+            dict[str, dict | None]: Dictionary where the key is the app id, and
+            the value the app's policy object, or None if the app has no policy
+        """
+        app_policy_ids: dict[str, str | None] = self.__get_app_sign_on_policy_ids(
+            refresh=refresh
+        )
+
+        policies: dict[str, dict] = {}
+        lookup_table: dict[dict] = self.sign_on_policies_lookup_table
+        missing_policy_ids: set[str] = set()
+        for policy_id in set(app_policy_ids.values()) - {None}:
+            if policy_id in lookup_table:
+                policies[policy_id] = lookup_table[policy_id]
+            else:
+                missing_policy_ids.add(policy_id)
+
+        self._logger.info(
+            f"{len(app_policy_ids)} applications use {len(policies) + len(missing_policy_ids)} distinct sign on policies. {len(missing_policy_ids)} are not in sign_on_policies_lookup_table and will be fetched."
+        )
+        if missing_policy_ids:
+            with ThreadPoolExecutor(
+                max_workers=max_workers or self._MAX_WORKERS
+            ) as executor:
+                futures = {
+                    executor.submit(
+                        self._bind_deadline(self._okta_request),
+                        "GET",
+                        f"/api/v1/policies/{policy_id}",
+                    ): policy_id
+                    for policy_id in missing_policy_ids
+                }
+                for future in as_completed(futures):
+                    try:
+                        policies[futures[future]] = future.result().json()
+                    except requests.exceptions.RequestException as req_error:
+                        self._logger.error(req_error)
+                        self._logger.error(
+                            f"An error occurred while fetching policy details for policy {futures[future]}"
+                        )
+
+        return {
+            app_id: policies.get(policy_id)
+            for app_id, policy_id in app_policy_ids.items()
+        }
+
+    def __get_app_sign_on_policy_ids(self, refresh: bool = False) -> dict:
+        if self.__app_sign_on_policy_ids == None or refresh:
+            self.__app_sign_on_policy_ids = {
+                app_id: self.__get_app_sign_on_policy_id(app)
+                for app_id, app in self.applications_lookup_table.items()
+            }
+        return self.__app_sign_on_policy_ids
+
+    def __get_app_sign_on_policy_id(self, app_details: dict) -> str | None:
+        try:
+            href: str = app_details["_links"]["accessPolicy"]["href"]
+        except KeyError:
+            self._logger.debug(
+                f"The application {app_details.get('label', app_details['id'])} did not have a link to access policy"
+            )
+            return None
+        return href.rstrip("/").rsplit("/", 1)[-1]
+
     #TODO update parameters to only need app id and policy id
     def update_app_sign_on_policy(
         self, application_object: dict, policy_object: dict
@@ -1717,7 +5345,11 @@ class OktaManagementFramework:
 
         try:
             response = requests.request(
-                method="PUT", url=full_url, headers=headers, data=payload, timeout=60
+                method="PUT",
+                url=full_url,
+                headers=headers,
+                data=payload,
+                timeout=self._request_timeout(),
             )
             response.raise_for_status()
             return True
@@ -1729,6 +5361,109 @@ class OktaManagementFramework:
             self._logger.error(str(req_error))
             return False
 
+    def bulk_update_app_sign_on_policies(
+        self,
+        app_policy_pairs: Iterable[tuple[str, str]] = None,
+        from_policy_id: str = None,
+        to_policy_id: str = None,
+        ledger_path: str = None,
+        dry_run: bool = False,
+        max_workers: int = None,
+    ) -> list[dict]:
+        """Assigns sign on policies to many applications concurrently. Either
+        provide (app_id, policy_id) pairs, or from_policy_id and to_policy_id to
+        move every app currently using from_policy_id onto to_policy_id. Each
+        app's current policy is read from Okta rather than the cache, so apps
+        moved since they were cached are not picked or skipped by mistake. To
+        find the apps on from_policy_id, every application is fetched again,
+        while for app_policy_pairs only the listed apps are. Apps that already
+        use their target policy are SKIPPED without an update.
+
+        Args:
+            app_policy_pairs (Iterable[tuple[str, str]], optional): (app_id,
+            policy_id) pairs. Defaults to None.
+            from_policy_id (str, optional): Policy to move apps off of. Defaults to None.
+            to_policy_id (str, optional): Policy to move apps onto. Defaults to None.
+            ledger_path (str, optional): File to record the outcome of each app
+            to. Re-running with the same ledger_path skips apps that were already
+            moved to the same policy. Defaults to None.
+            dry_run (bool, optional): Only report which apps would be updated.
+            Defaults to False.
+            max_workers (int, optional): Number of apps to update at once.
+            Defaults to the MAX_WORKERS the class was created with.
+
+        Raises:
+            ValueError: Raised if neither or both of app_policy_pairs and
+            from_policy_id/to_policy_id were provided
+
+        Returns:
+            list[dict]: Outcome of each app, with "app_id:policy_id" as the key,
+            the previous and new policy id, status and timestamp
+        """
+        try:
+            if (app_policy_pairs is None) == (
+                from_policy_id is None and to_policy_id is None
+            ):
+                raise ValueError(
+                    "Provide either app_policy_pairs, or from_policy_id and to_policy_id."
+                )
+            if app_policy_pairs is None and (not from_policy_id or not to_policy_id):
+                raise ValueError(
+                    "Both from_policy_id and to_policy_id are required to move apps between policies."
+                )
+        except ValueError as value_error:
+            self._logger.error(value_error)
+            raise value_error
+
+        app_policy_ids: dict[str, str | None] | None = None
+        if app_policy_pairs is None:
+            self.applications = self.__fetch_applications()
+            app_policy_ids = self.__get_app_sign_on_policy_ids(refresh=True)
+            app_policy_pairs = [
+                (app_id, to_policy_id)
+                for app_id, policy_id in app_policy_ids.items()
+                if policy_id == from_policy_id
+            ]
+            self._logger.info(
+                f"Found {len(app_policy_pairs)} apps using policy {from_policy_id} to move to policy {to_policy_id}"
+            )
+
+        def update_app(app_policy: tuple[str, str], dry_run: bool) -> dict:
+            app_id, policy_id = app_policy
+            if app_policy_ids is not None:
+                current_policy_id: str | None = app_policy_ids.get(app_id)
+            else:
+                current_policy_id = self.__get_app_sign_on_policy_id(
+                    self._okta_request("GET", f"/api/v1/apps/{app_id}").json()
+                )
+            outcome: dict = {
+                "app_id": app_id,
+                "previous_policy_id": current_policy_id,
+                "policy_id": policy_id,
+            }
+            if current_policy_id == policy_id:
+                self._logger.debug(f"App {app_id} already uses policy {policy_id}")
+                return {"status": "SKIPPED", "reason": "Already on policy", **outcome}
+            if dry_run:
+                return {"status": "DRY_RUN", **outcome}
+            self._okta_request("PUT", f"/api/v1/apps/{app_id}/policies/{policy_id}")
+            if self.__app_sign_on_policy_ids is not None:
+                self.__app_sign_on_policy_ids[app_id] = policy_id
+            self._logger.info(f"Updated app {app_id} to use policy {policy_id}")
+            return {"status": "SUCCESS", **outcome}
+
+        return self._run_bulk_operation(
+            name="Bulk app sign on policy update",
+            items=(
+                (f"{app_id}:{policy_id}", (app_id, policy_id))
+                for app_id, policy_id in app_policy_pairs
+            ),
+            operation=update_app,
+            ledger_path=ledger_path,
+            dry_run=dry_run,
+            max_workers=max_workers,
+        )
+
     def fetch_policy_by_id(self, policy_id: str) -> dict:
         self._logger.debug(f"Will fetch policy details for {policy_id}")
         full_url = f"https://{self._okta_domain}.okta.com/api/v1/policies/{policy_id}"
@@ -1740,7 +5475,11 @@ class OktaManagementFramework:
         payload = {}
         try:
             response = requests.request(
-                method="GET", url=full_url, headers=headers, data=payload
+                method="GET",
+                url=full_url,
+                headers=headers,
+                data=payload,
+                timeout=self._request_timeout(),
             )
             response.raise_for_status()
 
@@ -1781,7 +5520,12 @@ class OktaManagementFramework:
         payload = {}
         try:
             response = requests.request(
-                method="GET", url=full_url, headers=headers, data=payload, params=parameters
+                method="GET",
+                url=full_url,
+                headers=headers,
+                data=payload,
+                params=parameters,
+                timeout=self._request_timeout(),
             )
             response.raise_for_status()
 
@@ -1827,13 +5571,7 @@ class OktaManagementFramework:
             list: List of dictionaries, where each dict is an app object
         """
         self._logger.debug("Fetching Okta policies...")
-        valid_policy_types: set = (
-            "OKTA_SIGN_ON",
-            "PASSWORD",
-            "MFA_ENROLL",
-            "IDP_DISCOVERY",
-            "ACCESS_POLICY",
-        )
+        valid_policy_types: tuple = self.VALID_POLICY_TYPES
         try:
             if type not in valid_policy_types:
                 raise ValueError(
@@ -1864,7 +5602,11 @@ class OktaManagementFramework:
 
         try:
             response = requests.request(
-                method="GET", url=url, headers=headers, data=payload
+                method="GET",
+                url=url,
+                headers=headers,
+                data=payload,
+                timeout=self._request_timeout(),
             )
             response.raise_for_status()
 
@@ -1913,9 +5655,280 @@ class OktaManagementFramework:
 
         return policy_list
 
+    ###########################################################################
+    # SECTION OF CODE TO FETCH ALL POLICIES OF EVERY TYPE AND THEIR RULES
+    ###########################################################################
+
+    @property
+    def policies(self) -> list:
+        if self.__policies == None:
+            with self.__load_lock("policies"):
+                if self.__policies == None:
+                    self._logger.debug("Loading Okta policies of every type")
+                    self.policy_inventory()
+        self._logger.debug(f"Returning {len(self.__policies)} policies from Okta.")
+        return self.__policies
+
+    @property
+    def policies_lookup_table(self) -> dict:
+        if self.__policies_lookup_table == None:
+            with self.__load_lock("policies"):
+                if self.__policies_lookup_table == None:
+                    self._logger.debug(
+                        "The policies_lookup_table is empty. Will populate the table."
+                    )
+                    self.policy_inventory()
+        return self.__policies_lookup_table
+
+    @property
+    def policy_rules_lookup_table(self) -> dict:
+        """Dictionary where the key is a policy id, and the value the list of
+        rules belonging to that policy
+        """
+        if self.__policy_rules_lookup_table == None:
+            with self.__load_lock("policies"):
+                if self.__policy_rules_lookup_table == None:
+                    self._logger.debug(
+                        "The policy_rules_lookup_table is empty. Will populate the table."
+                    )
+                    self.policy_inventory()
+        return self.__policy_rules_lookup_table
+
+    def policy_inventory(
+        self, max_workers: int = None, refresh: bool = False
+    ) -> dict[str, dict]:
+        """Fetches the policies of every supported policy type, and the rules of
+        every one of those policies, concurrently. Rules for the policies of one
+        type start being fetched as soon as that type's policies are in, while
+        the other types are still loading. Results are cached in policies,
+        policies_lookup_table and policy_rules_lookup_table.
+
+        An inventory missing a policy type or a policy's rules would make those
+        policies look like they have no rules, so if any request fails the
+        inventory is not cached, and an error naming what failed is raised once
+        every other request has finished.
+
+        Args:
+            max_workers (int, optional): Number of requests to make at once.
+            Defaults to the MAX_WORKERS the class was created with.
+            refresh (bool, optional): Fetch again even if the inventory was
+            already loaded. Defaults to False.
+
+        Raises:
+            requests.exceptions.RequestException: Raised if the policies of any
+            type, or the rules of any policy, could not be fetched
+
+        Returns:
+            dict[str, dict]: Dictionary where the key is the policy id, and the
+            value a dict with the "policy" object and its list of "rules"
+        """
+        if self.__policy_rules_lookup_table != None and not refresh:
+            return {
+                policy_id: {
+                    "policy": policy,
+                    "rules": self.__policy_rules_lookup_table.get(policy_id, []),
+                }
+                for policy_id, policy in self.__policies_lookup_table.items()
+            }
+
+        self._logger.info(
+            f"Fetching policies of type {', '.join(self.VALID_POLICY_TYPES)} and their rules"
+        )
+        policies_by_type: dict[str, list[dict]] = {}
+        policy_rules: dict[str, list[dict]] = {}
+        failed_policy_types: list[str] = []
+        failed_policy_ids: list[str] = []
+        first_error: requests.exceptions.RequestException = None
+        with ThreadPoolExecutor(
+            max_workers=max_workers or self._MAX_WORKERS
+        ) as executor:
+            type_futures = {
+                executor.submit(
+                    self._bind_deadline(self.__fetch_all_pages),
+                    "/api/v1/policies",
+                    {"type": policy_type, "limit": 1000},
+                ): policy_type
+                for policy_type in self.VALID_POLICY_TYPES
+            }
+            rule_futures = {}
+            for future in as_completed(type_futures):
+                policy_type: str = type_futures[future]
+                try:
+                    policies_by_type[policy_type] = future.result()
+                except requests.exceptions.RequestException as req_error:
+                    self._logger.error(req_error)
+                    self._logger.error(
+                        f"An error occurred while getting policies of type {policy_type}"
+                    )
+                    failed_policy_types.append(policy_type)
+                    first_error = first_error or req_error
+                    continue
+                self._logger.debug(
+                    f"Fetched {len(policies_by_type[policy_type])} {policy_type} policies. Fetching their rules."
+                )
+                for policy in policies_by_type[policy_type]:
+                    rule_futures[
+                        executor.submit(
+                            self._bind_deadline(self.__fetch_all_pages),
+                            f"/api/v1/policies/{policy['id']}/rules",
+                            {"limit": 1000},
+                        )
+                    ] = policy["id"]
+            for future in as_completed(rule_futures):
+                try:
+                    policy_rules[rule_futures[future]] = future.result()
+                except requests.exceptions.RequestException as req_error:
+                    self._logger.error(req_error)
+                    self._logger.error(
+                        f"An error occurred while getting policy rules for policy {rule_futures[future]}"
+                    )
+                    failed_policy_ids.append(rule_futures[future])
+                    first_error = first_error or req_error
+
+        if first_error is not None:
+            error = requests.exceptions.RequestException(
+                f"The policy inventory is incomplete and was not cached. Failed policy types: {failed_policy_types}. Policies whose rules failed: {failed_policy_ids}"
+            )
+            self._logger.error(error)
+            raise error from first_error
+
+        self.__policies = [
+            policy
+            for policy_type in self.VALID_POLICY_TYPES
+            for policy in policies_by_type[policy_type]
+        ]
+        self.__policies_lookup_table = {
+            policy["id"]: policy for policy in self.__policies
+        }
+        self.__policy_rules_lookup_table = policy_rules
+        if self.__sign_on_policies == None:
+            self.sign_on_policies = policies_by_type["ACCESS_POLICY"]
+        self._logger.info(
+            f"Finished fetching {len(self.__policies)} policies with {sum(len(r) for r in policy_rules.values())} rules"
+        )
+        return self.policy_inventory()
+
+    ###########################################################################
+    # SECTION OF CODE TO EVALUATE ACCESS POLICIES OFFLINE
+    ###########################################################################
+
+    def access_policy_engine(self, max_workers: int = None) -> OktaAccessPolicyEngine:
+        """Builds an OktaAccessPolicyEngine from the cached applications, policy
+        rules, group memberships and users, loading whichever of them are not
+        loaded yet. Once built, it answers which sign on policy rule applies to
+        which user on which app without calling Okta.
+
+            engine = okta.access_policy_engine()
+            engine.evaluate(user_id, app_id)["rule_name"]
+
+        Args:
+            max_workers (int, optional): Number of requests to make at once
+            while loading. Defaults to the MAX_WORKERS the class was created with.
+
+        Returns:
+            OktaAccessPolicyEngine: Engine over the data as it is now. Build a
+            new one to pick up later changes.
+        """
+        app_policy_ids: dict[str, str | None] = self.__get_app_sign_on_policy_ids()
+        self.policy_inventory(max_workers=max_workers)
+        if self.__group_memberships is None:
+            self.fetch_group_memberships(max_workers=max_workers)
+        engine = OktaAccessPolicyEngine(
+            app_policy_ids=app_policy_ids,
+            policy_rules=self.policy_rules_lookup_table,
+            group_memberships=self.group_memberships,
+            users_lookup_table=self.users_lookup_table,
+            unknown_group_ids=self.failed_group_ids,
+        )
+        self._logger.info(
+            f"Built access policy engine over {len(app_policy_ids)} apps, {len(engine.matchers)} sign on policies and {sum(len(m) for m in engine.matchers.values())} rules"
+        )
+        return engine
+
     ###########################################################################
     # SECTION OF CODE TO FETCH SYSTEM LOGS
     ###########################################################################
+    def query_system_log(
+        self, since: None | str = None, until: None | str = None
+    ) -> OktaQuery:
+        """Returns a query of the system log between since and until (ISO8601
+        timestamps), which supports filter and q. Nothing is fetched until the
+        query is iterated over.
+        """
+        fixed_params: dict = {}
+        if since:
+            fixed_params["since"] = since
+        if until:
+            fixed_params["until"] = until
+        return OktaQuery(
+            okta=self,
+            path="/api/v1/logs",
+            supported_parameters=("filter", "q"),
+            limit=1000,
+            fixed_params=fixed_params,
+            stop_on_empty_page=True,
+        )
+
+    def stream_system_log_events(
+        self,
+        since: None | str = None,
+        until: None | str = None,
+        filter: None | str = None,
+        query: None | str = None,
+        on_page: Callable[[list[dict]], Any] = None,
+        on_item: Callable[[dict], Any] = None,
+        prefetch: int = 0,
+    ) -> int:
+        """Takes the same parameters as get_okta_system_log_events, but hands
+        each page of events to on_page and each event to on_item as it arrives
+        instead of returning them all in one list
+
+        Returns:
+            int: Number of events streamed
+        """
+        log_query: OktaQuery = self.query_system_log(since=since, until=until)
+        if filter:
+            log_query.filter(filter)
+        if query:
+            log_query.q(query)
+        return self._stream_query(log_query, on_page, on_item, prefetch)
+
+    def aggregate_system_log_events(
+        self,
+        since: None | str = None,
+        until: None | str = None,
+        filter: None | str = None,
+        window_minutes: int = 60,
+        prefetch: int = 2,
+    ) -> OktaLogAggregator:
+        """Streams the system log events between since and until through an
+        OktaLogAggregator, so they can be counted without holding them in
+        memory
+
+        Args:
+            since (None | str, optional): ISO8601 timestamp to start from. Defaults to None.
+            until (None | str, optional): ISO8601 timestamp to end at. Defaults to None.
+            filter (None | str, optional): Filter expression. Defaults to None.
+            window_minutes (int, optional): Minutes of per-app authentication
+            outcomes to keep. Defaults to 60.
+            prefetch (int, optional): Pages to fetch ahead. Defaults to 2.
+
+        Returns:
+            OktaLogAggregator: The counts over every event
+        """
+        aggregator = OktaLogAggregator(window_minutes=window_minutes)
+        self.stream_system_log_events(
+            since=since,
+            until=until,
+            filter=filter,
+            on_item=aggregator.add,
+            prefetch=prefetch,
+        )
+        self._logger.info(
+            f"Aggregated {aggregator.event_count} system log events from about {aggregator.distinct_actor_count} distinct actors"
+        )
+        return aggregator
+
     @rate_limit_backoff(retries=5)
     def get_okta_system_log_events(
         self,
@@ -1958,7 +5971,11 @@ class OktaManagementFramework:
                 self._logger.debug(f"Next page URL was set: {next_page_url}")
                 url = next_page_url
                 response = requests.request(
-                    method="GET", url=url, headers=headers, data=payload
+                    method="GET",
+                    url=url,
+                    headers=headers,
+                    data=payload,
+                    timeout=self._request_timeout(),
                 )
             else:
                 self._logger.info("Fetching Okta system event logs...")
@@ -1989,7 +6006,12 @@ class OktaManagementFramework:
                     f"Retreiving Okta system logs with the following parameters: {str(params)}"
                 )
                 response = requests.request(
-                    method="GET", url=url, headers=headers, data=payload, params=params
+                    method="GET",
+                    url=url,
+                    headers=headers,
+                    data=payload,
+                    params=params,
+                    timeout=self._request_timeout(),
                 )
 
             response.raise_for_status()
@@ -2048,3 +6070,602 @@ class OktaManagementFramework:
             self._logger.warning(f"Type error was raised while getting okta system log events: {te}")
 
         return log_event_list
+
+    ###########################################################################
+    # SECTION OF CODE TO APPLY OKTA EVENT HOOKS TO THE CACHES
+    ###########################################################################
+
+    # User events after which a user is no longer returned by the users list
+    USER_REMOVED_EVENT_TYPES: tuple = (
+        "user.lifecycle.deactivate",
+        "user.lifecycle.delete.initiated",
+        "user.lifecycle.delete.completed",
+    )
+
+    def start_event_hook_receiver(self, **kwargs) -> OktaEventHookReceiver:
+        """Starts an OktaEventHookReceiver for this instance. Takes the same
+        keyword arguments as OktaEventHookReceiver.
+        """
+        return OktaEventHookReceiver(self, **kwargs).start()
+
+    def handle_event_hook(self, payload: dict) -> int:
+        """Applies the events of one Okta Event Hook delivery to the loaded
+        caches. Only what is already loaded is touched. Nothing is loaded here
+        just to apply an event to it.
+
+        - user.lifecycle.* and user.account.* events fetch the user again and
+        patch it into users, users_lookup_table and the user profile cache. A
+        user that was deactivated or deleted is removed from them, and from
+        user_factors and users_with_devices, instead. A deleted user is also
+        removed from application_assignments and group_memberships.
+        - user.mfa.factor.* events fetch the user's factors again into user_factors
+        - application.user_membership.add/remove patch application_assignments
+        - group.user_membership.add/remove patch group_memberships
+
+        Args:
+            payload (dict): Body of the event hook request
+
+        Returns:
+            int: Number of events applied
+        """
+        events: list[dict] = payload.get("data", {}).get("events", [])
+        applied: int = 0
+        for event in events:
+            try:
+                if self.__apply_event(event):
+                    applied += 1
+            except Exception as error:
+                self._logger.error(error)
+                self._logger.error(
+                    f"Could not apply {event.get('eventType')} event {event.get('uuid')}"
+                )
+        self._logger.info(
+            f"Applied {applied} of {len(events)} events from an event hook delivery"
+        )
+        return applied
+
+    def __apply_event(self, event: dict) -> bool:
+        event_type: str = event.get("eventType", "")
+        targets: dict[str, str] = {}
+        for target in event.get("target") or []:
+            targets.setdefault(target.get("type"), target.get("id"))
+        user_id: str | None = targets.get("User")
+        if user_id is None:
+            self._logger.debug(f"Ignoring {event_type} event without a user target")
+            return False
+
+        if event_type in self.USER_REMOVED_EVENT_TYPES:
+            self.__remove_cached_user(
+                user_id, deleted=event_type.startswith("user.lifecycle.delete.")
+            )
+        elif event_type.startswith(("user.lifecycle.", "user.account.")):
+            self.__refresh_cached_user(user_id)
+        elif event_type.startswith("user.mfa.factor."):
+            self.__refresh_cached_user_factors(user_id)
+        elif event_type.startswith("application.user_membership."):
+            app_id: str | None = targets.get("AppInstance")
+            if app_id is None or self.__application_assignments is None:
+                return False
+            if event_type.endswith(".add"):
+                self.__application_assignments.assign_user(app_id, user_id)
+            elif event_type.endswith(".remove"):
+                self.__application_assignments.unassign_user(app_id, user_id)
+        elif event_type.startswith("group.user_membership."):
+            group_id: str | None = targets.get("UserGroup")
+            if group_id is None or self.__group_memberships is None:
+                return False
+            if event_type.endswith(".add"):
+                self.__group_memberships.add_group_member(group_id, user_id)
+            elif event_type.endswith(".remove"):
+                self.__group_memberships.remove_group_member(group_id, user_id)
+        else:
+            self._logger.debug(f"Ignoring unsupported {event_type} event")
+            return False
+        self._logger.debug(f"Applied {event_type} event for user {user_id}")
+        return True
+
+    def __refresh_cached_user(self, user_id: str) -> None:
+        with self.__profile_cache_lock:
+            self.__retrieved_user_profile_cache.pop(user_id, None)
+        try:
+            user: dict = self.fetch_user_by_id(user_id=user_id)
+        except requests.exceptions.HTTPError as http_error:
+            if getattr(http_error.response, "status_code", None) != 404:
+                raise http_error
+            self.__remove_cached_user(user_id, deleted=True)
+            return
+        if user["status"] == "DEPROVISIONED" or (
+            self._ONLY_ACTIVE_USERS and user["status"] != "ACTIVE"
+        ):
+            self.__remove_cached_user(user_id)
+            return
+        with self.__load_lock("users"):
+            if self.__users is None or not isinstance(self._users_lookup_table, dict):
+                return
+            cached_user: dict | None = self._users_lookup_table.get(user_id)
+            if cached_user is None:
+                self._users_lookup_table[user_id] = user
+                self.__users.append(user)
+            else:
+                # The same dict is in users and users_lookup_table (and any
+                # user_factors entry), so updating it updates all of them
+                cached_user.update(user)
+
+    def __remove_cached_user(self, user_id: str, deleted: bool = False) -> None:
+        """Drops the user from users, users_lookup_table and the profile cache,
+        and from user_factors and users_with_devices, which only hold users that
+        are in users. A deleted user is also taken out of application_assignments
+        and group_memberships.
+        """
+        with self.__profile_cache_lock:
+            self.__retrieved_user_profile_cache.pop(user_id, None)
+        with self.__load_lock("users"):
+            if self.__users is not None and isinstance(self._users_lookup_table, dict):
+                cached_user: dict | None = self._users_lookup_table.pop(user_id, None)
+                if cached_user is not None:
+                    self.__users = [
+                        user for user in self.__users if user is not cached_user
+                    ]
+        with self.__load_lock("user_factors"):
+            if self.__user_factors is not None:
+                self.__user_factors = [
+                    entry
+                    for entry in self.__user_factors
+                    if entry["user"]["id"] != user_id
+                ]
+        with self.__load_lock("users_with_devices"):
+            if self.__users_with_devices is not None:
+                self.__users_with_devices = [
+                    user for user in self.__users_with_devices if user["id"] != user_id
+                ]
+        if not deleted:
+            return
+        if self.__application_assignments is not None:
+            for app_id in self.__application_assignments.apps_for_user(user_id):
+                self.__application_assignments.unassign_user(app_id, user_id)
+        if self.__group_memberships is not None:
+            for group_id in self.__group_memberships.groups_for_user(user_id):
+                self.__group_memberships.remove_group_member(group_id, user_id)
+
+    def __refresh_cached_user_factors(self, user_id: str) -> None:
+        if self.__user_factors is None:
+            return
+        # Fetched before taking the lock, so readers of user_factors are not
+        # held up for the length of a request
+        factors: list[dict] = self.fetch_user_factors(user_id=user_id)
+        with self.__load_lock("user_factors"):
+            if self.__user_factors is None:
+                return
+            for entry in self.__user_factors:
+                if entry["user"]["id"] == user_id:
+                    entry["factors"] = factors
+                    return
+            if (
+                isinstance(self._users_lookup_table, dict)
+                and user_id in self._users_lookup_table
+            ):
+                self.__user_factors.append(
+                    {"user": self._users_lookup_table[user_id], "factors": factors}
+                )
+
+    ###########################################################################
+    # SECTION OF CODE TO EXPORT COLLECTIONS TO FILES
+    ###########################################################################
+
+    EXPORT_COLLECTIONS: tuple = (
+        "users",
+        "devices",
+        "apps",
+        "policies",
+        "factors",
+        "logs",
+    )
+
+    def export(
+        self,
+        collection: str,
+        path: str,
+        format: str = "ndjson",
+        compression: str = None,
+        since: str = None,
+        until: str = None,
+        checkpoint_path: str = None,
+        max_workers: int = None,
+        prefetch: int = 2,
+    ) -> int:
+        """Streams a collection to a file page by page, so it never has to fit
+        in memory. Up to prefetch pages are fetched ahead of the writer, and
+        for factors, the factors of each page of users are fetched max_workers
+        at a time.
+
+        Args:
+            collection (str): users, devices, apps, policies, factors or logs
+            path (str): File to write to
+            format (str, optional): ndjson, csv or parquet. Defaults to "ndjson".
+            compression (str, optional): gzip or zstd. Defaults to None.
+            since (str, optional): ISO8601 timestamp. Only export users and
+            devices updated, or log events published, after it. Defaults to None.
+            until (str, optional): ISO8601 timestamp. Only export users and
+            devices updated, or log events published, before it. Defaults to None.
+            checkpoint_path (str, optional): File to record progress to after
+            every page. If the export is interrupted, running it again with the
+            same checkpoint_path appends the rest to path instead of starting
+            over. A page written just before the interruption may be written
+            twice. Not possible for Parquet, for compressed files, as a
+            compressed stream cut off by a crash can not be appended to, or for
+            policies, which are written in one go. Defaults to None.
+            max_workers (int, optional): Number of users' factors to fetch at
+            once, and of policy requests to make at once. Defaults to the
+            MAX_WORKERS the class was created with.
+            prefetch (int, optional): Pages to fetch ahead of the writer in the
+            background. Defaults to 2.
+
+        Raises:
+            ValueError: Raised if the collection, format or compression is not
+            supported, since/until were given for a collection they do not
+            apply to, or checkpoint_path was given for an export that can not be
+            checkpointed
+
+        Returns:
+            int: Number of objects exported
+        """
+        max_workers = max_workers or self._MAX_WORKERS
+        try:
+            if collection not in self.EXPORT_COLLECTIONS:
+                raise ValueError(
+                    f"{collection} can not be exported. Valid collections are {self.EXPORT_COLLECTIONS}"
+                )
+            if (since or until) and collection not in ("users", "devices", "logs"):
+                raise ValueError(
+                    f"since and until only apply to users, devices and logs, not {collection}"
+                )
+            if checkpoint_path and (
+                format == "parquet" or compression or collection == "policies"
+            ):
+                raise ValueError(
+                    "Exports to Parquet, compressed exports, and exports of policies, can not be checkpointed"
+                )
+        except ValueError as value_error:
+            self._logger.error(value_error)
+            raise value_error
+
+        checkpoint = OktaCrawlCheckpoint(checkpoint_path)
+        entries: list[dict] = checkpoint.read_entries()
+        if entries and not os.path.exists(path):
+            self._logger.warning(
+                f"{path} no longer exists, so the export will start over instead of resuming from {checkpoint_path}"
+            )
+            checkpoint.clear()
+            entries = []
+        writer = OktaExportWriter(
+            path,
+            format=format,
+            compression=compression,
+            append=bool(entries),
+            columns=entries[-1]["columns"] if entries else None,
+            logger=self._logger,
+        )
+        exported: int = entries[-1]["exported"] if entries else 0
+        if entries:
+            self._logger.info(
+                f"Resuming export of {collection} to {path} after {exported} objects"
+            )
+        try:
+            if collection == "policies":
+                policies: list[dict] = list(
+                    self.policy_inventory(max_workers=max_workers).values()
+                )
+                writer.write(policies)
+                exported = len(policies)
+            else:
+                query: OktaQuery = self.__export_query(collection, since, until)
+                url, params = (
+                    (entries[-1]["next_page_url"], None)
+                    if entries
+                    else (query.path, query.params)
+                )
+                pages: Iterable = (
+                    self._iterate_pages(url, params, prefetch=prefetch) if url else []
+                )
+                for page, next_page_url in pages:
+                    if not page and query.stop_on_empty_page:
+                        break
+                    if collection == "factors":
+                        page = self.__fetch_factors_for_users(page, max_workers)
+                    writer.write(page)
+                    writer.flush()
+                    exported += len(page)
+                    checkpoint.record(
+                        {
+                            "next_page_url": next_page_url,
+                            "columns": writer.columns,
+                            "exported": exported,
+                        }
+                    )
+        finally:
+            writer.close()
+        checkpoint.clear()
+        self._logger.info(f"Exported {exported} {collection} to {path}")
+        return exported
+
+    def __export_query(
+        self, collection: str, since: str = None, until: str = None
+    ) -> OktaQuery:
+        if collection == "logs":
+            return self.query_system_log(since=since, until=until)
+        if collection == "apps":
+            return self.query_applications()
+        if collection == "devices":
+            query: OktaQuery = self.query_devices()
+            if since:
+                query.where("lastUpdated", "gt", since)
+            if until:
+                query.where("lastUpdated", "lt", until)
+            return query
+        query: OktaQuery = self.query_users()
+        if self._ONLY_ACTIVE_USERS:
+            query.filter('status eq "ACTIVE"')
+        if since:
+            query.filter(f'lastUpdated gt "{since}"')
+        if until:
+            query.filter(f'lastUpdated lt "{until}"')
+        return query
+
+    def __fetch_factors_for_users(
+        self, users: list[dict], max_workers: int
+    ) -> list[dict]:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            factors: list[list] = list(
+                executor.map(
+                    self._bind_deadline(
+                        lambda user: self._okta_request(
+                            "GET", f"/api/v1/users/{user['id']}/factors"
+                        ).json()
+                    ),
+                    users,
+                )
+            )
+        return [
+            {"user": user, "factors": user_factors}
+            for user, user_factors in zip(users, factors)
+        ]
+
+
+class OktaTenantOrchestrator:
+    """Runs the same crawl against several Okta tenants at once. Each tenant is
+    an OktaManagementFramework instance with its own pooled session and rate
+    limiter, so one org's rate limit never slows another down, and the whole
+    run takes about as long as the slowest tenant.
+    """
+
+    def __init__(
+        self,
+        tenants: list[OktaManagementFramework],
+        max_tenants: int = None,
+        logger: logging.Logger = None,
+    ):
+        """
+        Args:
+            tenants (list[OktaManagementFramework]): One instance per tenant
+            max_tenants (int, optional): Number of tenants to crawl at once.
+            Defaults to all of them.
+            logger (logging.Logger, optional): Defaults to this module's logger.
+        """
+        self.tenants: dict[str, OktaManagementFramework] = {
+            tenant.okta_domain: tenant for tenant in tenants
+        }
+        self.max_tenants: int = max_tenants or max(len(self.tenants), 1)
+        self._logger: logging.Logger = logger or logging.getLogger(__name__)
+
+    @classmethod
+    def from_credentials(
+        cls, api_tokens: dict[str, str], max_tenants: int = None, **kwargs
+    ) -> "OktaTenantOrchestrator":
+        """Creates an orchestrator from a dictionary where the key is the Okta
+        domain and the value its API token. Any other keyword arguments are
+        passed to every OktaManagementFramework that is created.
+        """
+        return cls(
+            tenants=[
+                OktaManagementFramework(
+                    okta_domain=okta_domain, api_token=api_token, **kwargs
+                )
+                for okta_domain, api_token in api_tokens.items()
+            ],
+            max_tenants=max_tenants,
+            logger=kwargs.get("logger"),
+        )
+
+    def run(
+        self, crawl: str | Callable[[OktaManagementFramework], Any]
+    ) -> Iterator[dict]:
+        """Runs crawl against every tenant concurrently, yielding results as
+        soon as they arrive, in whatever order they arrive in. If crawl returns
+        an iterator, each item it produces is yielded on its own as it is
+        produced, otherwise its whole return value is yielded once.
+
+        If the caller stops iterating early, tenants that have not started yet
+        are never crawled, and crawls that are still running are left to finish
+        in the background without their results being kept.
+
+        Args:
+            crawl (str | Callable[[OktaManagementFramework], Any]): Name of a
+            property or method without arguments to call on each tenant, such as
+            "users", or a function that takes the tenant's instance, such as
+            lambda okta: okta.get_okta_system_log_events(since="...")
+
+        Yields:
+            Iterator[dict]: {"okta_domain": ..., "result": ...} for a crawl's
+            return value, {"okta_domain": ..., "item": ...} for each item of a
+            crawl that returned an iterator, or {"okta_domain": ..., "error":
+            exception} if a tenant's crawl failed
+        """
+        if isinstance(crawl, str):
+            attribute_name: str = crawl
+
+            def crawl(okta: OktaManagementFramework) -> Any:
+                value = getattr(okta, attribute_name)
+                return value() if callable(value) else value
+
+        # Bounded, so a slow consumer holds the crawls back instead of them
+        # piling every result up in memory
+        results: queue.Queue = queue.Queue(maxsize=self.max_tenants * 16)
+        stopped = threading.Event()
+        finished = object()
+
+        def publish(result: Any) -> bool:
+            # Gives up once the caller has stopped, rather than block forever on
+            # a queue nobody reads anymore
+            while not stopped.is_set():
+                try:
+                    results.put(result, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def run_tenant(okta_domain: str, okta: OktaManagementFramework) -> None:
+            if stopped.is_set():
+                return
+            self._logger.info(f"Starting crawl of tenant {okta_domain}")
+            try:
+                result = crawl(okta)
+                if isinstance(result, Iterator):
+                    for item in result:
+                        if not publish({"okta_domain": okta_domain, "item": item}):
+                            break
+                else:
+                    publish({"okta_domain": okta_domain, "result": result})
+                self._logger.info(f"Finished crawl of tenant {okta_domain}")
+            except Exception as error:
+                self._logger.error(f"Crawl of tenant {okta_domain} failed: {error}")
+                publish({"okta_domain": okta_domain, "error": error})
+            finally:
+                publish(finished)
+
+        executor = ThreadPoolExecutor(max_workers=self.max_tenants)
+        for okta_domain, okta in self.tenants.items():
+            executor.submit(run_tenant, okta_domain, okta)
+        remaining: int = len(self.tenants)
+        try:
+            while remaining:
+                result = results.get()
+                if result is finished:
+                    remaining -= 1
+                    continue
+                yield result
+        finally:
+            # If the caller stopped iterating early, tenants still queued are
+            # cancelled, and the ones still running wind down on their own
+            stopped.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def run_all(
+        self, crawl: str | Callable[[OktaManagementFramework], Any]
+    ) -> dict[str, Any]:
+        """Same as run, but waits for every tenant to finish and returns a
+        dictionary where the key is the Okta domain, and the value its result.
+        Items of crawls that return an iterator are collected into a list. A
+        failed tenant's value is the exception that was raised.
+        """
+        collected: dict[str, Any] = {}
+        for result in self.run(crawl):
+            okta_domain: str = result["okta_domain"]
+            if "error" in result:
+                collected[okta_domain] = result["error"]
+            elif "item" in result:
+                collected.setdefault(okta_domain, []).append(result["item"])
+            else:
+                collected[okta_domain] = result["result"]
+        return collected
+
+
+def main(argv: list[str] = None) -> int:
+    """Entry point of the okta-mgmt command. The API token is read from the
+    OKTA_API_TOKEN environment variable rather than the command line, so it
+    does not end up in shell history or process listings.
+
+        okta-mgmt export users -o users.ndjson.gz --compression gzip --workers 8
+    """
+    parser = argparse.ArgumentParser(
+        prog="okta-mgmt", description="Export data from an Okta tenant."
+    )
+    parser.add_argument(
+        "--domain",
+        default=os.environ.get("OKTA_DOMAIN"),
+        help="Okta domain, such as mycompany for mycompany.okta.com. Defaults to $OKTA_DOMAIN.",
+    )
+    parser.add_argument(
+        "--log-level",
+        default="INFO",
+        choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser(
+        "export", help="Stream a collection to an NDJSON, CSV or Parquet file."
+    )
+    export_parser.add_argument(
+        "collection", choices=OktaManagementFramework.EXPORT_COLLECTIONS
+    )
+    export_parser.add_argument("-o", "--output", required=True, help="File to write")
+    export_parser.add_argument(
+        "--format", default="ndjson", choices=OktaExportWriter.FORMATS
+    )
+    export_parser.add_argument("--compression", choices=OktaExportWriter.COMPRESSIONS)
+    export_parser.add_argument(
+        "--workers", type=int, default=4, help="Concurrent requests. Defaults to 4."
+    )
+    export_parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=2,
+        help="Pages to fetch ahead of the writer. Defaults to 2.",
+    )
+    export_parser.add_argument(
+        "--since", help="ISO8601 timestamp, for users, devices and logs"
+    )
+    export_parser.add_argument(
+        "--until", help="ISO8601 timestamp, for users, devices and logs"
+    )
+    export_parser.add_argument(
+        "--checkpoint",
+        help="File to record progress to, so an interrupted export can be resumed by running it again",
+    )
+    args = parser.parse_args(argv)
+
+    api_token: str | None = os.environ.get("OKTA_API_TOKEN")
+    if not args.domain:
+        parser.error("--domain or the OKTA_DOMAIN environment variable is required")
+    if not api_token:
+        parser.error("The OKTA_API_TOKEN environment variable is required")
+
+    logging.basicConfig(
+        level=args.log_level, format="%(asctime)s %(levelname)s %(message)s"
+    )
+    logger: logging.Logger = logging.getLogger("okta-mgmt")
+    try:
+        okta = OktaManagementFramework(
+            okta_domain=args.domain,
+            api_token=api_token,
+            logger=logger,
+            MAX_WORKERS=args.workers,
+        )
+        okta.export(
+            args.collection,
+            args.output,
+            format=args.format,
+            compression=args.compression,
+            since=args.since,
+            until=args.until,
+            checkpoint_path=args.checkpoint,
+            max_workers=args.workers,
+            prefetch=args.prefetch,
+        )
+    except Exception as error:
+        logger.error(f"Export of {args.collection} failed: {error}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
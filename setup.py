@@ -11,6 +11,13 @@ setup(
         "requests==2.32.3",
         "urllib3==2.2.3",
     ],
+    extras_require={
+        "snapshot": ["msgpack", "zstandard"],
+        "parquet": ["pyarrow"],
+    },
+    entry_points={
+        "console_scripts": ["okta-mgmt=okta_management_framework:main"],
+    },
     author="Thomas Obarowski",
     author_email="tjobarow@gmail.com",
     description="A wrapper for several functions of the Okta Management API I frequently find myself using.",
@@ -0,0 +1,113 @@
+import os
+import re
+import sys
+import time
+import urllib.parse
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from okta_management_framework import OktaManagementFramework
+
+
+class FakeResponse:
+    def __init__(
+        self, status_code: int, data=None, headers: dict = None, url: str = ""
+    ):
+        self.status_code = status_code
+        self.url = url
+        self._data = data
+        self.headers = requests.structures.CaseInsensitiveDict(headers or {})
+        self.headers.setdefault("x-rate-limit-limit", "600")
+        self.headers.setdefault("x-rate-limit-remaining", "500")
+        self.headers.setdefault("x-rate-limit-reset", str(int(time.time()) + 60))
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            error = requests.HTTPError(f"{self.status_code} for {self.url}")
+            error.response = self
+            raise error
+
+
+class FakeOkta:
+    """Routes the requests made through requests.Session to handlers registered
+    with route, and records every request made
+    """
+
+    def __init__(self, page_size: int = 2):
+        self.page_size = page_size
+        self.routes = []
+        self.calls = []
+
+    def route(self, method: str, pattern: str):
+        def decorator(handler):
+            self.routes.append((method, re.compile(pattern), handler))
+            return handler
+
+        return decorator
+
+    def paged(self, items: list, url: str, params: dict) -> FakeResponse:
+        """Returns one page of items, with a next link if there are more"""
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(url).query))
+        query.update(params or {})
+        after = int(query.get("after", 0))
+        base = url.split("?")[0]
+        link = f'<{base}>; rel="self"'
+        if after + self.page_size < len(items):
+            query["after"] = after + self.page_size
+            link += f', <{base}?{urllib.parse.urlencode(query)}>; rel="next"'
+        return FakeResponse(
+            200, items[after : after + self.page_size], {"link": link}, url
+        )
+
+    def request(self, method=None, url=None, params=None, json=None, **kwargs):
+        method = method.upper()
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(url).query))
+        query.update(params or {})
+        self.calls.append((method, urllib.parse.urlparse(url).path, query))
+        path = urllib.parse.urlparse(url).path
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if route_method == method and match:
+                response = handler(match, url, query, json)
+                if isinstance(response, FakeResponse):
+                    return response
+                return FakeResponse(response[0], response[1], url=url)
+        return FakeResponse(404, {"errorCode": "E0000007"}, url=url)
+
+
+@pytest.fixture
+def fake_okta(monkeypatch) -> FakeOkta:
+    fake = FakeOkta()
+    monkeypatch.setattr(
+        requests.Session,
+        "request",
+        lambda session, *args, **kwargs: fake.request(*args, **kwargs),
+    )
+    return fake
+
+
+@pytest.fixture
+def okta(fake_okta) -> OktaManagementFramework:
+    return OktaManagementFramework(okta_domain="acme", api_token="token")
+
+
+@pytest.fixture
+def sessions(fake_okta, monkeypatch) -> list:
+    """Records the requests.Session each request was sent through. The legacy
+    calls through requests.request get a new session for every request.
+    """
+    used: list = []
+    request = requests.Session.request
+
+    def record(session, *args, **kwargs):
+        used.append(session)
+        return request(session, *args, **kwargs)
+
+    monkeypatch.setattr(requests.Session, "request", record)
+    return used
@@ -0,0 +1,160 @@
+from okta_management_framework import (
+    OktaAccessPolicyEngine,
+    OktaGroupMembershipIndex,
+    OktaRuleMatcher,
+)
+
+
+def rule(rule_id: str, priority: int, access: str, conditions: dict = None, **extra):
+    return {
+        "id": rule_id,
+        "name": rule_id,
+        "priority": priority,
+        "status": "ACTIVE",
+        "conditions": conditions,
+        "actions": {"appSignOn": {"access": access}},
+        **extra,
+    }
+
+
+def build_engine(policy_rules: dict, unknown_group_ids=()) -> OktaAccessPolicyEngine:
+    memberships = OktaGroupMembershipIndex()
+    memberships.set_group_members("admins", ["alice"])
+    memberships.set_group_members("everyone", ["alice", "bob", "carol"])
+    users = {
+        "alice": {"id": "alice", "type": {"id": "employee"}},
+        "bob": {"id": "bob", "type": {"id": "contractor"}},
+        "carol": {"id": "carol", "type": {"id": "employee"}},
+    }
+    return OktaAccessPolicyEngine(
+        app_policy_ids={"app1": "policy1", "app2": "policy1", "app3": None},
+        policy_rules={"policy1": policy_rules},
+        group_memberships=memberships,
+        users_lookup_table=users,
+        unknown_group_ids=unknown_group_ids,
+    )
+
+
+def test_rule_matcher_people_and_user_type_conditions():
+    matcher = OktaRuleMatcher(
+        rule(
+            "r1",
+            0,
+            "ALLOW",
+            {
+                "people": {
+                    "groups": {"include": ["everyone"], "exclude": ["admins"]},
+                    "users": {"exclude": ["carol"]},
+                },
+                "userType": {"include": ["employee", "contractor"]},
+            },
+        )
+    )
+    assert not matcher.context_dependent
+    assert matcher.matches("bob", "contractor", {"everyone"})
+    assert not matcher.matches("alice", "employee", {"everyone", "admins"})
+    assert not matcher.matches("carol", "employee", {"everyone"})
+    assert not matcher.matches("dave", "service", {"everyone"})
+    assert not matcher.matches("erin", "employee", set())
+
+
+def test_rule_matcher_context_conditions():
+    unrestricted = OktaRuleMatcher(
+        rule(
+            "r1",
+            0,
+            "ALLOW",
+            {
+                "network": {"connection": "ANYWHERE"},
+                "riskScore": {"level": "ANY"},
+                "platform": {"include": [{"type": "ANY", "os": {"type": "ANY"}}]},
+            },
+        )
+    )
+    assert not unrestricted.context_dependent
+    restricted = OktaRuleMatcher(
+        rule(
+            "r2",
+            0,
+            "ALLOW",
+            {
+                "network": {"connection": "ZONE", "include": ["zone1"]},
+                "device": {"registered": True},
+            },
+        )
+    )
+    assert restricted.context_conditions == ["device", "network"]
+
+
+def test_first_matching_rule_by_priority_applies():
+    engine = build_engine(
+        [
+            rule("catch-all", 99, "DENY"),
+            rule("admins", 1, "ALLOW", {"people": {"groups": {"include": ["admins"]}}}),
+            rule("inactive", 0, "ALLOW", status="INACTIVE"),
+        ]
+    )
+    assert engine.evaluate("alice", "app1")["rule_id"] == "admins"
+    result = engine.evaluate("bob", "app1")
+    assert (result["rule_id"], result["access"]) == ("catch-all", "DENY")
+    assert engine.evaluate("bob", "app3")["rule_id"] is None
+
+
+def test_context_dependent_rules_are_reported_as_conditional():
+    engine = build_engine(
+        [
+            rule(
+                "admins-on-vpn",
+                0,
+                "ALLOW",
+                {
+                    "people": {"groups": {"include": ["admins"]}},
+                    "network": {"connection": "ZONE", "include": ["vpn"]},
+                },
+            ),
+            rule("catch-all", 1, "DENY"),
+        ]
+    )
+    result = engine.evaluate("alice", "app1")
+    assert result["rule_id"] == "catch-all"
+    assert result["conditional_rules"] == [
+        {
+            "rule_id": "admins-on-vpn",
+            "rule_name": "admins-on-vpn",
+            "access": "ALLOW",
+            "depends_on": ["network"],
+        }
+    ]
+    assert engine.evaluate("bob", "app1")["conditional_rules"] == []
+
+
+def test_rules_on_unknown_groups_are_conditional():
+    engine = build_engine(
+        [
+            rule("g2", 0, "ALLOW", {"people": {"groups": {"include": ["g2"]}}}),
+            rule("catch-all", 1, "DENY"),
+        ],
+        unknown_group_ids={"g2"},
+    )
+    result = engine.evaluate("bob", "app1")
+    assert result["rule_id"] == "catch-all"
+    assert result["conditional_rules"][0]["depends_on"] == ["group_memberships"]
+
+
+def test_matrix_covers_every_user_and_app():
+    engine = build_engine(
+        [
+            rule("admins", 0, "ALLOW", {"people": {"groups": {"include": ["admins"]}}}),
+            rule("catch-all", 1, "DENY"),
+        ]
+    )
+    matrix = {
+        (user_id, app_id): result["rule_id"]
+        for user_id, app_id, result in engine.iter_matrix()
+    }
+    assert len(matrix) == 9
+    assert matrix["alice", "app1"] == matrix["alice", "app2"] == "admins"
+    assert matrix["carol", "app2"] == "catch-all"
+    assert matrix["carol", "app3"] is None
+    assert engine.evaluate_user("bob")["app2"]["access"] == "DENY"
+    assert list(engine.iter_matrix(["bob"], ["app1"]))[0][2]["rule_id"] == "catch-all"
@@ -0,0 +1,210 @@
+import time
+
+import pytest
+import requests
+
+from okta_management_framework import OktaBulkLedger
+
+
+def test_ledger_keeps_latest_entry_and_ignores_dry_runs(tmp_path):
+    ledger = OktaBulkLedger(str(tmp_path / "ledger.ndjson"))
+    ledger.record({"key": "a", "status": "FAILED"})
+    ledger.record({"key": "a", "status": "SUCCESS"})
+    ledger.record({"key": "b", "status": "SKIPPED", "dry_run": True})
+    entries = ledger.load()
+    assert entries["a"]["status"] == "SUCCESS"
+    assert "b" not in entries
+
+
+def test_ledger_without_path_records_nothing():
+    ledger = OktaBulkLedger(None)
+    ledger.record({"key": "a", "status": "SUCCESS"})
+    assert ledger.load() == {}
+
+
+def test_bulk_operation_resumes_from_ledger(okta, tmp_path):
+    ledger_path = str(tmp_path / "ledger.ndjson")
+    attempts = []
+    failing = {"b"}
+
+    def operation(item, dry_run):
+        attempts.append(item)
+        if item in failing:
+            raise RuntimeError("boom")
+        if item == "c":
+            return {"status": "SKIPPED"}
+        return {"status": "SUCCESS"}
+
+    items = [(key, key) for key in ("a", "b", "c", "a")]
+    results = okta._run_bulk_operation("test", items, operation, ledger_path)
+    assert [(r["key"], r["status"]) for r in results] == [
+        ("a", "SUCCESS"),
+        ("b", "FAILED"),
+        ("c", "SKIPPED"),
+    ]
+    assert sorted(attempts) == ["a", "b", "c"]
+
+    # Only the failed item is attempted again
+    attempts.clear()
+    failing.clear()
+    results = okta._run_bulk_operation("test", items, operation, ledger_path)
+    assert attempts == ["b"]
+    assert [r["status"] for r in results] == ["SUCCESS", "SUCCESS", "SKIPPED"]
+
+
+def test_dry_run_does_not_complete_items(okta, tmp_path):
+    ledger_path = str(tmp_path / "ledger.ndjson")
+
+    def operation(item, dry_run):
+        return {"status": "DRY_RUN" if dry_run else "SUCCESS"}
+
+    items = [("a", "a")]
+    results = okta._run_bulk_operation(
+        "test", items, operation, ledger_path, dry_run=True
+    )
+    assert results[0]["status"] == "DRY_RUN"
+    results = okta._run_bulk_operation("test", items, operation, ledger_path)
+    assert results[0]["status"] == "SUCCESS"
+
+
+def test_bulk_unenroll_dry_run_checks_factors(okta, fake_okta, tmp_path):
+    @fake_okta.route("GET", r"/api/v1/users/(\w+)/factors/(\w+)")
+    def get_factor(match, url, params, body):
+        if match.group(2) == "gone":
+            return 404, {"errorCode": "E0000007"}
+        return 200, {"id": match.group(2), "factorType": "push", "status": "ACTIVE"}
+
+    @fake_okta.route("DELETE", r"/api/v1/users/(\w+)/factors/(\w+)")
+    def delete_factor(match, url, params, body):
+        return 204, None
+
+    ledger_path = str(tmp_path / "ledger.ndjson")
+    pairs = [("u1", "f1"), ("u2", "gone")]
+    results = okta.bulk_unenroll_user_factors(pairs, ledger_path, dry_run=True)
+    assert [(r["key"], r["status"]) for r in results] == [
+        ("u1:f1", "DRY_RUN"),
+        ("u2:gone", "SKIPPED"),
+    ]
+    assert results[0]["factor_type"] == "push"
+    assert not any(method == "DELETE" for method, _, _ in fake_okta.calls)
+
+    results = okta.bulk_unenroll_user_factors(pairs, ledger_path)
+    assert [r["status"] for r in results] == ["SUCCESS", "SUCCESS"]
+
+
+def test_only_idempotent_requests_are_retried_after_errors(
+    okta, fake_okta, monkeypatch
+):
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    attempts = {"GET": 0, "POST": 0}
+
+    @fake_okta.route("GET", r"/api/v1/users/u1")
+    def get_user(match, url, params, body):
+        attempts["GET"] += 1
+        return (500, {}) if attempts["GET"] == 1 else (200, {"id": "u1"})
+
+    @fake_okta.route("POST", r"/api/v1/users/u1")
+    def update_user(match, url, params, body):
+        attempts["POST"] += 1
+        return 500, {}
+
+    assert okta._okta_request("GET", "/api/v1/users/u1").json() == {"id": "u1"}
+    with pytest.raises(requests.HTTPError):
+        okta._okta_request("POST", "/api/v1/users/u1", json_body={})
+    assert attempts == {"GET": 2, "POST": 1}
+
+
+def test_rate_limited_posts_are_retried(okta, fake_okta, monkeypatch):
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    attempts = []
+
+    @fake_okta.route("POST", r"/api/v1/users/u1")
+    def update_user(match, url, params, body):
+        attempts.append(body)
+        return (429, {}) if len(attempts) == 1 else (200, {"id": "u1"})
+
+    okta._okta_request("POST", "/api/v1/users/u1", json_body={"profile": {}})
+    assert len(attempts) == 2
+
+
+def test_enroll_that_failed_but_was_applied_is_activated(okta, fake_okta):
+    factors = []
+
+    @fake_okta.route("GET", r"/api/v1/users/u1/factors")
+    def list_factors(match, url, params, body):
+        return 200, factors
+
+    @fake_okta.route("POST", r"/api/v1/users/u1/factors")
+    def enroll(match, url, params, body):
+        # Okta enrolls the factor, but the response never makes it back
+        factors.append(
+            {"id": "f1", "factorType": "push", "status": "PENDING_ACTIVATION"}
+        )
+        return 502, {}
+
+    @fake_okta.route("POST", r"/api/v1/users/u1/factors/f1/lifecycle/activate")
+    def activate(match, url, params, body):
+        return 200, {"factorResult": "WAITING"}
+
+    activations = []
+    results = okta.bulk_enroll_push_factors(["u1"], sink=activations.append)
+    assert (results[0]["status"], results[0]["factor_id"]) == ("SUCCESS", "f1")
+    assert activations[0]["factor_id"] == "f1"
+    enrolls = [
+        call
+        for call in fake_okta.calls
+        if call[:2] == ("POST", "/api/v1/users/u1/factors")
+    ]
+    assert len(enrolls) == 1
+
+
+@pytest.fixture
+def apps_api(fake_okta):
+    apps = {
+        app_id: {
+            "id": app_id,
+            "label": app_id,
+            "status": "ACTIVE",
+            "_links": {
+                "accessPolicy": {
+                    "href": f"https://acme.okta.com/api/v1/policies/{policy_id}"
+                }
+            },
+        }
+        for app_id, policy_id in (("app1", "p1"), ("app2", "p1"), ("app3", "p2"))
+    }
+
+    @fake_okta.route("GET", r"/api/v1/apps")
+    def list_apps(match, url, params, body):
+        return fake_okta.paged(list(apps.values()), url, params)
+
+    @fake_okta.route("GET", r"/api/v1/apps/(\w+)")
+    def get_app(match, url, params, body):
+        return 200, apps[match.group(1)]
+
+    @fake_okta.route("PUT", r"/api/v1/apps/(\w+)/policies/(\w+)")
+    def set_policy(match, url, params, body):
+        apps[match.group(1)]["_links"]["accessPolicy"]["href"] = match.group(2)
+        return 204, None
+
+    return apps
+
+
+def test_app_policy_pairs_only_fetch_the_listed_apps(okta, fake_okta, apps_api):
+    results = okta.bulk_update_app_sign_on_policies([("app1", "p2"), ("app3", "p2")])
+    assert [(r["key"], r["status"]) for r in results] == [
+        ("app1:p2", "SUCCESS"),
+        ("app3:p2", "SKIPPED"),
+    ]
+    assert results[0]["previous_policy_id"] == "p1"
+    assert ("GET", "/api/v1/apps") not in [call[:2] for call in fake_okta.calls]
+
+
+def test_move_between_policies_reads_fresh_apps(okta, fake_okta, apps_api):
+    okta.applications
+    # app2 was moved after the apps were cached
+    apps_api["app2"]["_links"]["accessPolicy"]["href"] = "p3"
+    results = okta.bulk_update_app_sign_on_policies(
+        from_policy_id="p1", to_policy_id="p2"
+    )
+    assert [(r["key"], r["status"]) for r in results] == [("app1:p2", "SUCCESS")]
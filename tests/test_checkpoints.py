@@ -0,0 +1,98 @@
+import os
+
+import pytest
+import requests
+
+from okta_management_framework import OktaManagementFramework
+
+
+@pytest.fixture
+def checkpointed_okta(fake_okta, tmp_path) -> OktaManagementFramework:
+    return OktaManagementFramework(
+        okta_domain="acme", api_token="token", CHECKPOINT_DIR=str(tmp_path)
+    )
+
+
+def test_paged_crawl_resumes_after_the_last_recorded_page(
+    checkpointed_okta, fake_okta, tmp_path
+):
+    users = [{"id": f"u{i}"} for i in range(5)]
+    state = {"fail_after": 2}
+
+    @fake_okta.route("GET", r"/api/v1/users")
+    def list_users(match, url, params, body):
+        if int(params.get("after", 0)) == state["fail_after"]:
+            return 400, {"errorCode": "E0000001"}
+        return fake_okta.paged(users, url, params)
+
+    with pytest.raises(requests.HTTPError):
+        checkpointed_okta._crawl_pages("users", "/api/v1/users", {"limit": 2})
+    assert len(os.listdir(tmp_path)) == 1
+
+    state["fail_after"] = None
+    fake_okta.calls.clear()
+    items = checkpointed_okta._crawl_pages("users", "/api/v1/users", {"limit": 2})
+    assert items == users
+    assert [query.get("after") for _, _, query in fake_okta.calls] == ["2", "4"]
+    assert os.listdir(tmp_path) == []
+
+
+def test_paged_crawl_under_another_query_starts_over(
+    checkpointed_okta, fake_okta, tmp_path
+):
+    users = [{"id": f"u{i}"} for i in range(3)]
+    state = {"fail": True}
+
+    @fake_okta.route("GET", r"/api/v1/users")
+    def list_users(match, url, params, body):
+        if state["fail"] and params.get("after"):
+            return 400, {"errorCode": "E0000001"}
+        return fake_okta.paged(users, url, params)
+
+    with pytest.raises(requests.HTTPError):
+        checkpointed_okta._crawl_pages("users", "/api/v1/users", {"limit": 2})
+    state["fail"] = False
+    fake_okta.calls.clear()
+    items = checkpointed_okta._crawl_pages(
+        "users", "/api/v1/users", {"limit": 2, "filter": 'status eq "ACTIVE"'}
+    )
+    assert items == users
+    assert fake_okta.calls[0][2].get("after") is None
+
+
+def test_fan_out_crawl_resumes_for_the_same_ids(checkpointed_okta):
+    fetched = []
+    failing = {"b"}
+
+    def fetch(id: str) -> str:
+        fetched.append(id)
+        if id in failing:
+            raise RuntimeError("boom")
+        return id.upper()
+
+    with pytest.raises(RuntimeError):
+        checkpointed_okta._crawl_fan_out(
+            "test", ["a", "b", "c"], fetch, skip_errors=False
+        )
+    fetched.clear()
+    failing.clear()
+    results = checkpointed_okta._crawl_fan_out("test", ["a", "b", "c"], fetch)
+    assert results == {"a": "A", "b": "B", "c": "C"}
+    assert fetched == ["b", "c"]
+
+
+def test_fan_out_crawl_over_other_ids_does_not_reuse_results(checkpointed_okta):
+    def fail_on_b(id: str) -> str:
+        if id == "b":
+            raise RuntimeError("boom")
+        return id.upper()
+
+    with pytest.raises(RuntimeError):
+        checkpointed_okta._crawl_fan_out(
+            "test", ["a", "b", "c"], fail_on_b, skip_errors=False
+        )
+    # a was deleted before the crawl was run again
+    results = checkpointed_okta._crawl_fan_out(
+        "test", ["b", "c"], lambda id: id.lower()
+    )
+    assert results == {"b": "b", "c": "c"}
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+import requests
+
+from okta_management_framework import OktaDeadlineExceededError
+
+
+@pytest.fixture
+def timeouts(fake_okta, monkeypatch) -> list:
+    """Records the timeout of every request made"""
+    sent: list = []
+    request = requests.Session.request
+
+    def record(session, *args, **kwargs):
+        sent.append(kwargs.get("timeout"))
+        return request(session, *args, **kwargs)
+
+    monkeypatch.setattr(requests.Session, "request", record)
+    return sent
+
+
+def test_every_request_has_a_timeout(okta, fake_okta, timeouts):
+    @fake_okta.route("GET", r"/api/v1/users/u1/factors")
+    def list_factors(match, url, params, body):
+        return 200, [{"id": "f1"}]
+
+    @fake_okta.route("DELETE", r"/api/v1/users/u1/factors/f1")
+    def delete_factor(match, url, params, body):
+        return 204, None
+
+    okta.fetch_user_factors(user_id="u1")
+    assert okta.unenroll_user_factor("u1", "f1")
+    okta._okta_request("GET", "/api/v1/users/u1/factors")
+    assert len(timeouts) == 3
+    assert all(timeout == (10, 60) for timeout in timeouts)
+
+
+def test_timeouts_are_capped_to_the_deadline(okta, fake_okta, timeouts):
+    @fake_okta.route("GET", r"/api/v1/users/u1/factors")
+    def list_factors(match, url, params, body):
+        return 200, []
+
+    with okta.deadline(5):
+        okta._okta_request("GET", "/api/v1/users/u1/factors")
+    connect_timeout, read_timeout = timeouts[0]
+    assert 0 < connect_timeout <= 5 and 0 < read_timeout <= 5
+
+
+def test_retries_that_would_pass_the_deadline_are_not_attempted(
+    okta, fake_okta, monkeypatch
+):
+    sleeps = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+
+    @fake_okta.route("GET", r"/api/v1/users/u1")
+    def get_user(match, url, params, body):
+        return 503, {}
+
+    with pytest.raises(OktaDeadlineExceededError):
+        with okta.deadline(0.5):
+            okta._okta_request("GET", "/api/v1/users/u1")
+    assert sleeps == []
+    assert len(fake_okta.calls) == 1
+
+
+def test_expired_deadline_stops_requests_being_sent(okta, fake_okta):
+    with pytest.raises(OktaDeadlineExceededError):
+        with okta.deadline(0):
+            okta._okta_request("GET", "/api/v1/users/u1")
+    assert fake_okta.calls == []
@@ -0,0 +1,172 @@
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+from okta_management_framework import (
+    OktaAssignmentIndex,
+    OktaEventHookReceiver,
+    OktaGroupMembershipIndex,
+)
+
+
+def event(event_type: str, user_id: str, **targets) -> dict:
+    return {
+        "eventType": event_type,
+        "target": [{"type": "User", "id": user_id}]
+        + [{"type": kind, "id": id} for kind, id in targets.items()],
+    }
+
+
+@pytest.fixture
+def cached_okta(okta, fake_okta):
+    """okta with users, user_factors, users_with_devices, application
+    assignments and group memberships loaded, and a users API behind them
+    """
+    state = {
+        "users": {
+            "u1": {"id": "u1", "status": "ACTIVE", "profile": {"login": "one"}},
+            "u2": {"id": "u2", "status": "ACTIVE", "profile": {"login": "two"}},
+        },
+        "factors": {"u1": [], "u2": [{"id": "f2", "factorType": "push"}]},
+    }
+
+    @fake_okta.route("GET", r"/api/v1/users/(\w+)")
+    def get_user(match, url, params, body):
+        user = state["users"].get(match.group(1))
+        return (200, user) if user else (404, {"errorCode": "E0000007"})
+
+    @fake_okta.route("GET", r"/api/v1/users/(\w+)/factors")
+    def list_factors(match, url, params, body):
+        return 200, state["factors"][match.group(1)]
+
+    okta.users = [dict(user) for user in state["users"].values()]
+    okta.user_factors = [
+        {"user": user, "factors": list(state["factors"][user["id"]])}
+        for user in okta.users
+    ]
+    okta.users_with_devices = [{**user, "devices": []} for user in okta.users]
+    assignments = OktaAssignmentIndex()
+    assignments.add_app_assignments("app1", ["u1", "u2"])
+    okta.application_assignments = assignments
+    memberships = OktaGroupMembershipIndex()
+    memberships.set_group_members("g1", ["u1", "u2"])
+    okta.group_memberships = memberships
+    return state
+
+
+def test_profile_update_patches_the_cached_user(okta, cached_okta):
+    cached_okta["users"]["u1"] = {
+        "id": "u1",
+        "status": "ACTIVE",
+        "profile": {"login": "one-renamed"},
+    }
+    assert okta.handle_event_hook(
+        {"data": {"events": [event("user.account.update_profile", "u1")]}}
+    )
+    assert okta.users_lookup_table["u1"]["profile"]["login"] == "one-renamed"
+    assert okta.user_factors[0]["user"]["profile"]["login"] == "one-renamed"
+
+
+def test_factor_events_fetch_the_users_factors_again(okta, cached_okta):
+    cached_okta["factors"]["u1"] = [{"id": "f1", "factorType": "push"}]
+    okta.handle_event_hook(
+        {"data": {"events": [event("user.mfa.factor.activate", "u1")]}}
+    )
+    factors = {entry["user"]["id"]: entry["factors"] for entry in okta.user_factors}
+    assert factors["u1"] == [{"id": "f1", "factorType": "push"}]
+
+
+def test_membership_events_patch_the_indexes(okta, cached_okta):
+    applied = okta.handle_event_hook(
+        {
+            "data": {
+                "events": [
+                    event(
+                        "application.user_membership.remove", "u1", AppInstance="app1"
+                    ),
+                    event("group.user_membership.remove", "u2", UserGroup="g1"),
+                    event("group.user_membership.add", "u2", UserGroup="g1"),
+                    event("system.org.rate_limit.warning", "u2"),
+                ]
+            }
+        }
+    )
+    assert applied == 3
+    assert okta.application_assignments.users_for_app("app1") == ["u2"]
+    assert okta.group_memberships.users_for_group("g1") == ["u1", "u2"]
+
+
+def test_deleted_user_is_purged_from_every_cache(okta, cached_okta):
+    del cached_okta["users"]["u1"]
+    okta.handle_event_hook(
+        {"data": {"events": [event("user.lifecycle.delete.completed", "u1")]}}
+    )
+    assert "u1" not in okta.users_lookup_table
+    assert [user["id"] for user in okta.users] == ["u2"]
+    assert [entry["user"]["id"] for entry in okta.user_factors] == ["u2"]
+    assert [user["id"] for user in okta.users_with_devices] == ["u2"]
+    assert okta.application_assignments.apps_for_user("u1") == []
+    assert okta.group_memberships.groups_for_user("u1") == []
+
+
+def test_deactivated_user_keeps_assignments(okta, cached_okta):
+    okta.handle_event_hook(
+        {"data": {"events": [event("user.lifecycle.deactivate", "u1")]}}
+    )
+    assert [entry["user"]["id"] for entry in okta.user_factors] == ["u2"]
+    assert okta.application_assignments.apps_for_user("u1") == ["app1"]
+
+
+@pytest.fixture
+def receiver(okta):
+    with OktaEventHookReceiver(
+        okta, port=0, path="/okta/events", secret="s3cret"
+    ) as receiver:
+        yield receiver
+
+
+def send(receiver, method: str, path: str = "/okta/events", body=None, **headers):
+    request = urllib.request.Request(
+        urllib.parse.urljoin(receiver.url, path),
+        data=json.dumps(body).encode() if body is not None else None,
+        headers={"Content-Type": "application/json", **headers},
+        method=method,
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            content = response.read()
+            return response.status, json.loads(content) if content else None
+    except urllib.error.HTTPError as error:
+        return error.code, None
+
+
+def test_receiver_answers_the_verification_challenge(receiver):
+    status, body = send(
+        receiver,
+        "GET",
+        Authorization="s3cret",
+        **{"X-Okta-Verification-Challenge": "abc123"},
+    )
+    assert (status, body) == (200, {"verification": "abc123"})
+
+
+def test_receiver_rejects_requests_without_the_secret_or_on_other_paths(receiver):
+    assert send(receiver, "GET", **{"X-Okta-Verification-Challenge": "x"})[0] == 401
+    assert send(receiver, "POST", body={}, Authorization="wrong")[0] == 401
+    assert send(receiver, "POST", "/other", body={}, Authorization="s3cret")[0] == 404
+
+
+def test_receiver_applies_delivered_events(okta, cached_okta, receiver):
+    del cached_okta["users"]["u2"]
+    status, _ = send(
+        receiver,
+        "POST",
+        body={"data": {"events": [event("user.lifecycle.delete.initiated", "u2")]}},
+        Authorization="s3cret",
+    )
+    receiver.wait_until_applied()
+    assert status == 200
+    assert "u2" not in okta.users_lookup_table
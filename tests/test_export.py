@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def factors_api(fake_okta):
+    users = [{"id": f"u{i}", "status": "ACTIVE"} for i in range(5)]
+
+    @fake_okta.route("GET", r"/api/v1/users")
+    def list_users(match, url, params, body):
+        return fake_okta.paged(users, url, params)
+
+    @fake_okta.route("GET", r"/api/v1/users/(\w+)/factors")
+    def list_factors(match, url, params, body):
+        return 200, [{"id": f"f-{match.group(1)}", "factorType": "push"}]
+
+    return users
+
+
+def test_factor_export_goes_through_the_pooled_session(
+    okta, factors_api, sessions, tmp_path
+):
+    path = tmp_path / "factors.ndjson"
+    assert okta.export("factors", str(path), max_workers=3) == 5
+    rows = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [row["user"]["id"] for row in rows] == [user["id"] for user in factors_api]
+    assert all(row["factors"][0]["id"] == f"f-{row['user']['id']}" for row in rows)
+    assert len(sessions) == 3 + 5
+    assert len(set(map(id, sessions))) == 1
+
+
+def test_checkpointed_export_refuses_compression(okta, tmp_path):
+    with pytest.raises(ValueError):
+        okta.export(
+            "users",
+            str(tmp_path / "users.ndjson.gz"),
+            compression="gzip",
+            checkpoint_path=str(tmp_path / "users.ckpt"),
+        )
@@ -0,0 +1,81 @@
+from okta_management_framework import OktaAssignmentIndex, OktaGroupMembershipIndex
+
+
+def build_index() -> OktaAssignmentIndex:
+    index = OktaAssignmentIndex()
+    index.add_app_assignments("app1", ["u1", "u2"])
+    index.add_app_assignments("app2", ["u2", "u3"])
+    index.add_app_assignments("app3", ["u3"])
+    return index
+
+
+def test_assignment_index_answers_both_directions():
+    index = build_index()
+    assert index.users_for_app("app1") == ["u1", "u2"]
+    assert sorted(index.apps_for_user("u2")) == ["app1", "app2"]
+    assert index.assignment_count == 5
+    assert index.users_for_app("missing") == []
+    assert index.apps_for_user("missing") == []
+
+
+def test_assign_and_unassign_user():
+    index = build_index()
+    index.assign_user("app1", "u3")
+    index.assign_user("app1", "u3")
+    assert index.users_for_app("app1") == ["u1", "u2", "u3"]
+    assert sorted(index.apps_for_user("u3")) == ["app1", "app2", "app3"]
+
+    index.unassign_user("app1", "u2")
+    index.unassign_user("app1", "u9")
+    assert index.users_for_app("app1") == ["u1", "u3"]
+    assert index.apps_for_user("u2") == ["app2"]
+
+
+def test_assign_user_leaves_unknown_apps_alone():
+    index = build_index()
+    index.assign_user("unknown", "u1")
+    assert not index.has_app("unknown")
+    assert index.apps_for_user("u1") == ["app1"]
+
+
+def test_remove_app_keeps_later_apps_intact():
+    index = build_index()
+    index.remove_app("app1")
+    assert not index.has_app("app1")
+    assert index.users_for_app("app2") == ["u2", "u3"]
+    assert index.users_for_app("app3") == ["u3"]
+    assert index.apps_for_user("u1") == []
+    assert sorted(index.apps_for_user("u3")) == ["app2", "app3"]
+
+
+def test_assignment_index_round_trips_through_dict():
+    index = build_index()
+    restored = OktaAssignmentIndex.from_dict(index.to_dict())
+    assert restored.app_ids == index.app_ids
+    for app_id in index.app_ids:
+        assert restored.users_for_app(app_id) == index.users_for_app(app_id)
+    assert sorted(restored.apps_for_user("u3")) == ["app2", "app3"]
+
+    # The copy is independent of the original
+    restored.remove_app("app2")
+    assert index.has_app("app2")
+
+
+def test_group_membership_index():
+    index = OktaGroupMembershipIndex()
+    index.set_group_members("g1", ["u1", "u2"])
+    index.set_group_members("g2", ["u2"])
+    index.add_group_member("g2", "u1")
+    index.remove_group_member("g1", "u2")
+    assert index.group_ids == ["g1", "g2"]
+    assert index.users_for_group("g2") == ["u1", "u2"]
+    assert sorted(index.groups_for_user("u1")) == ["g1", "g2"]
+    assert index.groups_for_user("u2") == ["g2"]
+    assert index.membership_count == 3
+
+    index.remove_group("g1")
+    assert not index.has_group("g1")
+    assert index.groups_for_user("u1") == ["g2"]
+    restored = OktaGroupMembershipIndex.from_dict(index.to_dict())
+    assert isinstance(restored, OktaGroupMembershipIndex)
+    assert restored.users_for_group("g2") == ["u1", "u2"]
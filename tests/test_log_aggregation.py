@@ -0,0 +1,76 @@
+from okta_management_framework import CountMinSketch, HyperLogLog, OktaLogAggregator
+
+
+def test_count_min_sketch_never_underestimates():
+    sketch = CountMinSketch(width=64, depth=4)
+    counts = {f"key{i}": i % 7 + 1 for i in range(500)}
+    for key, count in counts.items():
+        sketch.add(key, count)
+    assert sketch.total == sum(counts.values())
+    for key, count in counts.items():
+        assert sketch.estimate(key) >= count
+    assert sketch.add("key1", 3) >= counts["key1"] + 3
+
+
+def test_count_min_sketch_is_exact_without_collisions():
+    sketch = CountMinSketch()
+    sketch.add("a", 5)
+    sketch.add("b")
+    assert sketch.estimate("a") == 5
+    assert sketch.estimate("b") == 1
+    assert sketch.estimate("never added") == 0
+
+
+def test_hyperloglog_counts_distinct_keys():
+    hyperloglog = HyperLogLog()
+    assert hyperloglog.count() == 0
+    for _ in range(3):
+        for i in range(20000):
+            hyperloglog.add(f"user{i}")
+    assert abs(hyperloglog.count() - 20000) <= 20000 * 0.03
+
+
+def test_hyperloglog_small_counts_are_exact():
+    hyperloglog = HyperLogLog()
+    for key in ("a", "b", "c", "a"):
+        hyperloglog.add(key)
+    assert hyperloglog.count() == 3
+
+
+def sign_in(published: str, app_id: str = "app1", result: str = "SUCCESS") -> dict:
+    return {
+        "eventType": "user.authentication.sso",
+        "published": published,
+        "actor": {"id": "u1"},
+        "outcome": {"result": result},
+        "target": [{"type": "AppInstance", "id": app_id}],
+    }
+
+
+def test_app_outcome_window_follows_the_latest_minute():
+    aggregator = OktaLogAggregator(window_minutes=3)
+    for published in (
+        "2024-06-01T10:00:10.000Z",
+        "2024-06-01T10:02:00.000Z",
+        "2024-06-01T10:01:30.000Z",
+        "2024-06-01T10:03:00.000Z",
+    ):
+        aggregator.add(sign_in(published))
+    assert list(aggregator.app_outcomes_per_minute) == [
+        "2024-06-01T10:01",
+        "2024-06-01T10:02",
+        "2024-06-01T10:03",
+    ]
+
+
+def test_late_events_do_not_evict_newer_minutes_or_return_old_ones():
+    aggregator = OktaLogAggregator(window_minutes=2)
+    aggregator.add(sign_in("2024-06-01T10:05:00.000Z"))
+    aggregator.add(sign_in("2024-06-01T10:00:00.000Z"))
+    aggregator.add(sign_in("2024-06-01T10:04:00.000Z", result="FAILURE"))
+    aggregator.add(sign_in("2024-06-01T10:03:00.000Z"))
+    assert aggregator.app_outcomes_per_minute == {
+        "2024-06-01T10:04": {"app1": {"FAILURE": 1}},
+        "2024-06-01T10:05": {"app1": {"SUCCESS": 1}},
+    }
+    assert aggregator.event_count == 4
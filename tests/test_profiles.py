@@ -0,0 +1,81 @@
+import pytest
+
+
+@pytest.fixture
+def profiles_api(fake_okta):
+    users = {
+        "u1": {"id": "u1", "status": "ACTIVE", "profile": {"department": "Sales"}},
+        "u2": {"id": "u2", "status": "ACTIVE", "profile": {"department": "IT"}},
+    }
+    posted = []
+
+    @fake_okta.route("GET", r"/api/v1/users")
+    def list_users(match, url, params, body):
+        return fake_okta.paged(list(users.values()), url, params)
+
+    @fake_okta.route("GET", r"/api/v1/users/(\w+)")
+    def get_user(match, url, params, body):
+        return 200, users[match.group(1)]
+
+    @fake_okta.route("POST", r"/api/v1/users/(\w+)")
+    def update_user(match, url, params, body):
+        user_id = match.group(1)
+        posted.append((user_id, body))
+        users[user_id] = {
+            **users[user_id],
+            "profile": {**users[user_id]["profile"], **body["profile"]},
+        }
+        return 200, users[user_id]
+
+    return posted
+
+
+def test_updates_without_users_loaded_fetch_only_those_users(
+    okta, fake_okta, profiles_api
+):
+    results = okta.bulk_update_user_profiles(
+        {
+            "u1": {"department": "Engineering", "costCenter": "42"},
+            "u2": {"department": "IT"},
+        }
+    )
+    assert [(r["user_id"], r["status"]) for r in results] == [
+        ("u1", "SUCCESS"),
+        ("u2", "SKIPPED"),
+    ]
+    assert results[0]["changes"] == {
+        "department": {"from": "Sales", "to": "Engineering"},
+        "costCenter": {"from": None, "to": "42"},
+    }
+    assert profiles_api == [
+        ("u1", {"profile": {"department": "Engineering", "costCenter": "42"}})
+    ]
+    assert ("GET", "/api/v1/users") not in [call[:2] for call in fake_okta.calls]
+
+
+def test_updates_with_users_loaded_use_and_patch_the_cache(
+    okta, fake_okta, profiles_api
+):
+    okta.users
+    fake_okta.calls.clear()
+    okta.bulk_update_user_profiles({"u2": {"department": "Finance"}})
+    assert [call[:2] for call in fake_okta.calls] == [("POST", "/api/v1/users/u2")]
+    assert okta.users_lookup_table["u2"]["profile"]["department"] == "Finance"
+    assert okta.users[1]["profile"]["department"] == "Finance"
+
+
+def test_ledger_only_skips_users_given_the_same_values(
+    okta, fake_okta, profiles_api, tmp_path
+):
+    ledger_path = str(tmp_path / "profiles.ndjson")
+    okta.bulk_update_user_profiles({"u1": {"department": "Engineering"}}, ledger_path)
+    fake_okta.calls.clear()
+    okta.bulk_update_user_profiles({"u1": {"department": "Engineering"}}, ledger_path)
+    assert fake_okta.calls == []
+    assert len(profiles_api) == 1
+
+    results = okta.bulk_update_user_profiles(
+        {"u1": {"department": "Legal"}}, ledger_path
+    )
+    assert results[0]["status"] == "SUCCESS"
+    assert profiles_api[-1] == ("u1", {"profile": {"department": "Legal"}})
@@ -0,0 +1,56 @@
+import pytest
+from conftest import FakeResponse
+
+from okta_management_framework import OktaManagementFramework
+
+
+@pytest.fixture
+def snapshots() -> list:
+    return []
+
+
+@pytest.fixture
+def tracked_okta(fake_okta, snapshots) -> OktaManagementFramework:
+    return OktaManagementFramework(
+        okta_domain="acme",
+        api_token="token",
+        PROGRESS_CALLBACK=snapshots.append,
+        PROGRESS_INTERVAL=0,
+    )
+
+
+def test_user_factors_crawl_reports_rate_limit_headroom(
+    tracked_okta, fake_okta, snapshots
+):
+    users = [{"id": f"u{i}", "status": "ACTIVE"} for i in range(4)]
+    remaining = iter(range(400, 0, -1))
+
+    @fake_okta.route("GET", r"/api/v1/users")
+    def list_users(match, url, params, body):
+        return fake_okta.paged(users, url, params)
+
+    @fake_okta.route("GET", r"/api/v1/users/(\w+)/factors")
+    def list_factors(match, url, params, body):
+        return FakeResponse(
+            200, [], {"x-rate-limit-remaining": str(next(remaining))}, url
+        )
+
+    assert len(tracked_okta.user_factors) == 4
+    assert [snapshot["completed"] for snapshot in snapshots] == [1, 2, 3, 4]
+    assert {snapshot["total"] for snapshot in snapshots} == {4}
+    assert [snapshot["rate_limit_remaining"] for snapshot in snapshots] == [
+        400,
+        399,
+        398,
+        397,
+    ]
+    assert snapshots[-1]["rate_limit_limit"] == 600
+    assert snapshots[-1]["eta_seconds"] == 0
+
+
+def test_testing_threshold_counts_fetched_ids(tracked_okta, snapshots):
+    results = tracked_okta._crawl_fan_out(
+        "test", ["a", "b", "c", "d"], str.upper, testing_threshold=3
+    )
+    assert results == {"a": "A", "b": "B", "c": "C"}
+    assert snapshots[-1]["completed"] == snapshots[-1]["total"] == 3
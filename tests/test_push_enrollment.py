@@ -0,0 +1,94 @@
+import pytest
+
+
+@pytest.fixture
+def push_api(fake_okta):
+    factors = {
+        "u1": [{"id": "f1", "factorType": "push", "status": "ACTIVE"}],
+        "u2": [{"id": "f2", "factorType": "push", "status": "PENDING_ACTIVATION"}],
+        "u3": [{"id": "s3", "factorType": "sms", "status": "ACTIVE"}],
+    }
+
+    @fake_okta.route("GET", r"/api/v1/users/(\w+)/factors")
+    def list_factors(match, url, params, body):
+        return 200, factors[match.group(1)]
+
+    @fake_okta.route("POST", r"/api/v1/users/(\w+)/factors")
+    def enroll_factor(match, url, params, body):
+        factor = {
+            "id": f"new-{match.group(1)}",
+            "factorType": "push",
+            "status": "PENDING_ACTIVATION",
+            "_embedded": {"activation": {}},
+        }
+        factors[match.group(1)].append(factor)
+        return 200, factor
+
+    @fake_okta.route("POST", r"/api/v1/users/(\w+)/factors/([\w-]+)/lifecycle/activate")
+    def activate_factor(match, url, params, body):
+        return 200, {"qrcode": f"qr-{match.group(2)}"}
+
+    return factors
+
+
+def test_enrollment_skips_active_reactivates_pending_and_enrolls_the_rest(
+    okta, push_api
+):
+    sunk = []
+    results = okta.bulk_enroll_push_factors(["u1", "u2", "u3"], sink=sunk.append)
+    assert [
+        (r["key"], r["status"], r.get("action"), r["factor_id"]) for r in results
+    ] == [
+        ("u1", "SKIPPED", None, "f1"),
+        ("u2", "SUCCESS", "REACTIVATED", "f2"),
+        ("u3", "SUCCESS", "ENROLLED", "new-u3"),
+    ]
+    assert sorted(sunk, key=lambda item: item["user_id"]) == [
+        {"user_id": "u2", "factor_id": "f2", "activation": {"qrcode": "qr-f2"}},
+        {"user_id": "u3", "factor_id": "new-u3", "activation": {"qrcode": "qr-new-u3"}},
+    ]
+    assert all("activation" not in result for result in results)
+
+
+def test_dry_run_reports_the_action_without_enrolling(okta, fake_okta, push_api):
+    results = okta.bulk_enroll_push_factors(["u1", "u2", "u3"], dry_run=True)
+    assert [(r["status"], r.get("action")) for r in results] == [
+        ("SKIPPED", None),
+        ("DRY_RUN", "REACTIVATED"),
+        ("DRY_RUN", "ENROLLED"),
+    ]
+    assert {method for method, _, _ in fake_okta.calls} == {"GET"}
+
+
+def test_real_run_requires_a_sink(okta, fake_okta):
+    with pytest.raises(ValueError):
+        okta.bulk_enroll_push_factors(["u1"])
+    assert fake_okta.calls == []
+
+
+def test_enrollment_uses_and_patches_the_loaded_user_factors(okta, fake_okta, push_api):
+    okta.users = [{"id": "u3", "status": "ACTIVE"}]
+    okta.user_factors = [
+        {"user": okta.users[0], "factors": list(push_api["u3"])},
+    ]
+    okta.bulk_enroll_push_factors(["u3"], sink=lambda item: None)
+    assert ("GET", "/api/v1/users/u3/factors") not in [
+        call[:2] for call in fake_okta.calls
+    ]
+    assert okta.user_factors[0]["factors"] == [
+        {"id": "s3", "factorType": "sms", "status": "ACTIVE"},
+        {"id": "new-u3", "factorType": "push", "status": "PENDING_ACTIVATION"},
+    ]
+
+
+def test_ledger_skips_users_already_enrolled(okta, fake_okta, push_api, tmp_path):
+    ledger_path = str(tmp_path / "push.ndjson")
+    okta.bulk_enroll_push_factors(
+        ["u3"], sink=lambda item: None, ledger_path=ledger_path
+    )
+    fake_okta.calls.clear()
+    results = okta.bulk_enroll_push_factors(
+        ["u3"], sink=lambda item: None, ledger_path=ledger_path
+    )
+    assert fake_okta.calls == []
+    assert results[0]["action"] == "ENROLLED"
@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+
+import pytest
+
+
+def test_where_builds_quoted_search_clauses(okta):
+    query = (
+        okta.query_users()
+        .where("status", "eq", "ACTIVE")
+        .where("profile.department", "eq", 'R&D "Labs"')
+    )
+    assert query.params == {
+        "limit": 200,
+        "search": '(status eq "ACTIVE") and (profile.department eq "R&D \\"Labs\\"")',
+    }
+
+
+def test_where_formats_values(okta):
+    params = (
+        okta.query_users()
+        .where("lastUpdated", "gt", datetime(2024, 6, 1, tzinfo=timezone.utc))
+        .where("profile.employeeNumber", "pr")
+        .where("profile.isContractor", "eq", True)
+        .params
+    )
+    assert params["search"] == (
+        '(lastUpdated gt "2024-06-01T00:00:00.000Z") and (profile.employeeNumber pr)'
+        " and (profile.isContractor eq true)"
+    )
+
+
+def test_filter_search_and_q_are_kept_apart(okta):
+    params = (
+        okta.query_users().filter('status eq "ACTIVE"').search("type.id pr").q("jo")
+    ).params
+    assert params == {
+        "limit": 200,
+        "filter": 'status eq "ACTIVE"',
+        "search": "type.id pr",
+        "q": "jo",
+    }
+
+
+def test_where_falls_back_to_filter_without_search(okta):
+    assert okta.query_applications().where("status", "eq", "ACTIVE").params == {
+        "limit": 200,
+        "filter": 'status eq "ACTIVE"',
+    }
+    params = (
+        okta.query_system_log(since="2024-06-01T00:00:00Z")
+        .where("eventType", "eq", "user.session.start")
+        .params
+    )
+    assert params == {
+        "limit": 1000,
+        "since": "2024-06-01T00:00:00Z",
+        "filter": 'eventType eq "user.session.start"',
+    }
+
+
+def test_unsupported_parameters_and_operators_raise(okta):
+    with pytest.raises(ValueError):
+        okta.query_devices().filter('status eq "ACTIVE"')
+    with pytest.raises(ValueError):
+        okta.query_applications().search("status eq 1")
+    with pytest.raises(ValueError):
+        okta.query_users().where("status", "is", "ACTIVE")
+
+
+def test_query_pages_through_results(okta, fake_okta):
+    users = [{"id": f"u{i}", "status": "ACTIVE"} for i in range(5)]
+
+    @fake_okta.route("GET", r"/api/v1/users")
+    def list_users(match, url, params, body):
+        return fake_okta.paged(users, url, params)
+
+    query = okta.query_users().where("status", "eq", "ACTIVE")
+    assert [user["id"] for user in query] == [user["id"] for user in users]
+    assert fake_okta.calls[0][2]["search"] == 'status eq "ACTIVE"'
+    assert len(fake_okta.calls) == 3
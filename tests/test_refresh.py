@@ -0,0 +1,72 @@
+import pytest
+
+
+@pytest.fixture
+def users_api(fake_okta):
+    """Serves all users, or only the changed users when filtered on lastUpdated"""
+    state = {
+        "users": [
+            {"id": "u1", "status": "ACTIVE", "profile": {"login": "one"}},
+            {"id": "u2", "status": "ACTIVE", "profile": {"login": "two"}},
+            {"id": "u3", "status": "ACTIVE", "profile": {"login": "three"}},
+        ],
+        "changed": [],
+        "fail_delta": False,
+    }
+
+    @fake_okta.route("GET", r"/api/v1/users")
+    def list_users(match, url, params, body):
+        if "lastUpdated gt" in params.get("filter", ""):
+            if state["fail_delta"]:
+                return 400, {"errorCode": "E0000001"}
+            return fake_okta.paged(state["changed"], url, params)
+        return fake_okta.paged(state["users"], url, params)
+
+    return state
+
+
+def delta_filters(fake_okta) -> list[str]:
+    return [
+        query["filter"]
+        for method, path, query in fake_okta.calls
+        if path == "/api/v1/users" and "lastUpdated gt" in query.get("filter", "")
+    ]
+
+
+def test_refresh_merges_changed_users(okta, fake_okta, users_api):
+    assert [user["id"] for user in okta.users] == ["u1", "u2", "u3"]
+    users_api["changed"] = [
+        {"id": "u2", "status": "ACTIVE", "profile": {"login": "two-renamed"}},
+        {"id": "u3", "status": "DEPROVISIONED", "profile": {"login": "three"}},
+        {"id": "u4", "status": "ACTIVE", "profile": {"login": "four"}},
+    ]
+
+    okta.refresh("users", wait=True)
+
+    assert [user["id"] for user in okta.users] == ["u1", "u2", "u4"]
+    assert okta.users_lookup_table["u2"]["profile"]["login"] == "two-renamed"
+    assert "u3" not in okta.users_lookup_table
+    assert len(set(delta_filters(fake_okta))) == 1
+
+
+def test_failed_refresh_keeps_data_and_sync_time(okta, fake_okta, users_api):
+    okta.users
+    users_api["fail_delta"] = True
+    okta.refresh("users", wait=True)
+    assert [user["id"] for user in okta.users] == ["u1", "u2", "u3"]
+
+    users_api["fail_delta"] = False
+    users_api["changed"] = [
+        {"id": "u1", "status": "ACTIVE", "profile": {"login": "one-renamed"}}
+    ]
+    okta.refresh("users", wait=True)
+
+    # The retry asks for everything changed since the last successful sync
+    first, second = delta_filters(fake_okta)
+    assert first == second
+    assert okta.users_lookup_table["u1"]["profile"]["login"] == "one-renamed"
+
+
+def test_refresh_of_unknown_collection_raises(okta):
+    with pytest.raises(ValueError):
+        okta.set_refresh_interval("widgets", 60)
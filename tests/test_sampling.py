@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+from okta_management_framework import OktaSample
+
+
+def make_sample(population_size: int, sample_size: int, matches: int) -> OktaSample:
+    return OktaSample(
+        population_size,
+        [{"match": i < matches} for i in range(sample_size)],
+    )
+
+
+def estimate(population_size: int, sample_size: int, matches: int) -> dict:
+    return make_sample(population_size, sample_size, matches).estimate(
+        lambda item: item["match"]
+    )
+
+
+def test_whole_population_sampled_is_exact():
+    result = estimate(1000, 1000, 300)
+    assert result["proportion_low"] == result["proportion_high"] == 0.3
+    assert result["count_low"] == result["count"] == result["count_high"] == 300
+
+
+@pytest.mark.parametrize("matches", [0, 990])
+def test_near_complete_sample_contains_the_observed_value(matches):
+    result = estimate(1000, 990, matches)
+    assert result["count_low"] <= matches * 1000 / 990 <= result["count_high"]
+    # The population has at least the matches seen, and at most those plus
+    # the 10 members that were not sampled
+    assert matches <= result["count_low"]
+    assert result["count_high"] <= matches + 10
+
+
+def test_small_sample_interval_is_within_bounds():
+    result = estimate(100000, 500, 50)
+    assert result["proportion"] == 0.1
+    assert 0 < result["proportion_low"] < 0.1 < result["proportion_high"] < 1
+    assert result["count_low"] < result["count"] < result["count_high"]
+
+
+def test_wider_interval_at_higher_confidence():
+    sample = make_sample(100000, 400, 40)
+    narrow = sample.estimate(lambda item: item["match"], confidence=0.8)
+    wide = sample.estimate(lambda item: item["match"], confidence=0.99)
+    assert wide["proportion_low"] < narrow["proportion_low"]
+    assert wide["proportion_high"] > narrow["proportion_high"]
+
+
+def test_population_smaller_than_sample_is_treated_as_the_sample():
+    result = estimate(5, 10, 4)
+    assert result["population_size"] == 10
+    assert result["count"] == 4
+
+
+def test_empty_sample_and_bad_confidence_raise():
+    with pytest.raises(ValueError):
+        OktaSample(10, []).estimate(lambda item: True)
+    with pytest.raises(ValueError):
+        make_sample(10, 5, 1).estimate(lambda item: True, confidence=1)
+
+
+@pytest.fixture
+def devices_api(fake_okta):
+    devices = [{"id": f"d{i}"} for i in range(6)]
+    rate_limited = set()
+
+    @fake_okta.route("GET", r"/api/v1/devices")
+    def list_devices(match, url, params, body):
+        return fake_okta.paged(devices, url, params)
+
+    @fake_okta.route("GET", r"/api/v1/devices/(\w+)/users")
+    def device_users(match, url, params, body):
+        device_id = match.group(1)
+        if device_id not in rate_limited:
+            rate_limited.add(device_id)
+            return 429, {"errorCode": "E0000047"}
+        return 200, [{"user": {"id": f"u-{device_id}", "profile": {}}}]
+
+    return devices
+
+
+def test_device_sample_goes_through_the_pooled_session(
+    okta, devices_api, sessions, monkeypatch
+):
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    sample = okta.sample_device_users(4, seed=1)
+    assert len(sample.items) == 4
+    assert all(
+        item["users"][0]["user"]["id"] == f"u-{item['device']['id']}"
+        for item in sample.items
+    )
+    assert len(set(map(id, sessions))) == 1
+
+
+def test_factor_sample_goes_through_the_pooled_session(okta, fake_okta, sessions):
+    users = [{"id": f"u{i}", "status": "ACTIVE"} for i in range(5)]
+
+    @fake_okta.route("GET", r"/api/v1/users")
+    def list_users(match, url, params, body):
+        return fake_okta.paged(users, url, params)
+
+    @fake_okta.route("GET", r"/api/v1/users/(\w+)/factors")
+    def list_factors(match, url, params, body):
+        return 200, [{"id": "f1", "factorType": "push"}]
+
+    sample = okta.sample_user_factors(3, seed=2)
+    assert sample.estimate(lambda item: item["factors"])["proportion"] == 1
+    assert len(set(map(id, sessions))) == 1
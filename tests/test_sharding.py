@@ -0,0 +1,59 @@
+import logging
+import re
+
+import pytest
+
+
+@pytest.fixture
+def users_api(fake_okta):
+    state = {
+        "users": [
+            {"id": "u1", "status": "ACTIVE"},
+            {"id": "u2", "status": "ACTIVE"},
+            {"id": "u3", "status": "SUSPENDED"},
+            {"id": "u4", "status": "DEPROVISIONED"},
+        ],
+        "changed": [],
+    }
+
+    @fake_okta.route("GET", r"/api/v1/users")
+    def list_users(match, url, params, body):
+        expression = params.get("search", "") + params.get("filter", "")
+        if "lastUpdated gt" in expression:
+            return fake_okta.paged(state["changed"], url, params)
+        status = re.fullmatch(r'status eq "(\w+)"', expression)
+        if status:
+            users = [u for u in state["users"] if u["status"] == status.group(1)]
+            return fake_okta.paged(users, url, params)
+        return fake_okta.paged(state["users"], url, params)
+
+    return state
+
+
+def test_sharded_fetch_loads_users(okta, fake_okta, users_api):
+    users = okta.fetch_users_sharded(partition_by="status")
+    assert sorted(user["id"] for user in users) == ["u1", "u2", "u3"]
+    fake_okta.calls.clear()
+    assert okta.users is users
+    assert fake_okta.calls == []
+
+
+def test_sharded_fetch_warns_about_users_only_found_afterwards(okta, users_api, caplog):
+    # u5 was created while the partitions were being walked
+    users_api["changed"] = [{"id": "u5", "status": "ACTIVE"}]
+    with caplog.at_level(logging.INFO):
+        users = okta.fetch_users_sharded(partition_by="status")
+    assert "u5" in okta.users_lookup_table
+    assert len(users) == 4
+    warnings = [r.message for r in caplog.records if r.levelno == logging.WARNING]
+    assert any("1 were only found" in message for message in warnings)
+
+
+def test_refresh_after_sharded_fetch_is_a_delta(okta, fake_okta, users_api):
+    okta.fetch_users_sharded(partition_by="status")
+    fake_okta.calls.clear()
+    users_api["changed"] = [{"id": "u2", "status": "SUSPENDED"}]
+    okta.refresh("users", wait=True)
+    assert len(fake_okta.calls) == 1
+    assert "lastUpdated gt" in fake_okta.calls[0][2]["filter"]
+    assert okta.users_lookup_table["u2"]["status"] == "SUSPENDED"